@@ -0,0 +1,83 @@
+"""
+Benchmark of the in-memory representation of blocks, reporting memory per transaction and the
+time to build blocks from decoded JSON, as done for blocks received from other nodes. Run from the
+repository's root with `python -m benchmarks.blocks`.
+"""
+
+import argparse
+import tracemalloc
+
+from time import perf_counter
+from typing import Any, Dict, List
+
+from toychain.blockchain import Block
+
+ADDRESSES: int = 100
+
+
+def make_contents(blocks: int, transactions: int) -> List[Dict[str, Any]]:
+    """Decoded JSON contents of `blocks` blocks holding `transactions` transactions each."""
+    return [
+        {
+            "index": index,
+            "timestamp": 1_600_000_000.0 + index,
+            "transactions": [
+                {
+                    "sender": f"{(index + position) % ADDRESSES:032x}",
+                    "recipient": f"{(index * position) % ADDRESSES:032x}",
+                    "amount": float(position),
+                }
+                for position in range(transactions)
+            ],
+            "proof": index,
+            "previous_hash": f"{index:064x}",
+            "difficulty": 16,
+        }
+        for index in range(1, blocks + 1)
+    ]
+
+
+def _parse_arguments():
+    """Simply parse the size of the chain to build."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-b",
+        "--blocks",
+        dest="blocks",
+        default=1_000,
+        type=int,
+        help="The number of blocks to build. Defaults to 1000.",
+    )
+    parser.add_argument(
+        "-t",
+        "--transactions",
+        dest="transactions",
+        default=100,
+        type=int,
+        help="The number of transactions in each block. Defaults to 100.",
+    )
+    return parser.parse_args()
+
+
+def main():
+    """Runs the benchmark and prints the results."""
+    arguments = _parse_arguments()
+    contents = make_contents(arguments.blocks, arguments.transactions)
+    total_transactions: int = arguments.blocks * arguments.transactions
+
+    tracemalloc.start()
+    start: float = perf_counter()
+    chain: List[Block] = [Block.parse_obj(content) for content in contents]
+    elapsed: float = perf_counter() - start
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{'blocks':>10}{'transactions':>14}{'bytes/tx':>12}{'us/block':>12}")
+    print(
+        f"{len(chain):>10}{total_transactions:>14}{allocated / total_transactions:>12.1f}"
+        f"{elapsed / arguments.blocks * 1e6:>12.1f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark of the cost of logging, reporting the time of a single logging call written in
+different ways, and the time per block of a mining loop at different log levels against the same
+loop without any log handler. Messages are written to the null device. Run from the repository's
+root with `python -m benchmarks.logs`.
+"""
+
+import argparse
+import os
+
+from time import perf_counter
+from typing import Callable, List
+
+from loguru import logger
+
+from toychain.blockchain import BlockChain, Transaction
+from toychain.logs import LOGGING, configure_logging
+
+
+def _best(run: Callable[[], None], rounds: int) -> float:
+    """Best time over a few rounds of a function, in seconds."""
+    timings: List[float] = []
+    for _ in range(rounds):
+        start: float = perf_counter()
+        run()
+        timings.append(perf_counter() - start)
+    return min(timings)
+
+
+def time_calls(calls: int, rounds: int) -> None:
+    """Prints the time of a DEBUG message logged at INFO level, eagerly, lazily and gated."""
+    address: str = "127.0.0.1:5001"
+
+    def eager():
+        for _ in range(calls):
+            logger.debug(f"Querying node '{address}' at '/headers'")
+
+    def lazy():
+        for _ in range(calls):
+            logger.debug("Querying node '{}' at '/headers'", address)
+
+    def gated():
+        for _ in range(calls):
+            if LOGGING.debug:
+                logger.debug("Querying node '{}' at '/headers'", address)
+
+    print(f"{'call at INFO':<16}{'ns/call':>10}")
+    for name, run in (("f-string", eager), ("lazy", lazy), ("gated", gated)):
+        print(f"{name:<16}{_best(run, rounds) / calls * 1e9:>10.0f}", flush=True)
+
+
+def mine_blocks(blocks: int, transactions: int, difficulty: int) -> None:
+    """Mines `blocks` blocks of `transactions` transactions, validating each new block."""
+    blockchain = BlockChain(difficulty=difficulty)
+    for index in range(blocks):
+        blockchain.add_transactions(
+            Transaction(f"{position:032x}", f"{index:032x}", 1.0)
+            for position in range(transactions)
+        )
+        proof: int = blockchain.proof_of_work(blockchain.last_block.proof)
+        blockchain.add_block(proof=proof)
+        blockchain.validate_chain(blockchain.chain, start=len(blockchain.chain) - 1)
+
+
+def _parse_arguments():
+    """Simply parse the size of the workload."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-b",
+        "--blocks",
+        dest="blocks",
+        default=200,
+        type=int,
+        help="The number of blocks to mine in each round. Defaults to 200.",
+    )
+    parser.add_argument(
+        "-t",
+        "--transactions",
+        dest="transactions",
+        default=10,
+        type=int,
+        help="The number of transactions in each block. Defaults to 10.",
+    )
+    parser.add_argument(
+        "-d",
+        "--difficulty",
+        dest="difficulty",
+        default=4,
+        type=int,
+        help="The difficulty of the proofs, low to leave logging a visible share. Defaults to 4.",
+    )
+    parser.add_argument(
+        "-r",
+        "--rounds",
+        dest="rounds",
+        default=5,
+        type=int,
+        help="The number of rounds to keep the best time of. Defaults to 5.",
+    )
+    return parser.parse_args()
+
+
+def main():
+    """Runs the benchmark and prints the results."""
+    arguments = _parse_arguments()
+    with open(os.devnull, "w") as null_device:
+        configure_logging("INFO", null_device)
+        time_calls(100_000, arguments.rounds)
+
+        def run():
+            mine_blocks(arguments.blocks, arguments.transactions, arguments.difficulty)
+
+        logger.remove()  # no handler at all, messages are dropped on the first check
+        LOGGING.set("CRITICAL")
+        baseline: float = _best(run, arguments.rounds)
+        print(f"\n{'log level':<16}{'ms/block':>10}{'overhead':>10}")
+        print(f"{'no handler':<16}{baseline / arguments.blocks * 1e3:>10.3f}{'-':>10}")
+        for level in ("TRACE", "DEBUG", "INFO", "WARNING"):
+            configure_logging(level, null_device)
+            elapsed: float = _best(run, arguments.rounds)
+            print(
+                f"{level:<16}{elapsed / arguments.blocks * 1e3:>10.3f}"
+                f"{(elapsed - baseline) / baseline:>10.1%}",
+                flush=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark of the proof of work miners, reporting hashes per second and time per block across
+difficulties. Run from the repository's root with `python -m benchmarks.mining`.
+"""
+
+import argparse
+import hashlib
+import os
+
+from time import perf_counter
+from typing import Callable, Dict, Tuple
+
+from loguru import logger
+
+from toychain.mining import ParallelMiner, search_range
+
+GENESIS_PROOF: int = 100
+
+
+def reference_search(last_proof: int, difficulty: int) -> int:
+    """Naive search hashing each candidate from scratch and checking its hex digest."""
+    shift: int = 256 - difficulty
+    proof: int = 0
+    while int(hashlib.sha256(f"{last_proof}{proof}".encode()).hexdigest(), 16) >> shift:
+        proof += 1
+    return proof
+
+
+def run_miner(mine: Callable[[int, int], int], difficulty: int, blocks: int) -> Tuple[float, int]:
+    """
+    Mines `blocks` consecutive proofs starting from the genesis proof.
+
+    Returns:
+        A tuple of the total elapsed time in seconds, and the number of candidates a serial search
+        has to try to find those proofs.
+    """
+    last_proof: int = GENESIS_PROOF
+    candidates: int = 0
+    start: float = perf_counter()
+    for _ in range(blocks):
+        last_proof = mine(last_proof, difficulty)
+        candidates += last_proof + 1
+    return perf_counter() - start, candidates
+
+
+def _parse_arguments():
+    """Simply parse the difficulties to run and the miners' settings."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-d",
+        "--difficulties",
+        dest="difficulties",
+        default=[8, 12, 16, 18],
+        nargs="+",
+        type=int,
+        help="The difficulties, in leading zero bits, to benchmark. Defaults to 8 12 16 18.",
+    )
+    parser.add_argument(
+        "-b",
+        "--blocks",
+        dest="blocks",
+        default=5,
+        type=int,
+        help="The number of consecutive blocks to mine at each difficulty. Defaults to 5.",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        dest="workers",
+        default=os.cpu_count() or 1,
+        type=int,
+        help="The number of processes for the parallel miner. Defaults to the number of CPUs.",
+    )
+    parser.add_argument(
+        "--skip-reference",
+        dest="skip_reference",
+        action="store_true",
+        help="Do not run the naive reference miner, which is slow at high difficulties.",
+    )
+    return parser.parse_args()
+
+
+def main():
+    """Runs the benchmark and prints a results table."""
+    arguments = _parse_arguments()
+    logger.disable("toychain")
+    parallel_miner = ParallelMiner(workers=arguments.workers)
+    miners: Dict[str, Callable[[int, int], int]] = {
+        "serial": lambda last_proof, difficulty: search_range(last_proof, 0, difficulty=difficulty),
+        f"parallel-{arguments.workers}": parallel_miner.mine,
+    }
+    if not arguments.skip_reference:
+        miners = {"reference": reference_search, **miners}
+
+    print(f"{'miner':<14}{'difficulty':>12}{'hashes/s':>16}{'s/block':>12}")
+    try:
+        for difficulty in arguments.difficulties:
+            for name, mine in miners.items():
+                elapsed, candidates = run_miner(mine, difficulty, arguments.blocks)
+                print(
+                    f"{name:<14}{difficulty:>12}{candidates / elapsed:>16,.0f}"
+                    f"{elapsed / arguments.blocks:>12.4f}",
+                    flush=True,
+                )
+    finally:
+        parallel_miner.close()
+
+
+if __name__ == "__main__":
+    main()
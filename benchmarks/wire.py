@@ -0,0 +1,48 @@
+"""
+Benchmark of the encodings used to exchange chains between nodes, reporting the size of a chain
+and the time to decode it into blocks, in JSON and in the binary wire format. Run from the
+repository's root with `python -m benchmarks.wire`.
+"""
+
+import json
+
+from time import perf_counter
+from typing import Callable, List
+
+from benchmarks.blocks import _parse_arguments, make_contents
+from toychain import wire
+from toychain.blockchain import Block
+
+
+def _time(decode: Callable[[], List[Block]], rounds: int = 5) -> float:
+    """Best time over a few rounds to decode the chain, in seconds."""
+    timings: List[float] = []
+    for _ in range(rounds):
+        start: float = perf_counter()
+        decode()
+        timings.append(perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    """Runs the benchmark and prints the results."""
+    arguments = _parse_arguments()
+    chain: List[Block] = [
+        Block.parse_obj(content)
+        for content in make_contents(arguments.blocks, arguments.transactions)
+    ]
+    encoded: bytes = b"[" + b",".join(block.canonical_bytes() for block in chain) + b"]"
+    packed: bytes = wire.pack_message((block.packed_bytes() for block in chain), len(chain))
+
+    json_time: float = _time(lambda: [Block.parse_obj(item) for item in json.loads(encoded)])
+    packed_time: float = _time(
+        lambda: [Block.parse_packed(record) for record in wire.unpack_message(packed)[1]]
+    )
+
+    print(f"{'format':>10}{'bytes':>14}{'ms/decode':>12}")
+    print(f"{'json':>10}{len(encoded):>14}{json_time * 1e3:>12.1f}")
+    print(f"{'packed':>10}{len(packed):>14}{packed_time * 1e3:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+import pytest
+
+from toychain.blockchain import BlockChain
+
+
+def mine_blocks(blockchain: BlockChain, number: int, recipient: str = "miner") -> None:
+    for _ in range(number):
+        blockchain.add_transaction(sender="0", recipient=recipient, amount=1)
+        blockchain.add_block(proof=blockchain.proof_of_work(blockchain.last_block.proof))
+
+
+@pytest.fixture
+def blockchain():
+    created = BlockChain(difficulty=4)
+    mine_blocks(created, 3)
+    yield created
+    created.close()
@@ -1,8 +1,17 @@
 import hashlib
+import io
+import json
+import threading
+import time
 
 import pytest
+import requests
 
+from conftest import mine_blocks
+
+from toychain import wire
 from toychain.blockchain import Block, BlockChain, Transaction
+from toychain.locking import ReadWriteLock
 
 
 class TestNodes:
@@ -51,7 +60,7 @@ class TestBlocksAndTransactions:
     def test_create_transactions(self, sender, recipient, amount):
         blockchain = BlockChain()
         blockchain.add_transaction(sender=sender, recipient=recipient, amount=amount)
-        added_transaction: Transaction = blockchain.current_transactions[-1]
+        added_transaction: Transaction = blockchain.mempool.pending()[-1]
 
         assert added_transaction
         assert added_transaction.sender == sender
@@ -65,13 +74,40 @@ class TestBlocksAndTransactions:
         blockchain = BlockChain()
         blockchain.add_transaction(sender=sender, recipient=recipient, amount=amount)
 
-        initial_transactions_length: int = len(blockchain.current_transactions)
+        initial_transactions_length: int = len(blockchain.mempool)
         _ = blockchain.add_block()
-        current_transactions_length: int = len(blockchain.current_transactions)
+        current_transactions_length: int = len(blockchain.mempool)
 
         assert initial_transactions_length != current_transactions_length
         assert len(blockchain.chain) == 2
 
+    def test_transactions_are_compact(self):
+        first = Transaction(sender="".join(["me"]), recipient="you", amount=1)
+        second = Transaction(sender="".join(["m", "e"]), recipient="you", amount=2)
+
+        assert not hasattr(first, "__dict__")
+        assert first.sender is second.sender
+        assert isinstance(first.amount, float)
+
+    def test_parse_round_trip(self):
+        blockchain = BlockChain()
+        blockchain.add_transaction(sender="me", recipient="you", amount=3)
+        block: Block = blockchain.add_block()
+
+        parsed_block = Block.parse_raw(block.canonical_bytes())
+        assert parsed_block == block
+        assert parsed_block.transactions[0] == block.transactions[0]
+        assert parsed_block.digest == block.digest
+
+    @pytest.mark.parametrize(
+        "changes",
+        [{"index": "not a number"}, {"transactions": None}, {"transactions": [{"sender": "a"}]}],
+    )
+    def test_parse_rejects_malformed_blocks(self, changes):
+        content = {**BlockChain().last_block.dict(), **changes}
+        with pytest.raises((KeyError, TypeError, ValueError)):
+            Block.parse_obj(content)
+
     def test_return_last_block(self):
         blockchain = BlockChain()
         created_block: Block = blockchain.add_block()
@@ -79,15 +115,36 @@ class TestBlocksAndTransactions:
         assert len(blockchain.chain) == 2
         assert created_block is blockchain.chain[-1]
 
+    def test_encoded_blocks(self):
+        blockchain = BlockChain()
+        blockchain.add_block(proof=1)
+        encoded, length, tip_hash = blockchain.encoded_blocks()
+
+        assert json.loads(encoded) == [block.dict() for block in blockchain.chain]
+        assert (length, tip_hash) == (2, blockchain.last_block.digest)
+        assert blockchain.encoded_blocks()[0] is encoded  # served from the cache
+        page, _, _ = blockchain.encoded_blocks(start=2, limit=1)
+        assert json.loads(page) == [blockchain.chain[1].dict()]
+
+        blockchain.add_block(proof=2)  # extends the cache
+        assert json.loads(blockchain.encoded_blocks()[0]) == [b.dict() for b in blockchain.chain]
+
+        fork = BlockChain()
+        blockchain.replace_chain(fork.chain)  # invalidates the cache
+        assert json.loads(blockchain.encoded_blocks()[0]) == [fork.chain[0].dict()]
+
     @pytest.mark.parametrize(
-        "sender, recipient, amount", [("me", "him", 5), ("you", "her", 10)],
+        "sender, recipient, amount",
+        [("me", "him", 5), ("you", "her", 10)],
     )
     def test_chain_validation(self, sender, recipient, amount):
         blockchain = BlockChain()
         last_block: Block = blockchain.last_block
         mined_proof: int = blockchain.proof_of_work(last_block.proof)
         blockchain.add_transaction(
-            sender=sender, recipient=recipient, amount=amount,
+            sender=sender,
+            recipient=recipient,
+            amount=amount,
         )
         previous_hash: str = blockchain.hash(last_block)
         _ = blockchain.add_block(previous_hash=previous_hash, proof=mined_proof)
@@ -113,8 +170,432 @@ class TestHashingAndProofs:
         blockchain = BlockChain()
         new_block: Block = blockchain.add_block()
 
-        new_block_json_dump: bytes = blockchain.last_block.schema_json().encode()
+        header_fields = {**blockchain.last_block.dict()}
+        del header_fields["transactions"]
+        new_block_json_dump: bytes = json.dumps(
+            header_fields, sort_keys=True, separators=(",", ":")
+        ).encode()
         new_hash = hashlib.sha256(new_block_json_dump).hexdigest()
 
         assert len(new_hash) == 64
         assert new_hash == blockchain.hash(new_block)
+
+    def test_hash_covers_contents(self):
+        blockchain = BlockChain()
+        blockchain.add_transaction(sender="me", recipient="you", amount=1)
+        first_block: Block = blockchain.add_block(previous_hash="abc", proof=1)
+        blockchain.add_transaction(sender="me", recipient="you", amount=2)
+        second_block: Block = blockchain.add_block(previous_hash="abc", proof=1)
+        second_block_copy = Block.parse_obj(
+            {**second_block.dict(), "timestamp": first_block.timestamp}
+        )
+
+        assert blockchain.hash(first_block) != blockchain.hash(second_block_copy)
+
+    def test_equal_contents_hash_equally(self):
+        blockchain = BlockChain()
+        block: Block = blockchain.add_block()
+        assert blockchain.hash(Block.parse_obj(block.dict())) == blockchain.hash(block)
+
+    def test_hash_is_computed_once(self, monkeypatch):
+        blockchain = BlockChain()
+        block: Block = blockchain.add_block()
+        first_hash: str = blockchain.hash(block)
+
+        monkeypatch.setattr(Block, "canonical_bytes", lambda self: pytest.fail("re-hashed"))
+        assert blockchain.hash(block) == first_hash
+        assert blockchain.validate_chain(blockchain.chain) is False  # made-up proof, hashes cached
+
+
+class TestConsensus:
+    def test_common_prefix_of_extended_chain(self):
+        local, peer = _forked_blockchains(shared_blocks=3, local_blocks=0, peer_blocks=2)
+        assert local.common_prefix_length(peer.chain) == 4
+
+    def test_common_prefix_of_forked_chain(self):
+        local, peer = _forked_blockchains(shared_blocks=2, local_blocks=2, peer_blocks=3)
+        assert local.common_prefix_length(peer.chain) == 3
+
+    def test_common_prefix_of_unrelated_chain(self):
+        local, peer = BlockChain(difficulty=4), BlockChain(difficulty=4)
+        mine_blocks(peer, 2)
+        assert local.common_prefix_length(peer.chain) == 0
+
+    def test_only_fork_is_validated(self, monkeypatch):
+        local, peer = _forked_blockchains(shared_blocks=5, local_blocks=1, peer_blocks=3)
+        checked_proofs = []
+        monkeypatch.setattr(
+            "toychain.validation.proof_is_valid",
+            lambda last_proof, new_proof, difficulty: checked_proofs.append(new_proof) or True,
+        )
+
+        validated_chain = local.evaluate_chain("peer", peer.chain)
+        assert [block.proof for block in validated_chain] == [block.proof for block in peer.chain]
+        assert validated_chain[:6] == local.chain[:6]
+        assert checked_proofs == [block.proof for block in peer.chain[6:]]
+
+    def test_verdicts_are_remembered(self, monkeypatch):
+        local, peer = _forked_blockchains(shared_blocks=1, local_blocks=0, peer_blocks=2)
+        first_verdict = local.evaluate_chain("peer", peer.chain)
+
+        monkeypatch.setattr(
+            BlockChain, "validate_chain", lambda *args, **kwargs: pytest.fail("checked")
+        )
+        assert local.evaluate_chain("peer", peer.chain) is first_verdict
+
+    def test_invalid_fork_is_rejected(self):
+        local, peer = _forked_blockchains(shared_blocks=2, local_blocks=0, peer_blocks=1)
+        peer.add_block(proof=-1)
+        assert local.evaluate_chain("peer", peer.chain) is None
+        assert local.peer_verdicts["peer"] == (peer.hash(peer.last_block), None)
+
+    def test_resolve_adopts_longest_valid_chain(self, monkeypatch):
+        local, peer = _forked_blockchains(shared_blocks=2, local_blocks=1, peer_blocks=2)
+        local.register_node("http://127.0.0.1:5001")
+        _serve_chains(monkeypatch, local, {"127.0.0.1:5001": peer.chain})
+
+        assert local.resolve_conflicts() is True
+        assert [local.hash(block) for block in local.chain] == [
+            peer.hash(block) for block in peer.chain
+        ]
+        assert local.resolve_conflicts() is False
+
+    def test_resolve_replaces_chain_off_the_event_loop(self, monkeypatch):
+        local, peer = _forked_blockchains(shared_blocks=2, local_blocks=1, peer_blocks=2)
+        local.register_node("http://127.0.0.1:5001")
+        _serve_chains(monkeypatch, local, {"127.0.0.1:5001": peer.chain})
+        replace_chain, threads = BlockChain.replace_chain, []
+
+        def record_thread(blockchain, new_chain):
+            threads.append(threading.get_ident())
+            replace_chain(blockchain, new_chain)
+
+        monkeypatch.setattr(BlockChain, "replace_chain", record_thread)
+
+        assert local.resolve_conflicts() is True  # runs its event loop in this thread
+        assert threads and threads[0] != threading.get_ident()
+
+    def test_resolve_takes_no_lock_on_the_event_loop(self, monkeypatch):
+        local, peer = _forked_blockchains(shared_blocks=4, local_blocks=3, peer_blocks=5)
+        local.register_node("http://127.0.0.1:5001")
+        _serve_chains(monkeypatch, local, {"127.0.0.1:5001": peer.chain})
+        read_locked, threads = ReadWriteLock.read_locked, []
+
+        def record_thread(lock):
+            threads.append(threading.get_ident())
+            return read_locked(lock)
+
+        monkeypatch.setattr(ReadWriteLock, "read_locked", record_thread)
+
+        assert local.resolve_conflicts() is True  # runs its event loop in this thread
+        assert threads and threading.get_ident() not in threads
+
+    @pytest.mark.parametrize("prefer_packed, serve_packed", [(True, False), (False, True)])
+    def test_resolve_falls_back_on_json(self, monkeypatch, prefer_packed, serve_packed):
+        local, peer = _forked_blockchains(shared_blocks=2, local_blocks=1, peer_blocks=2)
+        local.client.prefer_packed = prefer_packed
+        local.register_node("http://127.0.0.1:5001")
+        _serve_chains(monkeypatch, local, {"127.0.0.1:5001": peer.chain}, packed=serve_packed)
+
+        assert local.resolve_conflicts() is True
+        assert local.chain[-1] == peer.chain[-1]
+
+    def test_resolve_only_downloads_missing_blocks(self, monkeypatch):
+        local, peer = _forked_blockchains(shared_blocks=9, local_blocks=0, peer_blocks=3)
+        local.register_node("http://127.0.0.1:5001")
+        queries = _serve_chains(monkeypatch, local, {"127.0.0.1:5001": peer.chain})
+
+        assert local.resolve_conflicts() is True
+        assert local.chain[:10] == peer.chain[:10]
+        assert queries == [
+            ("http://127.0.0.1:5001/headers", {"start": 10}),
+            ("http://127.0.0.1:5001/chain", {"start": 11, "limit": 3, "stream": "true"}),
+        ]
+
+    def test_resolve_walks_back_to_fork(self, monkeypatch):
+        local, peer = _forked_blockchains(shared_blocks=4, local_blocks=3, peer_blocks=5)
+        local_prefix = local.chain[:5]
+        local.register_node("http://127.0.0.1:5001")
+        queries = _serve_chains(monkeypatch, local, {"127.0.0.1:5001": peer.chain})
+
+        assert local.resolve_conflicts() is True
+        assert [block.proof for block in local.chain] == [block.proof for block in peer.chain]
+        assert all(kept is shared for kept, shared in zip(local.chain, local_prefix))
+        assert queries[-1] == (
+            "http://127.0.0.1:5001/chain",
+            {"start": 6, "limit": 5, "stream": "true"},
+        )
+
+    @pytest.mark.parametrize("served", ["fewer", "other"])
+    def test_resolve_rejects_bodies_not_matching_headers(self, monkeypatch, served):
+        local, peer = _forked_blockchains(shared_blocks=2, local_blocks=0, peer_blocks=3)
+        other = BlockChain(difficulty=4)
+        other.chain = [Block.parse_obj(block.dict()) for block in local.chain]
+        mine_blocks(other, 3, recipient="other")
+        bodies = peer.chain[:-1] if served == "fewer" else other.chain
+        local.register_node("http://127.0.0.1:5001")
+        _serve_chains(monkeypatch, local, {"127.0.0.1:5001": bodies})
+        bodies_get = local.client.session.get
+        _serve_chains(monkeypatch, local, {"127.0.0.1:5001": peer.chain})
+        headers_get = local.client.session.get
+        monkeypatch.setattr(
+            local.client.session,
+            "get",
+            lambda url, **kwargs: (bodies_get if url.endswith("/chain") else headers_get)(
+                url, **kwargs
+            ),
+        )
+        length = len(local.chain)
+
+        assert local.resolve_conflicts() is False
+        assert len(local.chain) == length
+        assert local.peers.get("127.0.0.1:5001").failures == 1
+
+    def test_resolve_falls_back_on_invalid_bodies(self, monkeypatch):
+        local, honest_peer = _forked_blockchains(shared_blocks=2, local_blocks=0, peer_blocks=1)
+        _, lying_peer = _forked_blockchains(shared_blocks=0, local_blocks=0, peer_blocks=0)
+        lying_peer.chain = [Block.parse_obj(block.dict()) for block in local.chain]
+        mine_blocks(lying_peer, 3)
+        _ = [lying_peer.hash(block) for block in lying_peer.chain]  # headers advertise these
+        lying_peer.chain[-2].transactions.append(Transaction(sender="a", recipient="b", amount=5))
+        local.register_node("http://127.0.0.1:5001")
+        local.register_node("http://127.0.0.1:5002")
+        _serve_chains(
+            monkeypatch,
+            local,
+            {"127.0.0.1:5001": honest_peer.chain, "127.0.0.1:5002": lying_peer.chain},
+        )
+
+        assert local.resolve_conflicts() is True
+        assert local.last_block.proof == honest_peer.last_block.proof
+
+    def test_resolve_queries_nodes_concurrently(self, monkeypatch):
+        local, peer = _forked_blockchains(shared_blocks=1, local_blocks=0, peer_blocks=1)
+        nodes = [f"127.0.0.1:{port}" for port in range(5001, 5005)]
+        for node in nodes:
+            local.register_node(f"http://{node}")
+        _serve_chains(monkeypatch, local, {node: peer.chain for node in nodes}, delay=0.3)
+
+        start = time.perf_counter()
+        assert local.resolve_conflicts() is True
+        assert time.perf_counter() - start < 0.3 * len(nodes)
+
+    def test_resolve_skips_failing_and_slow_nodes(self, monkeypatch):
+        local, peer = _forked_blockchains(shared_blocks=1, local_blocks=0, peer_blocks=1)
+        local.register_node("http://127.0.0.1:5001")  # not serving anything
+        local.register_node("http://127.0.0.1:5002")  # too slow
+        local.client.timeout = 0.2
+        _serve_chains(monkeypatch, local, {"127.0.0.1:5002": peer.chain}, delay=0.5)
+
+        assert local.resolve_conflicts() is False
+        assert len(local.chain) == 2
+
+    def test_resolve_respects_consensus_deadline(self, monkeypatch):
+        local, peer = _forked_blockchains(shared_blocks=1, local_blocks=0, peer_blocks=1)
+        local.register_node("http://127.0.0.1:5001")
+        local.consensus_timeout = 0.2
+        _serve_chains(monkeypatch, local, {"127.0.0.1:5001": peer.chain}, delay=0.5)
+
+        start = time.perf_counter()
+        assert local.resolve_conflicts() is False
+        assert time.perf_counter() - start < 0.5
+
+    def test_resolve_queries_best_ranked_nodes(self, monkeypatch):
+        local, peer = _forked_blockchains(shared_blocks=1, local_blocks=0, peer_blocks=2)
+        local.consensus_peers = 2
+        nodes = [f"127.0.0.1:{port}" for port in range(5001, 5005)]
+        for node, height in zip(nodes, (2, 4, 3, 1)):
+            local.register_node(f"http://{node}")
+            local.peers.record_tip(node, height)
+        queries = _serve_chains(monkeypatch, local, {node: peer.chain for node in nodes})
+
+        assert local.resolve_conflicts() is True
+        assert {url for url, _ in queries if url.endswith("/headers")} == {
+            "http://127.0.0.1:5002/headers",
+            "http://127.0.0.1:5003/headers",
+        }
+
+    def test_resolve_records_peer_health(self, monkeypatch):
+        local, peer = _forked_blockchains(shared_blocks=1, local_blocks=0, peer_blocks=1)
+        local.register_node("http://127.0.0.1:5001")
+        local.register_node("http://127.0.0.1:5002")  # not serving anything
+        queries = _serve_chains(monkeypatch, local, {"127.0.0.1:5001": peer.chain})
+
+        assert local.resolve_conflicts() is True
+        answering, failing = local.peers.get("127.0.0.1:5001"), local.peers.get("127.0.0.1:5002")
+        assert (answering.tip_height, answering.tip_hash) == (3, peer.last_block.digest)
+        assert answering.latency is not None and answering.failures == 0
+        assert failing.failures == 1 and failing.last_seen is None
+
+        queries.clear()
+        assert local.resolve_conflicts() is False
+        assert [url for url, _ in queries] == ["http://127.0.0.1:5001/headers"]
+
+    def test_streamed_blocks_are_decoded_as_they_arrive(self, monkeypatch):
+        peer = BlockChain(difficulty=4)
+        mine_blocks(peer, 3)
+        message, _, _ = peer.packed_blocks()
+        response = _FakeResponse(200, message, media_type=wire.MEDIA_TYPE)
+        monkeypatch.setattr(peer.client.session, "get", lambda *args, **kwargs: response)
+
+        records = peer.client.iter_negotiated("127.0.0.1:5001", "/chain", {"stream": "true"})
+        assert Block.parse_packed(next(records)) == peer.chain[0]
+        assert response.raw.tell() < len(message) // 2  # only the first block was read
+        assert [Block.parse_packed(record) for record in records] == peer.chain[1:]
+
+
+class TestBalances:
+    def test_rollback_undoes_dropped_blocks(self):
+        blockchain = BlockChain(difficulty=4)
+        mine_blocks(blockchain, 3)
+        kept = list(blockchain.chain[:2])
+
+        dropped = blockchain.rollback_to(2)
+        assert [block.index for block in dropped] == [3, 4]
+        assert list(blockchain.chain) == kept
+        assert blockchain.balance("miner") == 1
+        assert blockchain.rollback_to(2) == []
+        with pytest.raises(ValueError):
+            blockchain.rollback_to(-1)
+
+    def test_overspending_transactions_are_refused(self):
+        blockchain = BlockChain(difficulty=4, check_balances=True)
+        _mine_rewarded_blocks(blockchain, 1)
+        blockchain.add_transaction(sender="miner", recipient="you", amount=0.75)
+
+        with pytest.raises(ValueError, match="only 0.25 is available"):
+            blockchain.add_transaction(sender="miner", recipient="you", amount=0.5)
+        with pytest.raises(ValueError, match="Transaction 1"):  # atomic: the first is not added
+            blockchain.add_transactions(
+                [
+                    Transaction(sender="miner", recipient="you", amount=0.25),
+                    Transaction(sender="you", recipient="me", amount=-1),
+                ]
+            )
+        assert len(blockchain.mempool) == 1
+        # Resubmitting a waiting transaction is a duplicate, not a second spend
+        assert blockchain.add_transaction(sender="miner", recipient="you", amount=0.75) == 2
+
+    def test_stale_transactions_are_not_mined(self):
+        blockchain = BlockChain(difficulty=4, check_balances=True)
+        _mine_rewarded_blocks(blockchain, 1)
+        blockchain.add_transaction(sender="miner", recipient="you", amount=1)
+        blockchain.rollback_to(1)  # the reward funding the transaction is gone
+
+        block = blockchain.add_block(proof=blockchain.proof_of_work(blockchain.last_block.proof))
+        assert block.transactions == []
+
+    def test_overspending_block_is_not_appended(self):
+        local = BlockChain(difficulty=4, check_balances=True)
+        peer = BlockChain(difficulty=4)
+        peer.chain = [Block.parse_obj(block.dict()) for block in local.chain]
+        peer.add_transaction(sender="nobody", recipient="you", amount=5)
+        peer.add_block(proof=peer.proof_of_work(peer.last_block.proof))
+
+        assert local.append_block(peer.last_block) is False
+        assert len(local.chain) == 1
+
+    def test_overspending_fork_is_rejected(self):
+        local = BlockChain(difficulty=4, check_balances=True)
+        _mine_rewarded_blocks(local, 2)
+        peer = BlockChain(difficulty=4)
+        peer.chain = [Block.parse_obj(block.dict()) for block in local.chain[:2]]
+        # The fork drops a local block rewarding 'miner', which then can not spend 1.5 coins
+        peer.add_transaction(sender="miner", recipient="you", amount=1.5)
+        peer.add_block(proof=peer.proof_of_work(peer.last_block.proof))
+        mine_blocks(peer, 1)
+        assert local.evaluate_chain("peer", peer.chain) is None
+
+        honest = BlockChain(difficulty=4)
+        honest.chain = [Block.parse_obj(block.dict()) for block in local.chain[:2]]
+        mine_blocks(honest, 2)
+        honest.add_transaction(sender="miner", recipient="you", amount=2)
+        honest.add_block(proof=honest.proof_of_work(honest.last_block.proof))
+        assert local.evaluate_chain("honest", honest.chain) is not None
+
+
+class _FakeResponse:
+    def __init__(self, status_code, content=None, lines=(), media_type="application/json"):
+        self.status_code = status_code
+        self._content = content
+        self._lines = lines
+        self.headers = {"content-type": media_type}
+        self.raw = io.BytesIO(content) if isinstance(content, bytes) else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code != 200:
+            raise requests.HTTPError(f"Status {self.status_code}")
+
+    def json(self):
+        return self._content
+
+    @property
+    def content(self):
+        return self._content
+
+    def iter_lines(self):
+        return iter(self._lines)
+
+
+def _serve_chains(
+    monkeypatch, blockchain: BlockChain, chains: dict, delay: float = 0, packed: bool = True
+) -> list:
+    """
+    Have the blockchain's client get the given chains from the nodes' `/headers` and streaming
+    `/chain` endpoints, after some delay. Nodes answer in the binary wire format when asked for it
+    if `packed` is True, and in JSON otherwise. Returns the list of queried urls and parameters.
+    """
+    queries = []
+
+    def fake_get(url, params=None, timeout=None, stream=False, headers=None):
+        time.sleep(delay)
+        queries.append((url, params))
+        node, path = url.split("//")[1].split("/", 1)
+        if node not in chains:
+            raise requests.ConnectionError(f"Nothing at {node}")
+        served = BlockChain()
+        served.chain = chains[node]
+        range_params = {key: value for key, value in params.items() if key != "stream"}
+        blocks = served.blocks_range(**range_params)
+        use_packed = packed and wire.accepts_packed((headers or {}).get("Accept", ""))
+        if path == "headers":
+            if use_packed:
+                records = [block.header().packed_bytes() for block in blocks]
+                message = wire.pack_message(records, len(served.chain))
+                return _FakeResponse(200, message, media_type=wire.MEDIA_TYPE)
+            content = {"headers": [block.header().dict() for block in blocks]}
+            return _FakeResponse(200, {**content, "length": len(served.chain)})
+        assert stream and params["stream"] == "true"
+        if use_packed:
+            message = wire.pack_message([block.packed_bytes() for block in blocks], len(blocks))
+            return _FakeResponse(200, message, media_type=wire.MEDIA_TYPE)
+        lines = [block.canonical_bytes() for block in blocks]
+        return _FakeResponse(200, lines=lines, media_type="application/x-ndjson")
+
+    monkeypatch.setattr(blockchain.client.session, "get", fake_get)
+    return queries
+
+
+def _forked_blockchains(shared_blocks: int, local_blocks: int, peer_blocks: int):
+    local = BlockChain(difficulty=4)
+    mine_blocks(local, shared_blocks)
+    peer = BlockChain(difficulty=4)
+    peer.chain = [Block.parse_obj(block.dict()) for block in local.chain]
+    mine_blocks(local, local_blocks)
+    mine_blocks(peer, peer_blocks)
+    return local, peer
+
+
+def _mine_rewarded_blocks(blockchain: BlockChain, number: int) -> None:
+    for _ in range(number):
+        last_block: Block = blockchain.last_block
+        blockchain.add_block(
+            proof=blockchain.proof_of_work(last_block.proof),
+            reward=Transaction(sender="0", recipient="miner", amount=1),
+        )
@@ -0,0 +1,246 @@
+import asyncio
+import threading
+
+from time import perf_counter
+
+import pytest
+
+from conftest import mine_blocks
+
+from toychain import wire
+from toychain.blockchain import Block, BlockChain
+from toychain.checkpoint import (
+    Checkpoint,
+    pack_checkpoint,
+    pack_state,
+    unpack_checkpoint,
+    unpack_state,
+)
+from toychain.network import PeerClient
+from toychain.storage import FileStore
+
+
+class _CheckpointClient(PeerClient):
+    """Client getting checkpoints, headers and blocks straight from another BlockChain."""
+
+    def __init__(self, peer: BlockChain):
+        super().__init__()
+        self.peer = peer
+
+    def get_negotiated(self, node, path, params=None):
+        if path == "/snapshot":
+            return memoryview(self.peer.open_checkpoint()[1])
+        start, limit = params.get("start", 1), params.get("limit")
+        if path == "/headers":
+            headers = [block.header() for block in self.peer.blocks_range(start, limit)]
+            records = (header.packed_bytes() for header in headers)
+            return memoryview(wire.pack_message(records, len(self.peer.chain)))
+        assert path == "/chain"
+        return memoryview(self.peer.packed_blocks(start, limit)[0])
+
+    def iter_negotiated(self, node, path, params=None):
+        return iter(wire.unpack_message(self.get_negotiated(node, path, params))[1])
+
+
+class TestEncoding:
+    def test_state_round_trip(self):
+        balances = {"miner": 2.5, "dépôt": -0.5, "empty": 0.0}
+        postings = {"miner": [(2, 0), (3, 0)], "dépôt": [(3, 1)], "empty": []}
+        (decoded_balances, decoded_postings), _ = unpack_state(pack_state(balances, postings))
+        assert decoded_balances == balances
+        assert decoded_postings == postings
+
+    def test_checkpoint_round_trip(self, blockchain):
+        blocks = list(blockchain.chain)
+        encoded = pack_checkpoint(
+            len(blocks), blocks[-1].digest, (block.packed_bytes() for block in blocks), b"\0" * 4
+        )
+        height, tip_hash, records, state = unpack_checkpoint(encoded)
+        assert (height, tip_hash, state) == (4, blocks[-1].digest, ({}, {}))
+        assert [Block.parse_packed(record).digest for record in records] == [
+            block.digest for block in blocks
+        ]
+
+    @pytest.mark.parametrize(
+        "damage",
+        [
+            lambda encoded: b"NOPE" + encoded[4:],
+            lambda encoded: encoded[:20],
+            lambda encoded: encoded[:-1],
+            lambda encoded: encoded + b"\0",
+        ],
+    )
+    def test_malformed_checkpoints_are_rejected(self, blockchain, damage):
+        blockchain.write_checkpoint()
+        encoded = blockchain.open_checkpoint()[1]
+        with pytest.raises(ValueError):
+            unpack_checkpoint(damage(encoded))
+
+
+class TestCheckpoints:
+    def test_load_trusted_checkpoint(self, blockchain, monkeypatch):
+        summary = blockchain.write_checkpoint()
+        assert (summary.height, summary.tip_hash) == (4, blockchain.last_block.digest)
+        encoded = blockchain.open_checkpoint()[1]
+
+        joining = BlockChain(difficulty=4)
+        monkeypatch.setattr(BlockChain, "validate_chain", lambda *args, **kwargs: pytest.fail())
+        joining.load_checkpoint(encoded, summary.digest)
+        assert [block.digest for block in joining.chain] == [
+            block.digest for block in blockchain.chain
+        ]
+        assert joining.balance("miner") == 3
+        assert joining.transactions_of("miner") == blockchain.transactions_of("miner")
+        assert joining.checkpoint.digest == summary.digest
+
+    def test_untrusted_checkpoint_is_refused(self, blockchain):
+        blockchain.write_checkpoint()
+        joining = BlockChain(difficulty=4)
+        genesis = joining.last_block
+        with pytest.raises(ValueError, match="not the trusted one"):
+            joining.load_checkpoint(blockchain.open_checkpoint()[1], "0" * 64)
+        assert list(joining.chain) == [genesis]
+
+    def test_checkpoints_are_periodic(self):
+        blockchain = BlockChain(difficulty=4, checkpoint_interval=2)
+        mine_blocks(blockchain, 1)
+        assert blockchain.checkpoint.height == 2
+        mine_blocks(blockchain, 1)
+        assert blockchain.checkpoint.height == 2
+        mine_blocks(blockchain, 1)
+        assert blockchain.checkpoint.height == 4
+
+    def test_readers_are_not_blocked_by_checkpoints(self, monkeypatch):
+        blockchain = BlockChain(difficulty=4, checkpoint_interval=2)
+        writing, release = threading.Event(), threading.Event()
+
+        def slow_pack_checkpoint(*args):
+            writing.set()
+            release.wait(5)
+            return pack_checkpoint(*args)
+
+        monkeypatch.setattr("toychain.blockchain.pack_checkpoint", slow_pack_checkpoint)
+
+        def mine():
+            proof = blockchain.proof_of_work(blockchain.last_block.proof)
+            with blockchain.lock.write_locked():  # as the mining scheduler does
+                blockchain.add_block(proof=proof)
+
+        miner = threading.Thread(target=mine)
+        miner.start()
+        assert writing.wait(5)
+        started = perf_counter()
+        assert len(blockchain.snapshot()) == 2
+        assert blockchain.balance("nobody") == 0.0
+        assert perf_counter() - started < 1
+        assert miner.is_alive()  # still writing the checkpoint
+        release.set()
+        miner.join()
+        assert blockchain.checkpoint.height == 2
+
+    def test_rollback_drops_later_checkpoint(self, blockchain, tmp_path):
+        blockchain.use_checkpoint_file(tmp_path / "checkpoint.bin")
+        blockchain.write_checkpoint()
+        assert (tmp_path / "checkpoint.bin").exists()
+        blockchain.rollback_to(4)
+        assert blockchain.checkpoint is not None
+        blockchain.rollback_to(3)
+        assert blockchain.checkpoint is None
+        assert blockchain.open_checkpoint() is None
+        assert not (tmp_path / "checkpoint.bin").exists()
+
+    def test_checkpoint_file_survives_restarts(self, tmp_path):
+        blockchain = BlockChain(difficulty=4, store=FileStore(tmp_path))
+        blockchain.write_checkpoint()  # kept in memory, then moved to the file
+        blockchain.use_checkpoint_file(tmp_path / "checkpoint.bin")
+        summary = blockchain.checkpoint
+        blockchain.close()
+
+        restarted = BlockChain(difficulty=4, store=FileStore(tmp_path))
+        restarted.use_checkpoint_file(tmp_path / "checkpoint.bin")
+        assert restarted.checkpoint.digest == summary.digest
+        assert Checkpoint.of(restarted.open_checkpoint()[1]).digest == summary.digest
+        restarted.close()
+
+        unrelated = BlockChain(difficulty=4)
+        unrelated.use_checkpoint_file(tmp_path / "checkpoint.bin")
+        assert unrelated.checkpoint is None
+
+    def test_restart_restores_index_from_checkpoint(self, tmp_path, monkeypatch):
+        blockchain = BlockChain(difficulty=4, store=FileStore(tmp_path))
+        blockchain.use_checkpoint_file(tmp_path / "checkpoint.bin")
+        mine_blocks(blockchain, 3)
+        blockchain.write_checkpoint()
+        mine_blocks(blockchain, 2, recipient="other")
+        balances, postings = (
+            dict(blockchain.address_index.balances),
+            blockchain.address_index.postings,
+        )
+        postings = {
+            address: list(address_postings) for address, address_postings in postings.items()
+        }
+        blockchain.close()
+
+        decoded = []
+        original_decode = FileStore._decode
+        monkeypatch.setattr(
+            FileStore,
+            "_decode",
+            lambda store, position: decoded.append(position) or original_decode(store, position),
+        )
+        restarted = BlockChain(difficulty=4)
+        restarted.use_store(FileStore(tmp_path), checkpoint_path=tmp_path / "checkpoint.bin")
+        assert restarted.checkpoint.height == 4
+        assert sorted(decoded) == [3, 4, 5]  # the checkpoint's tip, then the blocks after it
+        assert list(restarted.chain._loaded) == [3]
+        assert dict(restarted.address_index.balances) == balances
+        assert dict(restarted.address_index.postings) == postings
+        restarted.close()
+
+    def test_restart_does_not_write_a_checkpoint(self, tmp_path, monkeypatch):
+        blockchain = BlockChain(difficulty=4, store=FileStore(tmp_path), checkpoint_interval=2)
+        blockchain.use_checkpoint_file(tmp_path / "checkpoint.bin")
+        mine_blocks(blockchain, 3)
+        assert blockchain.checkpoint.height == 4
+        blockchain.close()
+
+        monkeypatch.setattr(
+            "toychain.blockchain.pack_checkpoint", lambda *args: pytest.fail("checkpointed")
+        )
+        restarted = BlockChain(difficulty=4, checkpoint_interval=2)
+        restarted.use_store(FileStore(tmp_path), checkpoint_path=tmp_path / "checkpoint.bin")
+        assert restarted.checkpoint.height == 4
+        restarted.close()
+
+    def test_bootstrap_only_validates_recent_blocks(self, blockchain, monkeypatch):
+        summary = blockchain.write_checkpoint()
+        mine_blocks(blockchain, 2)
+
+        joining = BlockChain(difficulty=4)
+        joining.client.close()
+        joining.client = _CheckpointClient(blockchain)
+        joining.register_node("http://127.0.0.1:5001")
+        checked_proofs = []
+        monkeypatch.setattr(
+            "toychain.validation.proof_is_valid",
+            lambda last_proof, new_proof, difficulty: checked_proofs.append(new_proof) or True,
+        )
+
+        assert asyncio.run(joining.bootstrap("127.0.0.1:5001", summary.digest)) is True
+        assert [block.digest for block in joining.chain] == [
+            block.digest for block in blockchain.chain
+        ]
+        # Headers and then blocks are checked, only after the checkpoint
+        assert set(checked_proofs) == {block.proof for block in blockchain.chain[4:]}
+        assert joining.balance("miner") == 5
+
+    def test_bootstrap_refuses_untrusted_checkpoint(self, blockchain):
+        blockchain.write_checkpoint()
+        joining = BlockChain(difficulty=4)
+        joining.client.close()
+        joining.client = _CheckpointClient(blockchain)
+        joining.register_node("http://127.0.0.1:5001")
+
+        assert asyncio.run(joining.bootstrap("127.0.0.1:5001", "0" * 64)) is False
+        assert len(joining.chain) == 1
+        assert joining.peers.get("127.0.0.1:5001").failures == 1
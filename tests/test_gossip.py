@@ -0,0 +1,212 @@
+import time
+
+from typing import Callable, Dict, List, Tuple
+
+import pytest
+
+from toychain import wire
+from toychain.blockchain import Block, BlockChain, Transaction
+from toychain.gossip import Gossip
+from toychain.mempool import Mempool
+from toychain.network import PeerClient
+
+
+class _RoutingClient(PeerClient):
+    """Client sending queries straight to the nodes of a `_Network`."""
+
+    def __init__(self, network: "_Network"):
+        super().__init__()
+        self.network = network
+
+    def get_negotiated(self, node, path, params=None):
+        return self.network.get(node, path, params)
+
+    def iter_negotiated(self, node, path, params=None):
+        return iter(wire.unpack_message(self.network.get(node, path, params))[1])
+
+    def post_json(self, node, path, content):
+        return self.network.post(node, path, content)
+
+
+class _Network:
+    """Nodes in the same process, whose clients query each other directly."""
+
+    def __init__(self, size: int, fanout: int = 8):
+        origin = BlockChain(difficulty=1)
+        self.gossips: Dict[str, Gossip] = {}
+        self.announcements: List[Tuple[str, str]] = []
+        for number in range(size):
+            address = f"127.0.0.1:{5000 + number}"
+            blockchain = BlockChain(difficulty=1)
+            blockchain.replace_chain([Block.parse_obj(block.dict()) for block in origin.chain])
+            blockchain.client.close()
+            blockchain.client = _RoutingClient(self)
+            self.gossips[address] = Gossip(blockchain, address=address, fanout=fanout)
+        for gossip in self.gossips.values():
+            for address in self.gossips:
+                gossip.blockchain.register_node(f"http://{address}")
+
+    def __getitem__(self, address: str) -> Gossip:
+        return self.gossips[address]
+
+    def close(self):
+        for gossip in self.gossips.values():
+            gossip.close()
+            gossip.blockchain.close()
+
+    def get(self, node, path, params=None):
+        blockchain = self.gossips[node].blockchain
+        start, limit = params.get("start", 1), params.get("limit")
+        if path == "/headers":
+            headers = [block.header() for block in blockchain.blocks_range(start, limit)]
+            records = (header.packed_bytes() for header in headers)
+            return memoryview(wire.pack_message(records, len(blockchain.chain)))
+        assert path == "/chain"
+        return memoryview(blockchain.packed_blocks(start, limit)[0])
+
+    def post(self, node, path, content):
+        gossip = self.gossips[node]
+        if path == "/gossip":
+            self.announcements.append((content["sender"], node))
+            return gossip.receive(
+                content["sender"], content.get("blocks", ()), content.get("transactions", ())
+            )
+        assert path == "/gossip/transactions"
+        found = [gossip.blockchain.mempool.get(bytes.fromhex(hash)) for hash in content["hashes"]]
+        return {"transactions": [transaction.dict() for transaction in found if transaction]}
+
+
+@pytest.fixture
+def network():
+    created: List[_Network] = []
+
+    def create(size: int, fanout: int = 8) -> _Network:
+        created.append(_Network(size, fanout))
+        return created[-1]
+
+    yield create
+    for network in created:
+        network.close()
+
+
+def _wait_for(condition: Callable[[], bool], timeout: float = 10) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+def _mine(blockchain: BlockChain) -> Block:
+    return blockchain.add_block(proof=blockchain.proof_of_work(blockchain.last_block.proof))
+
+
+class TestSeenHashes:
+    def test_hashes_are_seen_once(self):
+        gossip = Gossip(BlockChain(difficulty=1))
+        assert gossip.mark_seen("a") is True
+        assert gossip.mark_seen("a") is False
+
+    def test_oldest_hashes_are_forgotten(self):
+        gossip = Gossip(BlockChain(difficulty=1), seen_capacity=2)
+        for item_hash in ("a", "b", "c"):
+            gossip.mark_seen(item_hash)
+        assert gossip.mark_seen("a") is True
+        assert gossip.mark_seen("c") is False
+
+    def test_nothing_is_announced_without_an_address(self):
+        blockchain = BlockChain(difficulty=1)
+        blockchain.register_node("http://127.0.0.1:5001")
+        assert Gossip(blockchain).announce_block(blockchain.last_block) == []
+
+
+class TestPropagation:
+    def test_block_reaches_every_node(self, network):
+        nodes = network(6)
+        block = _mine(nodes["127.0.0.1:5000"].blockchain)
+        nodes["127.0.0.1:5000"].announce_block(block)
+
+        _wait_for(lambda: all(g.blockchain.last_block == block for g in nodes.gossips.values()))
+        for gossip in nodes.gossips.values():
+            assert [b.index for b in gossip.blockchain.chain] == [1, 2]
+
+    def test_announcements_are_bounded_by_fanout(self, network):
+        nodes = network(6, fanout=2)
+        block = _mine(nodes["127.0.0.1:5000"].blockchain)
+        peers = nodes["127.0.0.1:5000"].announce_block(block)
+
+        assert len(peers) == 2 and "127.0.0.1:5000" not in peers
+        # Every node holding the block announced it once, to 2 peers
+        _wait_for(
+            lambda: len(nodes.announcements)
+            == 2 * sum(len(g.blockchain.chain) == 2 for g in nodes.gossips.values())
+        )
+        senders = [sender for sender, _ in nodes.announcements]
+        assert all(senders.count(sender) == 2 for sender in senders)
+
+    def test_transactions_reach_every_mempool(self, network):
+        nodes = network(4, fanout=2)
+        transactions = [Transaction(sender="me", recipient="you", amount=n) for n in range(3)]
+        origin = nodes["127.0.0.1:5000"]
+        origin.blockchain.add_transactions(transactions)
+        origin.announce_transactions(transactions)
+
+        _wait_for(lambda: all(len(g.blockchain.mempool) == 3 for g in nodes.gossips.values()))
+        for gossip in nodes.gossips.values():
+            assert sorted(gossip.blockchain.mempool.pending(), key=repr) == sorted(
+                transactions, key=repr
+            )
+
+    def test_received_block_clears_the_mempool(self, network):
+        nodes = network(2)
+        origin, receiver = nodes["127.0.0.1:5000"], nodes["127.0.0.1:5001"]
+        transaction = Transaction(sender="me", recipient="you", amount=1)
+        origin.blockchain.add_transaction(**transaction.dict())
+        receiver.blockchain.add_transaction(**transaction.dict())
+
+        origin.announce_block(_mine(origin.blockchain))
+        _wait_for(lambda: len(receiver.blockchain.chain) == 2)
+        assert len(receiver.blockchain.mempool) == 0
+        assert receiver.blockchain.mempool.get(Mempool.hash(transaction)) is None
+
+    def test_node_behind_synchronizes(self, network):
+        nodes = network(2)
+        origin, receiver = nodes["127.0.0.1:5000"], nodes["127.0.0.1:5001"]
+        for _ in range(3):
+            block = _mine(origin.blockchain)
+
+        origin.announce_block(block)
+        _wait_for(lambda: len(receiver.blockchain.chain) == 4)
+        assert list(receiver.blockchain.chain) == list(origin.blockchain.chain)
+
+    def test_mismatching_block_is_not_appended(self, network):
+        nodes = network(2)
+        origin, receiver = nodes["127.0.0.1:5000"], nodes["127.0.0.1:5001"]
+        _mine(origin.blockchain)
+
+        assert receiver.receive("127.0.0.1:5000", blocks=[{"hash": "0" * 64, "index": 2}]) == {
+            "blocks": 1,
+            "transactions": 0,
+        }
+        receiver.close()
+        assert len(receiver.blockchain.chain) == 1
+        assert receiver.mark_seen("0" * 64) is True  # forgotten, to handle a later announcement
+
+    def test_unregistered_senders_are_ignored(self, network):
+        nodes = network(2)
+        origin, receiver = nodes["127.0.0.1:5000"], nodes["127.0.0.1:5001"]
+        block = _mine(origin.blockchain)
+        announced = [{"hash": block.digest, "index": block.index + 5}]
+
+        fetching = receiver.receive("10.0.0.1:80", blocks=announced, transactions=["0" * 64])
+        assert fetching == {"blocks": 0, "transactions": 0}
+        assert "10.0.0.1:80" not in receiver.blockchain.peers
+        assert receiver.mark_seen(block.digest) is True  # not even remembered
+
+    def test_duplicate_announcements_are_fetched_once(self, network):
+        nodes = network(2)
+        origin, receiver = nodes["127.0.0.1:5000"], nodes["127.0.0.1:5001"]
+        block = _mine(origin.blockchain)
+        announced = [{"hash": block.digest, "index": block.index}]
+
+        assert receiver.receive("127.0.0.1:5000", blocks=announced)["blocks"] == 1
+        assert receiver.receive("127.0.0.1:5000", blocks=announced)["blocks"] == 0
@@ -0,0 +1,67 @@
+import pytest
+
+from toychain.blockchain import Block, BlockChain
+from toychain.index import AddressIndex
+
+
+@pytest.fixture()
+def blockchain():
+    blockchain = BlockChain(difficulty=4)
+    for sender, recipient, amount in [("0", "alice", 10), ("alice", "bob", 4), ("bob", "bob", 1)]:
+        blockchain.add_transaction(sender="0", recipient="miner", amount=1)
+        blockchain.add_transaction(sender=sender, recipient=recipient, amount=amount)
+        blockchain.add_block(proof=blockchain.proof_of_work(blockchain.last_block.proof))
+    return blockchain
+
+
+class TestAddressIndex:
+    def test_balances(self, blockchain):
+        assert blockchain.balance("alice") == 6
+        assert blockchain.balance("bob") == 4
+        assert blockchain.balance("miner") == 3
+        assert blockchain.balance("nobody") == 0
+
+    def test_postings(self, blockchain):
+        assert blockchain.address_index.postings_of("alice") == [(2, 1), (3, 1)]
+        assert blockchain.address_index.postings_of("bob") == [(3, 1), (4, 1)]
+        assert [transaction.amount for _, transaction in blockchain.transactions_of("alice")] == [
+            10,
+            4,
+        ]
+
+    def test_removing_blocks_restores_index(self, blockchain):
+        index = AddressIndex()
+        index.rebuild(blockchain.chain[:2])
+        for block in reversed(blockchain.chain[2:]):
+            blockchain.address_index.remove_block(block)
+
+        assert dict(blockchain.address_index.balances) == dict(index.balances)
+        assert dict(blockchain.address_index.postings) == dict(index.postings)
+
+    def test_replacing_chain_updates_index(self, blockchain):
+        fork = BlockChain(difficulty=4)
+        fork.chain = blockchain.chain[:2]
+        for _ in range(3):
+            fork.add_transaction(sender="alice", recipient="carol", amount=2)
+            fork.add_block(proof=fork.proof_of_work(fork.last_block.proof))
+
+        blockchain.replace_chain(fork.chain)
+        assert blockchain.balance("alice") == 4
+        assert blockchain.balance("bob") == 0
+        assert blockchain.balance("carol") == 6
+        assert blockchain.address_index.postings_of("carol") == [(3, 0), (4, 0), (5, 0)]
+
+    def test_index_is_rebuilt_from_store(self, blockchain):
+        restored = BlockChain(difficulty=4, store=blockchain.chain)
+        assert restored.balance("alice") == 6
+        assert restored.transactions_of("bob") == blockchain.transactions_of("bob")
+
+    def test_restored_index_matches_rebuilt_one(self, blockchain):
+        index = AddressIndex()
+        index.rebuild(blockchain.chain[:2])
+        index.restore(blockchain.address_index.balances, blockchain.address_index.postings)
+        index.remove_block(blockchain.chain[-1])
+
+        assert index.balance("alice") == 6
+        assert index.balance("bob") == 4
+        assert index.postings_of("bob") == [(3, 1)]
@@ -0,0 +1,154 @@
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from toychain.blockchain import BlockChain, Transaction
+from toychain.index import AddressIndex
+from toychain.locking import ReadWriteLock
+
+
+class TestReadWriteLock:
+    def test_readers_share_the_lock(self):
+        lock = ReadWriteLock()
+        inside = threading.Barrier(4, timeout=5)
+
+        def read():
+            with lock.read_locked():
+                inside.wait()  # only passes if all readers hold the lock at once
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            for future in [executor.submit(read) for _ in range(4)]:
+                future.result()
+
+    def test_writer_excludes_readers(self):
+        lock = ReadWriteLock()
+        events = []
+        writing = threading.Event()
+
+        def write():
+            with lock.write_locked():
+                writing.set()
+                events.append("write start")
+                threading.Event().wait(0.05)
+                events.append("write end")
+
+        def read():
+            writing.wait()
+            with lock.read_locked():
+                events.append("read")
+
+        threads = [threading.Thread(target=write), threading.Thread(target=read)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert events == ["write start", "write end", "read"]
+
+    def test_reentrancy(self):
+        lock = ReadWriteLock()
+        with lock.write_locked():
+            with lock.write_locked():
+                with lock.read_locked():
+                    pass
+        with lock.read_locked():
+            with lock.read_locked():
+                pass
+        with lock.write_locked():  # everything was released
+            pass
+
+    def test_after_write(self):
+        lock = ReadWriteLock()
+        calls = []
+
+        def record():
+            with lock.read_locked():  # called once the lock is released
+                calls.append(lock._writer)
+
+        lock.after_write(record)
+        assert calls == [None]
+        with lock.write_locked():
+            with lock.write_locked():
+                lock.after_write(record)
+                lock.after_write(record)
+            assert len(calls) == 1
+        assert calls == [None, None]
+
+    def test_upgrading_a_read_raises(self):
+        lock = ReadWriteLock()
+        with lock.read_locked():
+            with pytest.raises(RuntimeError):
+                with lock.write_locked():
+                    pass
+        with lock.write_locked():
+            pass
+
+
+class TestConcurrentBlockChain:
+    def test_concurrent_writers_and_readers(self):
+        blockchain = BlockChain(difficulty=1, block_size=50)
+        submitted = [
+            Transaction(sender=f"sender{thread}", recipient="you", amount=number)
+            for thread in range(4)
+            for number in range(250)
+        ]
+        snapshots = []
+
+        def submit(thread: int):
+            for transaction in submitted[thread * 250 : (thread + 1) * 250]:
+                blockchain.add_transaction(**transaction.dict())
+
+        def mine():
+            for _ in range(20):
+                blockchain.add_block(proof=1)
+
+        def read():
+            for _ in range(50):
+                snapshots.append(blockchain.snapshot())
+                blockchain.balance("you")
+                blockchain.transactions_of("you")
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [executor.submit(submit, thread) for thread in range(4)]
+            futures += [executor.submit(mine), executor.submit(read), executor.submit(read)]
+            for future in futures:
+                future.result()
+
+        mined = [tx for block in blockchain.chain[1:] for tx in block.transactions]
+        recorded = mined + blockchain.mempool.pending()
+        assert sorted(recorded, key=repr) == sorted(submitted, key=repr)
+
+        for chain in snapshots + [tuple(blockchain.chain)]:
+            assert [block.index for block in chain] == list(range(1, len(chain) + 1))
+            for previous, block in zip(chain, chain[1:]):
+                assert block.previous_hash == previous.digest
+
+        rebuilt = AddressIndex()
+        rebuilt.rebuild(blockchain.chain)
+        assert dict(blockchain.address_index.balances) == dict(rebuilt.balances)
+        assert dict(blockchain.address_index.postings) == dict(rebuilt.postings)
+
+    def test_readers_see_whole_chains_during_replacement(self):
+        blockchain = BlockChain(difficulty=1)
+        longer = BlockChain(difficulty=1)
+        for _ in range(30):
+            longer.add_block(proof=1)
+        replaced = threading.Event()
+        lengths = set()
+
+        def read():
+            while not replaced.is_set():
+                chain = blockchain.snapshot()
+                lengths.add(len(chain))
+                assert chain[-1].index == len(chain)
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            readers = [executor.submit(read) for _ in range(2)]
+            blockchain.replace_chain(longer.chain)
+            replaced.set()
+            for reader in readers:
+                reader.result()
+
+        assert lengths <= {1, 31}
+        assert blockchain.chain[-1] == longer.chain[-1]
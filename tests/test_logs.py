@@ -0,0 +1,58 @@
+import io
+import sys
+
+import pytest
+
+from loguru import logger
+
+from toychain.blockchain import BlockChain
+from toychain.logs import LOGGING, LogLevel, configure_logging
+
+
+@pytest.fixture
+def sink():
+    stream = io.StringIO()
+    yield stream
+    configure_logging("DEBUG", sys.stderr)  # loguru's default
+
+
+class TestLogLevel:
+    @pytest.mark.parametrize(
+        "name, trace, debug",
+        [("TRACE", True, True), ("debug", False, True), ("INFO", False, False)],
+    )
+    def test_flags(self, name, trace, debug):
+        level = LogLevel(name)
+        assert level.name == name.upper()
+        assert (level.trace, level.debug) == (trace, debug)
+
+    def test_unknown_level(self):
+        with pytest.raises(ValueError):
+            LogLevel("VERBOSE")
+
+
+class TestConfigureLogging:
+    def test_filters_levels(self, sink):
+        configure_logging("info", sink)
+        assert LOGGING.name == "INFO" and not LOGGING.debug
+        logger.debug("Hidden {}", "message")
+        logger.info("Shown {}", "message")
+        assert "Hidden" not in sink.getvalue()
+        assert "Shown message" in sink.getvalue()
+
+    def test_hot_paths_skip_logging(self, sink):
+        configure_logging("INFO", sink)
+        blockchain = BlockChain(difficulty=4)
+        blockchain.add_block(proof=blockchain.proof_of_work(blockchain.last_block.proof))
+        assert blockchain.validate_chain(blockchain.chain)
+        assert "DEBUG" not in sink.getvalue()
+        assert "Added block to the chain" in sink.getvalue()
+
+    def test_hot_paths_log_at_debug(self, sink):
+        configure_logging("TRACE", sink)
+        blockchain = BlockChain(difficulty=4)
+        blockchain.add_block(proof=blockchain.proof_of_work(blockchain.last_block.proof))
+        assert blockchain.validate_chain(blockchain.chain)
+        assert "Mined block proof" in sink.getvalue()
+        assert "Determining chain validity" in sink.getvalue()
+        assert "Chain is valid" in sink.getvalue()
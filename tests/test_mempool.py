@@ -0,0 +1,107 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from toychain.blockchain import BlockChain, Transaction
+from toychain.mempool import Mempool
+
+
+def _transactions(number: int, sender: str = "me"):
+    return [Transaction(sender=sender, recipient="you", amount=amount) for amount in range(number)]
+
+
+class TestMempool:
+    def test_duplicates_are_dropped(self):
+        mempool = Mempool(capacity=32, shards=4)
+        assert mempool.add(Transaction(sender="me", recipient="you", amount=1))
+        assert not mempool.add(Transaction(sender="me", recipient="you", amount=1.0))
+        assert mempool.add_many(_transactions(3)) == 2
+        assert len(mempool) == 3
+        assert Transaction(sender="me", recipient="you", amount=2) in mempool
+
+    def test_take_in_arrival_order(self):
+        mempool = Mempool(capacity=1_000, shards=8)
+        transactions = _transactions(100)
+        mempool.add_many(transactions)
+
+        assert mempool.take(30) == transactions[:30]
+        assert mempool.pending() == transactions[30:]
+        assert mempool.take(1_000) == transactions[30:]
+        assert len(mempool) == 0
+
+    def test_spending_is_tallied(self):
+        mempool = Mempool(capacity=3, shards=1)
+        mempool.add_many(_transactions(4))  # amounts 0 to 3
+        mempool.add(Transaction(sender="other", recipient="you", amount=5))
+        assert mempool.spending("me") == 5
+        assert mempool.spending("other") == 5
+
+        mempool.discard([Transaction(sender="other", recipient="you", amount=5)])
+        mempool.take(1)
+        assert mempool.spending("other") == 0
+        assert mempool.spending("me") == 3
+        assert mempool.spending("nobody") == 0
+
+    def test_capacity_evicts_oldest(self):
+        mempool = Mempool(capacity=8, shards=1)
+        transactions = _transactions(10)
+        mempool.add_many(transactions)
+
+        assert len(mempool) == 8
+        assert mempool.evicted == 2
+        assert mempool.pending() == transactions[2:]
+
+    def test_capacity_below_shards(self):
+        with pytest.raises(ValueError):
+            Mempool(capacity=2, shards=4)
+
+    def test_concurrent_additions(self):
+        mempool = Mempool(capacity=10_000, shards=16)
+        batches = [_transactions(500, sender=f"sender-{number}") for number in range(8)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            added = sum(executor.map(mempool.add_many, batches + batches))
+
+        assert added == len(mempool) == 4_000
+
+    def test_get_and_discard(self):
+        mempool = Mempool(capacity=32, shards=4)
+        transactions = _transactions(5)
+        mempool.add_many(transactions)
+
+        assert mempool.get(Mempool.hash(transactions[3])) is transactions[3]
+        assert mempool.discard(transactions[:2] + _transactions(1, sender="him")) == 2
+        assert mempool.get(Mempool.hash(transactions[0])) is None
+        assert mempool.pending() == transactions[2:]
+
+
+class TestBlockChainMempool:
+    def test_blocks_take_bounded_slices(self):
+        blockchain = BlockChain(block_size=10)
+        transactions = _transactions(25)
+        blockchain.add_transactions(transactions)
+
+        assert blockchain.add_block().transactions == transactions[:10]
+        assert blockchain.add_block().transactions == transactions[10:20]
+        assert blockchain.add_block().transactions == transactions[20:]
+
+    def test_reward_comes_first(self):
+        blockchain = BlockChain(block_size=10)
+        blockchain.add_transactions(_transactions(25))
+        reward = Transaction(sender="0", recipient="miner", amount=1)
+        block = blockchain.add_block(reward=reward)
+
+        assert len(block.transactions) == 10
+        assert block.transactions[0] is reward
+        assert len(blockchain.mempool) == 16
+
+    def test_appended_block_leaves_the_mempool(self):
+        miner, receiver = BlockChain(difficulty=1), BlockChain(difficulty=1)
+        receiver.replace_chain(miner.chain)
+        transactions = _transactions(5)
+        miner.add_transactions(transactions[:3])
+        receiver.add_transactions(transactions)
+        block = miner.add_block(proof=miner.proof_of_work(miner.last_block.proof))
+
+        assert receiver.append_block(block)
+        assert receiver.last_block is block
+        assert receiver.mempool.pending() == transactions[3:]
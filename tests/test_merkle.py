@@ -0,0 +1,74 @@
+import hashlib
+
+import pytest
+
+from toychain.blockchain import (
+    Block,
+    BlockChain,
+    BlockHeader,
+    Transaction,
+    verify_transaction_proof,
+)
+from toychain.merkle import merkle_proof, merkle_root, root_from_proof
+
+
+def _leaves(number: int):
+    return [f"transaction {position}".encode() for position in range(number)]
+
+
+class TestMerkleTree:
+    def test_empty_tree(self):
+        assert merkle_root([]) == hashlib.sha256(b"").hexdigest()
+
+    @pytest.mark.parametrize("number", [1, 2, 3, 5, 8, 13])
+    def test_every_leaf_proves_to_root(self, number):
+        leaves = _leaves(number)
+        root = merkle_root(leaves)
+        for position, leaf in enumerate(leaves):
+            proof = merkle_proof(leaves, position)
+            assert len(proof) <= (number - 1).bit_length()
+            assert root_from_proof(leaf, proof) == root
+
+    def test_root_covers_order(self):
+        leaves = _leaves(4)
+        assert merkle_root(leaves) != merkle_root(leaves[::-1])
+
+    def test_proof_of_missing_leaf(self):
+        with pytest.raises(IndexError):
+            merkle_proof(_leaves(3), 3)
+
+
+class TestTransactionProofs:
+    @pytest.fixture()
+    def block(self):
+        blockchain = BlockChain()
+        for amount in range(7):
+            blockchain.add_transaction(sender="me", recipient="you", amount=amount)
+        return blockchain.add_block()
+
+    def test_verify_proofs(self, block):
+        for position, transaction in enumerate(block.transactions):
+            proof = block.transaction_proof(position)
+            assert verify_transaction_proof(transaction, proof, block.merkle_root)
+
+    def test_reject_other_transaction(self, block):
+        proof = block.transaction_proof(2)
+        forged = Transaction(sender="me", recipient="you", amount=100)
+        assert not verify_transaction_proof(forged, proof, block.merkle_root)
+
+    @pytest.mark.parametrize("proof", [[{"hash": "zz", "side": "left"}], [{"side": "up"}]])
+    def test_reject_malformed_proofs(self, block, proof):
+        assert not verify_transaction_proof(block.transactions[0], proof, block.merkle_root)
+
+    def test_hash_covers_header_only(self, block):
+        assert block.digest == block.header().digest
+        assert BlockHeader.parse_obj(block.header().dict()).digest == block.digest
+
+    def test_reject_header_not_matching_hash(self, block):
+        with pytest.raises(ValueError):
+            BlockHeader.parse_obj({**block.header().dict(), "proof": 12})
+
+    def test_merkle_root_computed_when_missing(self, block):
+        content = block.dict()
+        del content["merkle_root"]
+        assert Block.parse_obj(content).merkle_root == block.merkle_root
@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from toychain.blockchain import BlockChain
+from toychain.metrics import METRICS, Registry
+
+
+@pytest.fixture
+def registry():
+    return Registry(enabled=True)
+
+
+@pytest.fixture
+def enabled_metrics():
+    METRICS.reset()
+    METRICS.enabled = True
+    yield METRICS
+    METRICS.enabled = False
+    METRICS.reset()
+
+
+class TestRegistry:
+    def test_nothing_is_recorded_when_disabled(self, registry):
+        counter = registry.counter("hashes_total", "Hashes")
+        histogram = registry.histogram("seconds", "Durations")
+        registry.enabled = False
+
+        counter.inc(5)
+        histogram.observe(1.0)
+        with histogram.time():
+            pass
+        assert histogram.time() is histogram.time()  # a shared no-op context manager
+        assert counter.value() == 0
+        assert histogram.count() == 0
+        assert registry.render() == ""
+
+    def test_names_are_unique(self, registry):
+        registry.counter("hashes_total", "Hashes")
+        with pytest.raises(ValueError):
+            registry.gauge("hashes_total", "Hashes")
+
+    def test_counters_and_gauges(self, registry):
+        counter = registry.counter("requests_total", "Requests", labels=("path",))
+        gauge = registry.gauge("rate", "Rate")
+        counter.inc(labels=("/chain",))
+        counter.inc(2, labels=("/chain",))
+        counter.inc(labels=('say "hi"\n',))
+        gauge.set(2.5)
+
+        assert registry.render() == (
+            "# HELP requests_total Requests\n"
+            "# TYPE requests_total counter\n"
+            'requests_total{path="/chain"} 3\n'
+            'requests_total{path="say \\"hi\\"\\n"} 1\n'
+            "# HELP rate Rate\n"
+            "# TYPE rate gauge\n"
+            "rate 2.5\n"
+        )
+
+    def test_histograms(self, registry):
+        histogram = registry.histogram("seconds", "Durations", labels=("stage",), buckets=(1, 2))
+        for value in (0.5, 1, 1.5, 3):
+            histogram.observe(value, ("headers",))
+
+        assert histogram.count(("headers",)) == 4
+        assert registry.render().splitlines()[2:] == [
+            'seconds_bucket{stage="headers",le="1"} 2',
+            'seconds_bucket{stage="headers",le="2"} 3',
+            'seconds_bucket{stage="headers",le="+Inf"} 4',
+            'seconds_sum{stage="headers"} 6.0',
+            'seconds_count{stage="headers"} 4',
+        ]
+
+    def test_timing(self, registry):
+        histogram = registry.histogram("seconds", "Durations")
+        with pytest.raises(RuntimeError):
+            with histogram.time():
+                raise RuntimeError("still timed")
+        assert histogram.count() == 1
+
+
+class TestInstrumentation:
+    def test_mining_and_validation(self, enabled_metrics):
+        blockchain = BlockChain(difficulty=4)
+        proof = blockchain.proof_of_work(blockchain.last_block.proof)
+        blockchain.add_block(proof=proof)
+        assert blockchain.validate_chain(blockchain.chain)
+
+        rendered = enabled_metrics.render()
+        assert f"toychain_mining_hashes_total {proof + 1}" in rendered
+        assert 'toychain_mining_seconds_count{outcome="found"} 1' in rendered
+        assert "toychain_mining_hashes_per_second" in rendered
+        assert 'toychain_validation_seconds_count{valid="true"} 1' in rendered
+        assert "toychain_validated_blocks_total 1" in rendered
+        assert "toychain_block_hashes_total" in rendered
+
+    def test_stopped_mining_counts_searched_candidates(self, enabled_metrics):
+        blockchain = BlockChain(difficulty=64)
+        assert blockchain.proof_of_work(100, should_stop=lambda searched: searched > 0) is None
+        rendered = enabled_metrics.render()
+        assert 'toychain_mining_seconds_count{outcome="stopped"} 1' in rendered
+        assert f"toychain_mining_hashes_total {blockchain.miner.stoppable_chunk_size}" in rendered
+
+    def test_consensus_and_peer_queries(self, enabled_metrics):
+        blockchain = BlockChain(difficulty=4, peer_timeout=0.5)
+        blockchain.register_node("http://127.0.0.1:1")  # nothing listens there
+        assert asyncio.run(blockchain.resolve_conflicts_async()) is False
+
+        rendered = enabled_metrics.render()
+        assert 'toychain_consensus_seconds_count{outcome="kept"} 1' in rendered
+        assert 'toychain_peer_query_seconds_count{node="127.0.0.1:1",stage="headers"} 1' in rendered
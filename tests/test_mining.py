@@ -0,0 +1,118 @@
+import hashlib
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from toychain.blockchain import BlockChain
+from toychain.mining import ParallelMiner, max_digest, proof_is_valid, search_range
+from toychain.parallel import first_in_order
+
+
+class TestSerialSearch:
+    @pytest.mark.parametrize("last_proof", [100, 35293, 1])
+    def test_search_finds_valid_proof(self, last_proof):
+        proof = search_range(last_proof, 0)
+        assert BlockChain.validate_proof(last_proof=last_proof, new_proof=proof)
+
+    def test_search_finds_smallest_proof(self):
+        proof = search_range(100, 0)
+        assert not any(BlockChain.validate_proof(100, candidate) for candidate in range(proof))
+
+    @pytest.mark.parametrize("last_proof", [100, 35293, 1.5, None])
+    def test_kernel_accepts_same_proofs(self, last_proof):
+        for new_proof in range(20_000):
+            guess = f"{last_proof}{new_proof}".encode()
+            expected = hashlib.sha256(guess).hexdigest()[:4] == "0000"
+            assert proof_is_valid(last_proof, new_proof) is expected
+
+    def test_search_across_batches(self):
+        proof = search_range(100, 0)
+        assert search_range(100, proof - 5_000, proof + 1) == proof
+        assert search_range(100, proof + 1, proof + 2) is None
+
+    def test_search_in_empty_range(self):
+        proof = search_range(100, 0)
+        assert search_range(100, 0, proof) is None
+
+
+class TestDifficulty:
+    @pytest.mark.parametrize(
+        "difficulty, expected", [(0, b"\xff" * 32), (8, b"\x00" + b"\xff" * 31)]
+    )
+    def test_max_digest(self, difficulty, expected):
+        assert max_digest(difficulty) == expected
+
+    @pytest.mark.parametrize("difficulty", [-1, 257])
+    def test_invalid_difficulty(self, difficulty):
+        with pytest.raises(ValueError):
+            max_digest(difficulty)
+
+    @pytest.mark.parametrize("difficulty", [0, 1, 5, 8, 11])
+    def test_search_matches_leading_zero_bits(self, difficulty):
+        proof = search_range(100, 0, difficulty=difficulty)
+        for candidate in range(proof + 1):
+            digest = hashlib.sha256(f"100{candidate}".encode()).digest()
+            leading_zero_bits = 256 - int.from_bytes(digest, "big").bit_length()
+            assert (leading_zero_bits >= difficulty) is (candidate == proof)
+
+    def test_blocks_record_difficulty(self):
+        blockchain = BlockChain(difficulty=8)
+        last_block = blockchain.last_block
+        proof = blockchain.proof_of_work(last_block.proof)
+        block = blockchain.add_block(previous_hash=blockchain.hash(last_block), proof=proof)
+
+        assert block.difficulty == 8
+        assert blockchain.validate_proof(last_block.proof, proof, difficulty=8)
+        assert blockchain.validate_chain(blockchain.chain)
+
+    def test_chain_below_required_difficulty_is_invalid(self):
+        easy_blockchain = BlockChain(difficulty=4)
+        last_block = easy_blockchain.last_block
+        proof = easy_blockchain.proof_of_work(last_block.proof)
+        easy_blockchain.add_block(previous_hash=easy_blockchain.hash(last_block), proof=proof)
+
+        assert easy_blockchain.validate_chain(easy_blockchain.chain)
+        assert BlockChain(difficulty=8).validate_chain(easy_blockchain.chain) is False
+
+
+class TestParallelMiner:
+    @pytest.mark.parametrize("last_proof", [100, 35293])
+    @pytest.mark.parametrize("difficulty", [12, 16])
+    def test_parallel_matches_serial(self, last_proof, difficulty):
+        miner = ParallelMiner(workers=2, chunk_size=1_000)
+        try:
+            expected = search_range(last_proof, 0, difficulty=difficulty)
+            assert miner.mine(last_proof, difficulty=difficulty) == expected
+        finally:
+            miner.close()
+
+    def test_single_worker_mines_serially(self):
+        miner = ParallelMiner(workers=1)
+        assert miner.mine(100) == search_range(100, 0)
+        assert miner._executor is None
+
+    def test_blockchain_uses_miner(self):
+        blockchain = BlockChain(mining_workers=2)
+        blockchain.miner.chunk_size = 1_000
+        try:
+            assert blockchain.proof_of_work(100) == search_range(100, 0)
+        finally:
+            blockchain.miner.close()
+
+
+class TestFirstInOrder:
+    @pytest.mark.parametrize("window", [1, 3, 8])
+    def test_returns_earliest_hit(self, window):
+        tasks = [(value,) for value in [1, 3, 4, 6, 7, 9]]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            hit = first_in_order(executor, _even_or_none, tasks, window=window)
+        assert hit == (2, 4)
+
+    def test_no_hit(self):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            assert first_in_order(executor, _even_or_none, [(1,), (3,)], window=2) is None
+
+
+def _even_or_none(value):
+    return value if value % 2 == 0 else None
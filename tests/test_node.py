@@ -1,3 +1,4 @@
+import json
 import time
 
 from multiprocessing import Process
@@ -8,7 +9,18 @@ import uvicorn
 
 from fastapi.testclient import TestClient
 
-from toychain.node import node
+from toychain import wire
+from toychain.blockchain import (
+    Block,
+    BlockChain,
+    BlockHeader,
+    Transaction,
+    verify_transaction_proof,
+)
+from toychain.checkpoint import Checkpoint
+from toychain.mempool import Mempool
+from toychain.metrics import METRICS
+from toychain.node import NODE_IDENTIFIER, blockchain, node
 
 
 class TestGETEndpoints:
@@ -33,19 +45,35 @@ class TestGETEndpoints:
         response = client.get("/mine")
 
         assert response.status_code == 200
-        assert response.json()["message"] == "New Block Forged"
+        assert response.json()["message"] == "Mining job queued"
+        job = _wait_for_job(client, response.json()["job_id"])
+        assert job["state"] == "done"
 
         # Chain is initialized with 1 block at creation, so adding one puts it at index 2
-        assert response.json()["index"] == 2
+        assert job["block_index"] == 2
+        assert job["tip_index"] == 1
+        block = client.get("/blocks", params={"start": 2}).json()["blocks"][0]
 
         # 'transactions' key is a list, should only contain 1 element
-        assert isinstance(response.json()["transactions"], list)
-        assert response.json()["transactions"][0]["sender"] == "0"
-        assert isinstance(response.json()["transactions"][0]["recipient"], str)
-        assert response.json()["transactions"][0]["amount"] == 1
+        assert isinstance(block["transactions"], list)
+        assert block["transactions"][0]["sender"] == "0"
+        assert isinstance(block["transactions"][0]["recipient"], str)
+        assert block["transactions"][0]["amount"] == 1
 
-        assert isinstance(response.json()["proof"], int)
-        assert isinstance(response.json()["previous_hash"], str)
+        assert isinstance(block["proof"], int)
+        assert isinstance(block["previous_hash"], str)
+
+    def test_mining_status(self):
+        client = TestClient(node)
+        response = client.get("/mine/status")
+
+        assert response.status_code == 200
+        assert response.json()["active_job"] is None
+        assert response.json()["jobs"]["done"] == 1
+
+    def test_unknown_mining_job(self):
+        client = TestClient(node)
+        assert client.get("/mine/nonsense").status_code == 404
 
     def test_get_chain(self):
         client = TestClient(node)
@@ -55,6 +83,190 @@ class TestGETEndpoints:
         assert isinstance(response.json()["chain"], list)
         assert response.json()["length"] == 2
 
+    @pytest.mark.parametrize("start, limit, indices", [(2, None, [2]), (1, 1, [1]), (4, 2, [])])
+    def test_get_chain_page(self, start, limit, indices):
+        client = TestClient(node)
+        params = {"start": start} if limit is None else {"start": start, "limit": limit}
+        response = client.get("/chain", params=params)
+
+        assert response.status_code == 200
+        assert response.json()["length"] == 2
+        assert [block["index"] for block in response.json()["chain"]] == indices
+
+    @pytest.mark.parametrize("path", ["/chain", "/headers", "/blocks"])
+    @pytest.mark.parametrize(
+        "params", [{"start": 0}, {"start": -1}, {"limit": -1}, {"limit": -1, "stream": True}]
+    )
+    def test_invalid_range(self, path, params):
+        client = TestClient(node)
+        response = client.get(path, params=params)
+
+        assert response.status_code == 422
+
+    def test_chain_etag(self):
+        client = TestClient(node)
+        response = client.get("/chain")
+        etag = response.headers["etag"]
+
+        assert client.get("/chain", headers={"If-None-Match": etag}).status_code == 304
+        assert client.get("/chain", headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+        assert client.get("/blocks", headers={"If-None-Match": etag}).status_code == 304
+        stale = client.get("/chain", headers={"If-None-Match": '"1-stale"'})
+        assert stale.status_code == 200
+        assert stale.json() == response.json()
+
+    def test_not_modified_chain_is_not_encoded(self, monkeypatch):
+        client = TestClient(node)
+        etag = client.get("/chain", params={"start": 2}).headers["etag"]
+        assert client.get("/chain").headers["etag"] != etag
+        assert client.get("/chain", headers={"Accept": wire.MEDIA_TYPE}).headers["etag"] != etag
+
+        monkeypatch.setattr(BlockChain, "encoded_blocks", lambda *args: pytest.fail("encoded"))
+        cached = client.get("/chain", params={"start": 2}, headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.headers["etag"] == etag
+
+    @pytest.mark.parametrize("stream", [False, True])
+    def test_get_packed_chain(self, stream):
+        client = TestClient(node)
+        full_chain = client.get("/chain").json()["chain"]
+        response = client.get(
+            "/chain", params={"stream": stream}, headers={"Accept": wire.MEDIA_TYPE}
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == wire.MEDIA_TYPE
+        length, records = wire.unpack_message(response.content)
+        assert length == 2
+        assert [Block.parse_packed(record).dict() for record in records] == full_chain
+
+    def test_get_packed_headers(self):
+        client = TestClient(node)
+        headers = client.get("/headers").json()["headers"]
+        response = client.get("/headers", headers={"Accept": wire.MEDIA_TYPE})
+
+        assert response.status_code == 200
+        length, records = wire.unpack_message(response.content)
+        assert length == 2
+        assert [BlockHeader.parse_packed(record).dict() for record in records] == headers
+
+    def test_stream_chain(self):
+        client = TestClient(node)
+        full_chain = client.get("/chain").json()["chain"]
+        response = client.get("/chain", params={"stream": True})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert [json.loads(line) for line in response.text.splitlines()] == full_chain
+
+    def test_get_headers(self):
+        client = TestClient(node)
+        chain = client.get("/chain").json()["chain"]
+        response = client.get("/headers", params={"start": 2})
+
+        assert response.status_code == 200
+        assert response.json()["length"] == 2
+        assert len(response.json()["headers"]) == 1
+        header = response.json()["headers"][0]
+        assert "transactions" not in header
+        assert header["index"] == 2
+        assert header["proof"] == chain[1]["proof"]
+        assert header["previous_hash"] == chain[1]["previous_hash"]
+        assert len(header["hash"]) == len(header["merkle_root"]) == 64
+        assert header["merkle_root"] == chain[1]["merkle_root"]
+
+    @pytest.mark.parametrize("start, limit, indices", [(1, None, [1, 2]), (1, 1, [1]), (3, 5, [])])
+    def test_get_blocks(self, start, limit, indices):
+        client = TestClient(node)
+        params = {"start": start} if limit is None else {"start": start, "limit": limit}
+        response = client.get("/blocks", params=params)
+
+        assert response.status_code == 200
+        assert response.json()["length"] == 2
+        assert [block["index"] for block in response.json()["blocks"]] == indices
+
+    def test_get_snapshot(self):
+        client = TestClient(node)
+        assert client.get("/snapshot").status_code == 404
+        assert client.get("/snapshot/info").status_code == 404
+
+        summary = blockchain.write_checkpoint()
+        response = client.get("/snapshot")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == wire.MEDIA_TYPE
+        assert response.headers["etag"] == f'"{summary.digest}"'
+        assert response.headers["x-checkpoint-height"] == str(len(blockchain.chain))
+        assert Checkpoint.of(response.content).digest == summary.digest
+        assert client.get("/snapshot/info").json() == summary.dict()
+
+        cached = client.get("/snapshot", headers={"If-None-Match": response.headers["etag"]})
+        assert cached.status_code == 304
+        assert cached.content == b""
+
+    def test_get_metrics(self):
+        client = TestClient(node)
+        assert client.get("/metrics").status_code == 404
+
+        METRICS.enabled = True
+        try:
+            client.get("/chain")
+            response = client.get("/metrics")
+        finally:
+            METRICS.enabled = False
+            METRICS.reset()
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert (
+            'toychain_http_request_seconds_count{method="GET",endpoint="full_chain",status="200"} 1'
+            in response.text
+        )
+        assert f"toychain_chain_length {len(blockchain.chain)}" in response.text
+
+    def test_get_transaction_proof(self):
+        client = TestClient(node)
+        block = client.get("/blocks", params={"start": 2, "limit": 1}).json()["blocks"][0]
+        response = client.get("/blocks/2/proof/0")
+
+        assert response.status_code == 200
+        assert response.json()["transaction"] == block["transactions"][0]
+        assert response.json()["merkle_root"] == block["merkle_root"]
+        assert verify_transaction_proof(
+            Transaction.parse_obj(response.json()["transaction"]),
+            response.json()["proof"],
+            block["merkle_root"],
+        )
+
+    @pytest.mark.parametrize("index, position", [(3, 0), (0, 0), (2, 1)])
+    def test_get_missing_transaction_proof(self, index, position):
+        client = TestClient(node)
+        assert client.get(f"/blocks/{index}/proof/{position}").status_code == 404
+
+    def test_resolve_without_longer_chain(self):
+        client = TestClient(node)
+        response = client.get("/nodes/resolve")
+
+        assert response.status_code == 200
+        assert response.json()["message"] == "Our chain is authoritative"
+        assert len(response.json()["chain"]) == 2
+
+    def test_get_balance(self):
+        client = TestClient(node)
+        response = client.get(f"/balances/{NODE_IDENTIFIER}")
+
+        assert response.status_code == 200
+        assert response.json() == {"address": NODE_IDENTIFIER, "balance": 1}
+        assert client.get("/balances/nobody").json()["balance"] == 0
+
+    def test_get_address_transactions(self):
+        client = TestClient(node)
+        response = client.get(f"/transactions/{NODE_IDENTIFIER}")
+
+        assert response.status_code == 200
+        assert response.json()["transactions"] == [
+            {"block": 2, "position": 0, "sender": "0", "recipient": NODE_IDENTIFIER, "amount": 1}
+        ]
+        assert client.get("/transactions/nobody").json()["transactions"] == []
+
 
 class TestPOSTEndpoints:
     def test_registering_node(self):
@@ -66,10 +278,22 @@ class TestPOSTEndpoints:
         assert isinstance(response.json()["total_nodes"], list)
         assert response.json()["total_nodes"] == ["127.0.0.1:5001"]
 
+    def test_registered_nodes(self):
+        client = TestClient(node)
+        response = client.get("/nodes")
+
+        assert response.status_code == 200
+        assert response.json()["total_nodes"] == 1
+        assert response.json()["nodes"][0]["address"] == "127.0.0.1:5001"
+        assert response.json()["nodes"][0]["failures"] == 0
+        assert client.get("/nodes/127.0.0.1:5001").json() == response.json()["nodes"][0]
+        assert client.get("/nodes/127.0.0.1:5009").status_code == 404
+
     def test_adding_transactions(self):
         client = TestClient(node)
         response = client.post(
-            "/transactions/new", json={"sender": "Lea", "recipient": "Mark", "amount": 10}
+            "/transactions/new",
+            json={"sender": NODE_IDENTIFIER, "recipient": "Mark", "amount": 0.1},
         )
 
         assert response.status_code == 200
@@ -78,6 +302,77 @@ class TestPOSTEndpoints:
             response.json()["message"] == "Transaction added to the list of current "
             "transactions and will be mined into the block at index 2"
         )
+        assert response.json()["added"] is True
+
+    def test_adding_duplicate_transaction(self):
+        client = TestClient(node)
+        response = client.post(
+            "/transactions/new",
+            json={"sender": NODE_IDENTIFIER, "recipient": "Mark", "amount": 0.1},
+        )
+
+        assert response.status_code == 200
+        assert response.json()["added"] is False
+        assert "already waiting" in response.json()["message"]
+
+    def test_adding_transactions_batch(self):
+        client = TestClient(node)
+        batch = [
+            {"sender": NODE_IDENTIFIER, "recipient": "Mark", "amount": amount / 100}
+            for amount in range(5, 15)
+        ]
+        response = client.post("/transactions/batch", json={"transactions": batch})
+
+        assert response.status_code == 200
+        assert response.json()["added"] == 9  # transaction of 0.1 was added by the previous test
+        assert response.json()["duplicates"] == 1
+        assert response.json()["pending"] == 10
+
+    @pytest.mark.parametrize(
+        "sender, amount",
+        [(NODE_IDENTIFIER, 0.5), (NODE_IDENTIFIER, -1), ("Lea", 1), ("0", 1)],
+    )
+    def test_rejecting_invalid_transactions(self, sender, amount):
+        client = TestClient(node)
+        transaction = {"sender": sender, "recipient": "Mark", "amount": amount}
+        response = client.post("/transactions/new", json=transaction)
+
+        assert response.status_code == 400
+        assert client.post("/transactions/batch", json={"transactions": [transaction]}).json() == (
+            response.json()
+        )
+
+    def test_adding_malformed_transactions_batch(self):
+        client = TestClient(node)
+        response = client.post("/transactions/batch", json={"transactions": [{"sender": "Lea"}]})
+        assert response.status_code == 422
+
+    def test_gossip_announcement(self):
+        client = TestClient(node)
+        response = client.post("/gossip", json={"sender": "127.0.0.1:5001"})
+
+        assert response.status_code == 200
+        assert response.json() == {"fetching": {"blocks": 0, "transactions": 0}}
+        assert client.post("/gossip", json={"blocks": []}).status_code == 422
+
+    def test_gossip_transactions(self):
+        client = TestClient(node)
+        pending = Transaction(sender=NODE_IDENTIFIER, recipient="Mark", amount=0.05)
+        unknown = Transaction(sender="Mark", recipient="Lea", amount=5)
+        hashes = [Mempool.hash(pending).hex(), Mempool.hash(unknown).hex(), "not-a-hash", ""]
+        response = client.post("/gossip/transactions", json={"hashes": hashes})
+
+        assert response.status_code == 200
+        assert response.json() == {"transactions": [pending.dict()]}
+
+
+def _wait_for_job(client: TestClient, job_id: str, timeout: float = 30) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(f"/mine/{job_id}").json()
+        if job["state"] not in ("queued", "running") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.01)
 
 
 @pytest.mark.skip  # TODO: find fix
@@ -168,7 +463,9 @@ def _server_5000():
     calling test.
     """
     process_at_post_5000 = Process(
-        target=uvicorn.run, kwargs={"app": node, "host": "127.0.0.1", "port": 5000}, daemon=True,
+        target=uvicorn.run,
+        kwargs={"app": node, "host": "127.0.0.1", "port": 5000},
+        daemon=True,
     )
     process_at_post_5000.start()
     yield
@@ -182,7 +479,9 @@ def _server_5001():
     calling test.
     """
     process_at_port_5001 = Process(
-        target=uvicorn.run, kwargs={"app": node, "host": "127.0.0.1", "port": 5001}, daemon=True,
+        target=uvicorn.run,
+        kwargs={"app": node, "host": "127.0.0.1", "port": 5001},
+        daemon=True,
     )
     process_at_port_5001.start()
     yield
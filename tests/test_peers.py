@@ -0,0 +1,73 @@
+import time
+
+from toychain.peers import PeerRegistry
+
+
+class TestPeerRegistry:
+    def test_nodes_are_registered_once(self):
+        registry = PeerRegistry()
+        assert registry.add("127.0.0.1:5001") is True
+        assert registry.add("127.0.0.1:5001") is False
+        assert len(registry) == 1
+        assert "127.0.0.1:5001" in registry
+        assert registry.addresses() == {"127.0.0.1:5001"}
+
+    def test_latency_is_averaged(self):
+        registry = PeerRegistry()
+        registry.add("127.0.0.1:5001")
+        registry.record_success("127.0.0.1:5001", latency=1.0)
+        registry.record_success("127.0.0.1:5001", latency=2.0)
+
+        peer = registry.get("127.0.0.1:5001")
+        assert 1.0 < peer.latency < 2.0
+        assert peer.last_seen is not None
+
+    def test_failures_back_off_exponentially(self):
+        registry = PeerRegistry(base_backoff=1.0, max_backoff=5.0)
+        registry.add("127.0.0.1:5001")
+        registry.add("127.0.0.1:5002")
+
+        assert [registry.record_failure("127.0.0.1:5001") for _ in range(4)] == [1, 2, 4, 5]
+        assert registry.available() == ["127.0.0.1:5002"]
+        assert registry.ranked() == ["127.0.0.1:5002"]
+        assert 4 < registry.get("127.0.0.1:5001").dict()["backoff"] <= 5
+
+    def test_success_clears_backoff(self):
+        registry = PeerRegistry(base_backoff=0.05)
+        registry.add("127.0.0.1:5001")
+        registry.record_failure("127.0.0.1:5001")
+        assert registry.available() == []
+
+        time.sleep(0.06)
+        assert registry.available() == ["127.0.0.1:5001"]
+        registry.record_success("127.0.0.1:5001")
+        assert registry.get("127.0.0.1:5001").failures == 0
+        assert registry.record_failure("127.0.0.1:5001") == 0.05
+
+    def test_ranking(self):
+        registry = PeerRegistry()
+        for port, height in ((5001, 3), (5002, 7), (5003, None), (5004, 7)):
+            registry.add(f"127.0.0.1:{port}")
+            if height is not None:
+                registry.record_success(f"127.0.0.1:{port}", latency=port / 1000, tip_height=height)
+
+        # Unknown chains first, then longest chains, then fastest nodes
+        assert registry.ranked() == [
+            "127.0.0.1:5003",
+            "127.0.0.1:5002",
+            "127.0.0.1:5004",
+            "127.0.0.1:5001",
+        ]
+        assert registry.ranked(limit=2) == ["127.0.0.1:5003", "127.0.0.1:5002"]
+        assert [peer.address for peer in registry.peers()] == registry.ranked()
+
+    def test_indirect_tips_only_move_forward(self):
+        registry = PeerRegistry()
+        registry.add("127.0.0.1:5001")
+        registry.record_tip("127.0.0.1:5001", 5, "a")
+        registry.record_tip("127.0.0.1:5001", 4, "b")
+        registry.record_tip("127.0.0.1:5002", 9, "c")  # not registered
+
+        assert registry.get("127.0.0.1:5001").tip_height == 5
+        assert registry.get("127.0.0.1:5001").tip_hash == "a"
+        assert registry.get("127.0.0.1:5002") is None
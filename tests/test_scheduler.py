@@ -0,0 +1,160 @@
+import threading
+import time
+
+import pytest
+
+from toychain.blockchain import BlockChain
+from toychain.mining import ParallelMiner, search_range
+from toychain.scheduler import MiningScheduler
+
+
+@pytest.fixture()
+def scheduler():
+    scheduler = MiningScheduler(BlockChain(difficulty=8), reward_address="miner")
+    yield scheduler
+    scheduler.close()
+
+
+def _wait(job, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while job.active and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return job
+
+
+class TestMiningScheduler:
+    def test_job_mines_block(self, scheduler):
+        job, merged = scheduler.submit()
+        assert not merged
+        assert _wait(job).state == "done"
+
+        block = scheduler.blockchain.last_block
+        assert job.block_index == block.index == 2
+        assert block.transactions[0].recipient == "miner"
+        assert scheduler.blockchain.validate_chain(scheduler.blockchain.chain)
+        assert scheduler.get(job.job_id) is job
+        assert scheduler.status() == {
+            "active_job": None,
+            "jobs": {"queued": 0, "running": 0, "done": 1, "cancelled": 0, "failed": 0},
+        }
+
+    def test_duplicate_requests_are_merged(self, scheduler, monkeypatch):
+        release = threading.Event()
+        _block_mining(monkeypatch, release)
+
+        job, _ = scheduler.submit()
+        same_job, merged = scheduler.submit()
+        assert merged
+        assert same_job is job
+        assert job.merged == 1
+
+        release.set()
+        assert _wait(job).state == "done"
+        assert len(scheduler.blockchain.chain) == 2
+
+    def test_tip_change_cancels_job(self, scheduler, monkeypatch):
+        release = threading.Event()
+        _block_mining(monkeypatch, release)
+
+        job, _ = scheduler.submit()
+        while job.tip_hash is None:
+            time.sleep(0.01)
+        scheduler.blockchain.add_block(proof=1)
+        release.set()
+
+        assert _wait(job).state == "cancelled"
+        assert job.reason == "tip changed"
+        assert len(scheduler.blockchain.chain) == 2
+
+    def test_explicit_cancel(self, scheduler, monkeypatch):
+        release = threading.Event()
+        _block_mining(monkeypatch, release)
+
+        job, _ = scheduler.submit()
+        assert scheduler.cancel() is job
+        release.set()
+        assert _wait(job).state == "cancelled"
+        assert scheduler.cancel() is None
+
+        next_job, merged = scheduler.submit()
+        assert not merged
+        assert next_job is not job
+
+    def test_failure_is_reported(self, scheduler, monkeypatch):
+        def broken_mine(*args, **kwargs):
+            raise RuntimeError("broken miner")
+
+        monkeypatch.setattr(ParallelMiner, "mine", broken_mine)
+        job, _ = scheduler.submit()
+        assert _wait(job).state == "failed"
+        assert "broken miner" in job.reason
+
+    def test_mined_block_is_handed_over(self):
+        mined = []
+        scheduler = MiningScheduler(
+            BlockChain(difficulty=8), reward_address="miner", on_mined=mined.append
+        )
+        try:
+            job, _ = scheduler.submit()
+            assert _wait(job).state == "done"
+            deadline = time.monotonic() + 5
+            while not mined and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert mined == [scheduler.blockchain.last_block]
+        finally:
+            scheduler.close()
+
+
+class TestStoppableMining:
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_stopped_search(self, workers):
+        miner = ParallelMiner(workers=workers, chunk_size=1_000)
+        try:
+            assert miner.mine(100, difficulty=24, should_stop=lambda searched: searched > 0) is None
+        finally:
+            miner.close()
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_progress_is_reported(self, workers):
+        miner = ParallelMiner(workers=workers, chunk_size=1_000)
+        progress = []
+        try:
+            proof = miner.mine(
+                100, difficulty=12, should_stop=lambda n: progress.append(n) and False
+            )
+            assert proof == search_range(100, 0, difficulty=12)
+            assert progress[:3] == [0, 1_000, 2_000]
+        finally:
+            miner.close()
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_stoppable_search_uses_small_chunks(self, workers):
+        miner = ParallelMiner(workers=workers)
+        progress = []
+        try:
+            assert (
+                miner.mine(
+                    100,
+                    difficulty=32,
+                    should_stop=lambda n: progress.append(n) or len(progress) > 2,
+                )
+                is None
+            )
+            assert progress == [0, miner.stoppable_chunk_size, 2 * miner.stoppable_chunk_size]
+            assert miner.stoppable_chunk_size < miner.chunk_size
+        finally:
+            miner.close()
+
+
+def _block_mining(monkeypatch, release: threading.Event):
+    """Makes mining wait for `release` after its first progress report."""
+    original_mine = ParallelMiner.mine
+
+    def mine(self, last_proof=None, difficulty=8, should_stop=None):
+        def wait_then_check(searched):
+            release.wait(timeout=30)
+            return should_stop(searched)
+
+        return original_mine(self, last_proof, difficulty, should_stop=wait_then_check)
+
+    monkeypatch.setattr(ParallelMiner, "mine", mine)
@@ -0,0 +1,94 @@
+import pytest
+
+from conftest import mine_blocks
+
+from toychain import wire, workers
+from toychain.blockchain import BlockChain
+from toychain.shared import SECTIONS, ChainPublisher, ChainView, section_path
+
+pytestmark = pytest.mark.skipif(
+    not workers.SUPPORTED, reason="mapped snapshot files can only be replaced on POSIX"
+)
+
+
+@pytest.fixture
+def publisher(tmp_path, blockchain):
+    publisher = ChainPublisher(tmp_path / "chain.snapshot")
+    publisher.publish(blockchain)
+    blockchain.on_change = publisher.publish
+    return publisher
+
+
+class TestChainView:
+    @pytest.mark.parametrize(
+        "start, limit", [(1, None), (2, 2), (3, 10), (4, 1), (6, None), (0, 0)]
+    )
+    def test_ranges_match_the_chain(self, blockchain, publisher, start, limit):
+        view = ChainView(publisher.path)
+        assert view.encoded_blocks(start, limit) == blockchain.encoded_blocks(start, limit)
+        assert view.packed_blocks(start, limit) == blockchain.packed_blocks(start, limit)
+        assert list(view.iter_encoded(start, limit)) == [
+            block.canonical_bytes() for block in blockchain.blocks_range(start, limit)
+        ]
+        blocks, length = view.blocks_range(start, limit)
+        assert [block.digest for block in blocks] == [
+            block.digest for block in blockchain.blocks_range(start, limit)
+        ]
+        assert length == len(blockchain.chain)
+
+    def test_follows_chain_changes(self, blockchain, publisher):
+        view = ChainView(publisher.path)
+        assert len(view) == 4
+        generation = view.generation
+
+        mine_blocks(blockchain, 1)
+        assert len(view) == 5
+        assert view.generation == generation + 1
+        assert view.encoded_blocks() == blockchain.encoded_blocks()
+
+        shorter = BlockChain(difficulty=4)
+        mine_blocks(shorter, 2, recipient="other")
+        blockchain.replace_chain(shorter.chain[:])
+        assert view.encoded_blocks() == blockchain.encoded_blocks()
+        assert len(view) == 3
+
+    def test_snapshots_taken_stay_consistent(self, blockchain, publisher):
+        view = ChainView(publisher.path)
+        mapping = view.current()
+        mine_blocks(blockchain, 2)
+        assert mapping.length == 4  # still readable, although the file was replaced
+        assert view.current().length == 6
+
+    def test_rejects_other_files(self, blockchain, publisher):
+        publisher.path.write_bytes(b"TOY" + publisher.path.read_bytes()[3:])
+        with pytest.raises(ValueError):
+            ChainView(publisher.path)
+
+
+class TestChainPublisher:
+    def test_appends_new_blocks(self, blockchain, publisher):
+        json_path, wire_path = (section_path(publisher.path, 1, section) for section in SECTIONS)
+        encoded, packed = json_path.read_bytes(), wire_path.read_bytes()
+        mine_blocks(blockchain, 2)
+        assert publisher.epoch == 1
+        assert json_path.read_bytes() == encoded + b"".join(
+            block.canonical_bytes() + b"," for block in blockchain.chain[4:]
+        )
+        assert (
+            wire_path.read_bytes() == packed + blockchain.packed_blocks(5)[0][wire.MESSAGE.size :]
+        )
+
+    def test_replaced_chain_starts_new_data_files(self, blockchain, publisher):
+        view = ChainView(publisher.path)
+        mapping = view.current()
+        blockchain.rollback_to(2)
+        publisher.publish(blockchain)
+        assert publisher.epoch == 2
+        assert not section_path(publisher.path, 1, "json").exists()
+        assert view.encoded_blocks() == blockchain.encoded_blocks()
+        assert mapping.length == 4  # the removed data files are still mapped
+        assert mapping.sections[0][:1] == b"{"
+
+        mine_blocks(blockchain, 1)
+        assert publisher.epoch == 2
+        assert view.encoded_blocks() == blockchain.encoded_blocks()
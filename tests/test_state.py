@@ -0,0 +1,102 @@
+import math
+
+import pytest
+
+from toychain.blockchain import Block, Transaction
+from toychain.state import (
+    MINING_REWARD,
+    MINT_ADDRESS,
+    apply_transactions,
+    check_blocks,
+    check_recorded,
+    check_transfer,
+    spendable,
+)
+
+
+def _block(index: int, *transactions: Transaction) -> Block:
+    return Block(
+        index=index,
+        timestamp=0,
+        transactions=list(transactions),
+        proof=0,
+        previous_hash="0" * 64,
+    )
+
+
+def _reward(recipient: str = "miner") -> Transaction:
+    return Transaction(sender=MINT_ADDRESS, recipient=recipient, amount=MINING_REWARD)
+
+
+class TestTransfers:
+    @pytest.mark.parametrize("amount", [0, -1, math.inf, math.nan])
+    def test_amount_must_be_positive(self, amount):
+        transaction = Transaction(sender="me", recipient="you", amount=amount)
+        assert check_transfer(transaction, available=100) is not None
+
+    def test_mint_can_not_transfer(self):
+        assert check_transfer(_reward(), available=100) is not None
+
+    def test_spending_is_capped_by_availability(self):
+        transaction = Transaction(sender="me", recipient="you", amount=2)
+        assert check_transfer(transaction, available=2) is None
+        assert "only 1.5 is available" in check_transfer(transaction, available=1.5)
+
+
+class TestRecordedTransactions:
+    def test_reward_only_first(self):
+        assert check_recorded({}, _reward(), position=0) is None
+        assert check_recorded({}, _reward(), position=1) is not None
+        inflated = Transaction(sender=MINT_ADDRESS, recipient="miner", amount=MINING_REWARD + 1)
+        assert check_recorded({}, inflated, position=0) is not None
+
+    def test_balance_must_cover_amount(self):
+        transaction = Transaction(sender="me", recipient="you", amount=2)
+        assert check_recorded({"me": 2}, transaction, position=1) is None
+        assert check_recorded({"me": 1}, transaction, position=1) is not None
+
+    def test_apply_and_revert(self):
+        balances = {"me": 3}
+        transactions = [
+            Transaction(sender="me", recipient="you", amount=2),
+            Transaction(sender="you", recipient="them", amount=1),
+        ]
+        apply_transactions(balances, transactions)
+        assert balances == {"me": 1, "you": 1, "them": 1}
+        apply_transactions(balances, reversed(transactions), sign=-1)
+        assert balances == {"me": 3, "you": 0, "them": 0}
+
+
+class TestBlocks:
+    def test_blocks_are_checked_in_order(self):
+        blocks = [
+            _block(2, _reward("me")),
+            _block(3, _reward(), Transaction(sender="me", recipient="you", amount=1)),
+            _block(4, Transaction(sender="you", recipient="them", amount=1)),
+        ]
+        assert check_blocks({}, blocks) is None
+        position, reason = check_blocks({}, blocks[1:])
+        assert position == 2 and reason.startswith("Transaction 1:")
+
+    def test_balances_are_left_untouched(self):
+        balances = {"me": 1}
+        assert check_blocks(balances, [_block(2, _reward("me"))]) is None
+        assert balances == {"me": 1}
+
+    def test_reverted_blocks_are_undone(self):
+        local_tip = _block(2, _reward("me"))
+        fork = [_block(2, Transaction(sender="me", recipient="you", amount=1))]
+        assert check_blocks({"me": 1}, fork) is None
+        assert check_blocks({"me": 1}, fork, reverted=[local_tip]) == (
+            1,
+            "Transaction 0: Sender 'me' spends 1.0, more than its balance of 0.0",
+        )
+
+    def test_spendable_drops_overspending(self):
+        transactions = [
+            _reward("me"),
+            Transaction(sender="me", recipient="you", amount=1),
+            Transaction(sender="me", recipient="you", amount=0.5),
+            Transaction(sender="you", recipient="them", amount=0.5),
+        ]
+        assert spendable({}, transactions) == [transactions[0], transactions[1], transactions[3]]
@@ -0,0 +1,131 @@
+import os
+
+import pytest
+
+from toychain.blockchain import Block, BlockChain
+from toychain.storage import FileStore, MemoryStore
+
+
+@pytest.fixture()
+def blocks():
+    blockchain = BlockChain(difficulty=4)
+    for _ in range(5):
+        blockchain.add_transaction(sender="0", recipient="miner", amount=1)
+        blockchain.add_block(proof=blockchain.proof_of_work(blockchain.last_block.proof))
+    return list(blockchain.chain)
+
+
+class TestFileStore:
+    def test_blocks_persist_across_reopening(self, tmp_path, blocks):
+        store = FileStore(tmp_path)
+        store.extend(blocks)
+        store.close()
+
+        reopened = FileStore(tmp_path)
+        assert len(reopened) == len(blocks)
+        assert list(reopened) == blocks
+        assert [block.digest for block in reopened] == [block.digest for block in blocks]
+        reopened.close()
+
+    def test_blocks_are_loaded_lazily(self, tmp_path, blocks):
+        store = FileStore(tmp_path)
+        store.extend(blocks)
+        store.close()
+
+        reopened = FileStore(tmp_path)
+        assert not reopened._loaded
+        assert reopened[3] == blocks[3]
+        assert list(reopened._loaded) == [3]
+        reopened.close()
+
+    def test_scanning_does_not_load_blocks(self, tmp_path, blocks):
+        store = FileStore(tmp_path)
+        store.extend(blocks)
+        store.close()
+
+        reopened = FileStore(tmp_path)
+        assert list(reopened.scan(2)) == blocks[2:]
+        assert not reopened._loaded
+        reopened.close()
+
+    def test_decoded_blocks_are_bounded(self, tmp_path, blocks):
+        store = FileStore(tmp_path, cache_size=2)
+        store.extend(blocks)
+        assert list(store._loaded) == [4, 5]
+        assert store[1] == blocks[1]
+        assert list(store._loaded) == [5, 1]
+        assert store[:] == blocks
+        assert list(store) == blocks
+        assert list(store._loaded) == [5, 1]  # going over the chain does not keep its blocks
+        store.close()
+
+    def test_negative_indices_and_slices(self, tmp_path, blocks):
+        store = FileStore(tmp_path)
+        store.extend(blocks)
+        assert store[-1] == blocks[-1]
+        assert store[1:4] == blocks[1:4]
+        assert store[::-2] == blocks[::-2]
+        with pytest.raises(IndexError):
+            store[len(blocks)]
+        store.close()
+
+    def test_truncation(self, tmp_path, blocks):
+        store = FileStore(tmp_path)
+        store.extend(blocks)
+        del store[3:]
+        store.append(blocks[4])
+        store.close()
+
+        reopened = FileStore(tmp_path)
+        assert list(reopened) == blocks[:3] + [blocks[4]]
+        with pytest.raises(ValueError):
+            del reopened[1:2]
+        reopened.close()
+
+    def test_recovers_from_interrupted_write(self, tmp_path, blocks):
+        store = FileStore(tmp_path)
+        store.extend(blocks)
+        store.close()
+        log_size = os.path.getsize(tmp_path / "blocks.log")
+        os.truncate(tmp_path / "blocks.log", log_size - 10)
+
+        reopened = FileStore(tmp_path)
+        assert list(reopened) == blocks[:-1]
+        reopened.append(blocks[-1])
+        reopened.close()
+        assert list(FileStore(tmp_path)) == blocks
+
+
+class TestBlockChainStorage:
+    def test_default_store_is_in_memory(self):
+        assert isinstance(BlockChain().chain, MemoryStore)
+
+    def test_chain_is_restored_from_store(self, tmp_path, blocks):
+        blockchain = BlockChain(difficulty=4, store=FileStore(tmp_path))
+        blockchain.add_block(proof=blockchain.proof_of_work(blockchain.last_block.proof))
+        blockchain.chain.close()
+
+        restored = BlockChain(difficulty=4, store=FileStore(tmp_path))
+        assert len(restored.chain) == 2
+        assert restored.validate_chain(restored.chain)
+        restored.chain.close()
+
+    def test_use_store_moves_chain(self, tmp_path):
+        blockchain = BlockChain(difficulty=4)
+        blockchain.add_block(proof=blockchain.proof_of_work(blockchain.last_block.proof))
+        blocks = list(blockchain.chain)
+
+        blockchain.use_store(FileStore(tmp_path))
+        assert isinstance(blockchain.chain, FileStore)
+        assert list(blockchain.chain) == blocks
+        blockchain.chain.close()
+
+    def test_replace_chain_keeps_common_prefix(self, tmp_path, blocks):
+        blockchain = BlockChain(difficulty=4, store=FileStore(tmp_path))
+        blockchain.replace_chain(blocks[:3])
+        other_fork = blocks[:2] + [Block.parse_obj({**blocks[2].dict(), "proof": -1})]
+
+        blockchain.replace_chain(other_fork)
+        assert list(blockchain.chain) == other_fork
+        blockchain.chain.close()
+        assert list(FileStore(tmp_path)) == other_fork
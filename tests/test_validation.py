@@ -0,0 +1,90 @@
+import pytest
+
+from toychain.blockchain import Block, BlockChain
+from toychain.validation import ChainValidator, check_links
+
+
+@pytest.fixture(scope="module")
+def long_chain():
+    blockchain = BlockChain(difficulty=4)
+    for _ in range(40):
+        last_block: Block = blockchain.last_block
+        blockchain.add_transaction(sender="0", recipient="miner", amount=1)
+        blockchain.add_block(proof=blockchain.proof_of_work(last_block.proof))
+    return blockchain.chain
+
+
+class TestCheckLinks:
+    def test_valid_chain(self, long_chain):
+        assert check_links(long_chain, min_difficulty=4) is None
+
+    def test_reports_position_in_complete_chain(self, long_chain):
+        tampered_chain = _tampered(long_chain, position=25)
+        position, reason = check_links(tampered_chain[20:], offset=20, min_difficulty=4)
+        assert position == 25
+        assert "proof" in reason
+
+    def test_reports_broken_link(self, long_chain):
+        tampered_chain = list(long_chain)
+        tampered_chain[10] = Block.parse_obj({**long_chain[10].dict(), "previous_hash": "nonsense"})
+        assert check_links(tampered_chain, min_difficulty=4)[0] == 10
+
+    def test_reports_tampered_transactions(self, long_chain):
+        tampered_chain = list(long_chain)
+        tampered_block = Block.parse_obj(long_chain[12].dict())
+        tampered_block.transactions[0].amount = 1_000
+        tampered_chain[12] = tampered_block
+        position, reason = check_links(tampered_chain, min_difficulty=4)
+        assert position == 12
+        assert "Merkle root" in reason
+
+    def test_reports_low_difficulty(self, long_chain):
+        assert check_links(long_chain, min_difficulty=5)[0] == 1
+
+
+class TestChainValidator:
+    @pytest.mark.parametrize("position", [1, 7, 8, 9, 23, 40])
+    @pytest.mark.parametrize("start", [1, 5])
+    def test_parallel_matches_serial(self, long_chain, position, start):
+        tampered_chain = _tampered(long_chain, position=position)
+        serial = ChainValidator(workers=1)
+        parallel = ChainValidator(workers=2, chunk_size=4)
+        try:
+            expected = serial.first_invalid(tampered_chain, start=start, min_difficulty=4)
+            assert parallel.first_invalid(tampered_chain, start=start, min_difficulty=4) == expected
+            assert parallel._executor is not None
+        finally:
+            parallel.close()
+
+    def test_parallel_valid_chain(self, long_chain):
+        parallel = ChainValidator(workers=2, chunk_size=4)
+        try:
+            assert parallel.first_invalid(long_chain, min_difficulty=4) is None
+        finally:
+            parallel.close()
+
+    def test_short_chain_is_checked_serially(self, long_chain):
+        validator = ChainValidator(workers=2, chunk_size=100)
+        assert validator.first_invalid(long_chain, min_difficulty=4) is None
+        assert validator._executor is None
+
+    def test_blockchain_reports_first_invalid_block(self, long_chain):
+        blockchain = BlockChain(difficulty=4, validation_workers=2)
+        blockchain.validator.chunk_size = 4
+        try:
+            assert blockchain.find_invalid_block(_tampered(long_chain, position=13)) == 13
+            assert blockchain.validate_chain(long_chain)
+        finally:
+            blockchain.validator.close()
+
+
+def _tampered(chain, position):
+    """Copy of the chain with an invalid proof for the block at `position`."""
+    invalid_proof = next(
+        proof
+        for proof in range(-1, -100, -1)
+        if not BlockChain.validate_proof(chain[position - 1].proof, proof, difficulty=4)
+    )
+    tampered_chain = list(chain)
+    tampered_chain[position] = Block.parse_obj({**chain[position].dict(), "proof": invalid_proof})
+    return tampered_chain
@@ -0,0 +1,109 @@
+import io
+
+import pytest
+
+from toychain import wire
+from toychain.blockchain import Block, BlockChain, BlockHeader, Transaction
+
+
+@pytest.fixture
+def blockchain() -> BlockChain:
+    blockchain = BlockChain(difficulty=1)
+    blockchain.add_transactions(
+        Transaction(sender=sender, recipient="you", amount=amount / 3)
+        for sender in ("me", "him", "ünïcode")
+        for amount in range(5)
+    )
+    blockchain.add_block(proof=12345)
+    blockchain.add_block(proof=None)
+    return blockchain
+
+
+class TestPackedBlocks:
+    def test_round_trip(self, blockchain):
+        for block in blockchain.chain:
+            parsed = Block.parse_packed(block.packed_bytes())
+            assert parsed == block
+            assert parsed.digest == block.digest
+
+    def test_genesis_previous_hash_is_kept_as_text(self, blockchain):
+        genesis = Block.parse_packed(blockchain.chain[0].packed_bytes())
+        assert genesis.previous_hash == "1"
+
+    def test_addresses_are_packed_once(self, blockchain):
+        block = blockchain.chain[1]
+        assert block.packed_bytes().count(b"you") == 1
+        assert len(block.packed_bytes()) < len(block.canonical_bytes()) / 2
+
+    @pytest.mark.parametrize("cut", [1, 10, 60])
+    def test_truncated_block_is_rejected(self, blockchain, cut):
+        with pytest.raises(ValueError):
+            Block.parse_packed(blockchain.chain[1].packed_bytes()[:-cut])
+
+    def test_trailing_bytes_are_rejected(self, blockchain):
+        with pytest.raises(ValueError):
+            Block.parse_packed(blockchain.chain[1].packed_bytes() + b"\x00")
+
+
+class TestPackedHeaders:
+    def test_round_trip(self, blockchain):
+        for block in blockchain.chain:
+            header = block.header()
+            assert BlockHeader.parse_packed(header.packed_bytes()).dict() == header.dict()
+
+    def test_mismatching_hash_is_rejected(self, blockchain):
+        header = blockchain.chain[1].header()
+        header.proof += 1
+        with pytest.raises(ValueError):
+            BlockHeader.parse_packed(header.packed_bytes())
+
+
+class TestMessages:
+    def test_records_are_views_on_the_message(self, blockchain):
+        message, length, _ = blockchain.packed_blocks()
+        chain_length, records = wire.unpack_message(message)
+
+        assert chain_length == length == 3
+        assert all(isinstance(record, memoryview) and record.obj is message for record in records)
+        assert [Block.parse_packed(record) for record in records] == list(blockchain.chain)
+
+    def test_page(self, blockchain):
+        message, length, tip_hash = blockchain.packed_blocks(start=2, limit=1)
+        chain_length, records = wire.unpack_message(message)
+
+        assert (chain_length, tip_hash) == (3, blockchain.last_block.digest)
+        assert [Block.parse_packed(record) for record in records] == [blockchain.chain[1]]
+
+    @pytest.mark.parametrize("change", [lambda m: m[:-1], lambda m: m + b"\x00", lambda m: m[4:]])
+    def test_malformed_message_is_rejected(self, blockchain, change):
+        message, _, _ = blockchain.packed_blocks()
+        with pytest.raises(ValueError):
+            wire.unpack_message(change(message))
+
+    def test_streamed_message(self, blockchain):
+        message, _, _ = blockchain.packed_blocks()
+
+        class _Trickle(io.BytesIO):
+            def read(self, size=-1):
+                return super().read(min(size, 3))
+
+        records = list(wire.iter_message(_Trickle(message)))
+        assert [Block.parse_packed(record) for record in records] == list(blockchain.chain)
+        for change in (lambda m: m[:-1], lambda m: m + b"\x00", lambda m: m[4:]):
+            with pytest.raises(ValueError):
+                list(wire.iter_message(io.BytesIO(change(message))))
+
+
+@pytest.mark.parametrize(
+    "accept, expected",
+    [
+        (wire.MEDIA_TYPE, True),
+        (f"{wire.MEDIA_TYPE}, application/json;q=0.5", True),
+        (f"application/json, {wire.MEDIA_TYPE};q=0.5", False),
+        (f"{wire.MEDIA_TYPE};q=0", False),
+        ("application/json", False),
+        ("*/*", False),
+    ],
+)
+def test_accepts_packed(accept, expected):
+    assert wire.accepts_packed(accept) is expected
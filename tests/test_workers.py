@@ -0,0 +1,163 @@
+import asyncio
+import json
+
+from multiprocessing import AuthenticationError
+
+import pytest
+
+from fastapi.testclient import TestClient
+
+from toychain import wire, workers
+from toychain.node import blockchain, node
+from toychain.shared import ChainPublisher
+from toychain.workers import OwnerClient, OwnerServer, call_app, worker, worker_environment
+
+AUTHKEY = b"k" * 32
+
+pytestmark = pytest.mark.skipif(not workers.SUPPORTED, reason="Unix sockets are POSIX only")
+
+
+@pytest.fixture
+def owner(tmp_path):
+    server = OwnerServer(node, str(tmp_path / "owner.sock"), AUTHKEY)
+    server.start()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def worker_client(tmp_path, owner, monkeypatch):
+    publisher = ChainPublisher(tmp_path / "chain.snapshot")
+    publisher.publish(blockchain)
+    blockchain.on_change = publisher.publish
+    for name, value in worker_environment(publisher.path, owner.address, AUTHKEY, "INFO").items():
+        monkeypatch.setenv(name, value)
+    with TestClient(worker) as client:
+        yield client
+    blockchain.on_change = None
+
+
+def _request(method, path, query=b"", body=b"", headers=()):
+    return method, path, query, [(b"host", b"testserver"), *headers], body, ("127.0.0.1", 1234)
+
+
+class TestCallApp:
+    def test_collects_responses(self):
+        status, headers, body = asyncio.run(call_app(node, _request("GET", "/chain")))
+        assert status == 200
+        assert (b"content-type", b"application/json") in headers
+        assert json.loads(body)["length"] == len(blockchain.chain)
+
+    def test_collects_streamed_responses(self):
+        request = _request("GET", "/chain", query=b"stream=true&limit=2")
+        status, _, body = asyncio.run(call_app(node, request))
+        assert status == 200
+        assert body.splitlines() == [block.canonical_bytes() for block in blockchain.chain[:2]]
+
+    def test_passes_bodies_along(self):
+        content = json.dumps({"sender": "a", "recipient": "b", "amount": -1}).encode()
+        request = _request(
+            "POST",
+            "/transactions/new",
+            body=content,
+            headers=[(b"content-type", b"application/json")],
+        )
+        status, _, body = asyncio.run(call_app(node, request))
+        assert status == 400
+        assert "not positive" in json.loads(body)["detail"]
+
+
+class TestOwner:
+    def test_forwarding(self, owner):
+        client = OwnerClient(owner.address, AUTHKEY, max_connections=2)
+        try:
+            for _ in range(3):  # the connection is reused
+                status, _, body = client.forward(_request("GET", "/balances/nobody"))
+                assert status == 200
+                assert json.loads(body) == {"address": "nobody", "balance": 0.0}
+            status, _, _ = asyncio.run(client.forward_async(_request("GET", "/nonsense")))
+            assert status == 404
+        finally:
+            client.close()
+
+    def test_stuck_requests_time_out(self, tmp_path):
+        async def stuck_app(scope, receive, send):
+            await asyncio.sleep(60)
+
+        server = OwnerServer(stuck_app, str(tmp_path / "stuck.sock"), AUTHKEY, timeout=0.1)
+        server.start()
+        client = OwnerClient(server.address, AUTHKEY)
+        try:
+            status, _, body = client.forward(_request("GET", "/"))
+            assert (status, body) == (504, b"Gateway Timeout")
+        finally:
+            client.close()
+            server.close()
+
+    def test_refuses_unauthenticated_workers(self, owner):
+        client = OwnerClient(owner.address, b"wrong key")
+        with pytest.raises(AuthenticationError):
+            client.forward(_request("GET", "/"))
+        client.close()
+
+
+class TestWorker:
+    def test_reads_come_from_the_snapshot(self, worker_client):
+        for path in ("/chain", "/blocks"):
+            served = worker_client.get(path, params={"start": 2})
+            assert served.status_code == 200
+            assert served.content == TestClient(node).get(path, params={"start": 2}).content
+            assert (
+                served.headers["etag"]
+                == TestClient(node).get(path, params={"start": 2}).headers["etag"]
+            )
+        cached = worker_client.get(
+            "/chain", params={"start": 2}, headers={"If-None-Match": served.headers["etag"]}
+        )
+        assert cached.status_code == 304
+
+        headers = worker_client.get("/headers", headers={"Accept": wire.MEDIA_TYPE})
+        assert (
+            headers.content
+            == TestClient(node).get("/headers", headers={"Accept": wire.MEDIA_TYPE}).content
+        )
+        streamed = worker_client.get("/chain", params={"stream": True})
+        assert streamed.content.splitlines() == [
+            block.canonical_bytes() for block in blockchain.chain
+        ]
+
+    @pytest.mark.parametrize("path", ["/chain", "/headers", "/blocks"])
+    def test_invalid_range(self, worker_client, path):
+        for params in ({"start": 0}, {"limit": -1}, {"limit": -1, "stream": True}):
+            assert worker_client.get(path, params=params).status_code == 422
+        assert len(worker_client.get(path, params={"limit": 0}).json()[path[1:]]) == 0
+
+    def test_reads_follow_the_owner_chain(self, worker_client):
+        length = worker_client.get("/chain").json()["length"]
+        blockchain.add_block(proof=blockchain.proof_of_work(blockchain.last_block.proof))
+        assert worker_client.get("/chain").json()["length"] == length + 1
+
+    def test_other_requests_go_to_the_owner(self, worker_client):
+        response = worker_client.post(
+            "/transactions/new", json={"sender": "a", "recipient": "b", "amount": 0}
+        )
+        assert response.status_code == 400
+        assert (
+            response.json()
+            == TestClient(node)
+            .post("/transactions/new", json={"sender": "a", "recipient": "b", "amount": 0})
+            .json()
+        )
+        assert worker_client.get("/nodes").json()["total_nodes"] == len(blockchain.nodes)
+        assert worker_client.get("/docs").status_code == 200  # the owner's documentation
+
+    def test_unsupported_platform(self, monkeypatch):
+        monkeypatch.setattr(workers, "SUPPORTED", False)
+        with pytest.raises(RuntimeError):
+            workers.serve(node, blockchain, "127.0.0.1", 5000, workers=2, log_level="INFO")
+
+    def test_unreachable_owner(self, worker_client, owner):
+        owner.close()
+        worker.state.owner.close()
+        worker.state.owner = workers.OwnerClient(owner.address + ".gone", AUTHKEY)
+        assert worker_client.get("/nodes").status_code == 503
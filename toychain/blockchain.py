@@ -2,73 +2,734 @@
 Simple emulation of a blockchain.
 """
 
+import asyncio
 import hashlib
+import json
+import os
+import struct
+import sys
+import tempfile
+import threading
 
-from time import time
-from typing import List, Optional, Set, Union
+from pathlib import Path
+from time import perf_counter, time
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
 from urllib.parse import ParseResult, ParseResultBytes, urlparse
 
 import requests
 
 from loguru import logger
-from pydantic import BaseModel
 
+from toychain import wire
+from toychain.checkpoint import (
+    Checkpoint,
+    pack_checkpoint,
+    pack_state,
+    read_state,
+    unpack_checkpoint,
+)
+from toychain.index import AddressIndex, Posting
+from toychain.locking import ReadWriteLock
+from toychain.logs import LOGGING
+from toychain.mempool import DEFAULT_BLOCK_SIZE, DEFAULT_MEMPOOL_CAPACITY, Mempool
+from toychain.merkle import ProofStep, merkle_proof, merkle_root, root_from_proof
+from toychain.metrics import METRICS
+from toychain.mining import DEFAULT_DIFFICULTY, ParallelMiner, proof_is_valid
+from toychain.network import DEFAULT_PEER_TIMEOUT, PeerClient
+from toychain.peers import PeerRegistry
+from toychain.state import check_blocks, check_transfer, spendable
+from toychain.storage import FileStore, MemoryStore
+from toychain.validation import ChainValidator, check_links
 
-class Transaction(BaseModel):
-    sender: str
-    recipient: str
-    amount: float
+DEFAULT_CONSENSUS_TIMEOUT: float = 10.0  # seconds
+DEFAULT_CONSENSUS_PEERS: int = 8  # nodes queried for their chain in consensus
 
+_MINING_SECONDS = METRICS.histogram(
+    "toychain_mining_seconds",
+    "Time spent searching for the proof of a block, by outcome (found or stopped)",
+    labels=("outcome",),
+    buckets=(0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 300),
+)
+_MINING_HASHES = METRICS.counter(
+    "toychain_mining_hashes_total", "Candidate proofs tried by the proof of work search"
+)
+_MINING_HASH_RATE = METRICS.gauge(
+    "toychain_mining_hashes_per_second", "Candidate proofs tried per second in the last search"
+)
+_BLOCK_HASHES = METRICS.counter(
+    "toychain_block_hashes_total", "Block headers hashed, memoized hashes aside"
+)
+_VALIDATION_SECONDS = METRICS.histogram(
+    "toychain_validation_seconds", "Time spent validating chains, by verdict", labels=("valid",)
+)
+_VALIDATED_BLOCKS = METRICS.counter(
+    "toychain_validated_blocks_total", "Blocks checked when validating chains"
+)
+_PEER_QUERY_SECONDS = METRICS.histogram(
+    "toychain_peer_query_seconds",
+    "Time spent getting another node's chain, by node and stage (headers or blocks)",
+    labels=("node", "stage"),
+)
+_CONSENSUS_SECONDS = METRICS.histogram(
+    "toychain_consensus_seconds",
+    "Time spent resolving conflicts, by outcome (replaced or kept)",
+    labels=("outcome",),
+)
 
-class Block(BaseModel):
-    index: int
-    timestamp: float
-    transactions: List[Transaction]
-    proof: Optional[int]
-    previous_hash: str
+Result = TypeVar("Result")
+
+
+class Transaction:
+    """
+    A transfer of coins between two addresses. Addresses are interned, as the same few of them
+    appear in many transactions.
+    """
+
+    __slots__ = {
+        "sender": "Address of the sender",
+        "recipient": "Address of the recipient",
+        "amount": "Amount of coins transferred, as a float",
+    }
+
+    def __init__(self, sender: str, recipient: str, amount: float):
+        self.sender: str = sys.intern(sender)
+        self.recipient: str = sys.intern(recipient)
+        self.amount: float = float(amount)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Transaction):
+            return NotImplemented
+        return (self.sender, self.recipient, self.amount) == (
+            other.sender,
+            other.recipient,
+            other.amount,
+        )
+
+    def __repr__(self) -> str:
+        return f"Transaction({self.sender!r} -> {self.recipient!r}: {self.amount!r})"
+
+    def dict(self) -> Dict[str, Any]:
+        """
+        Gives the transaction's contents as a dictionary, to encode it.
+
+        Returns:
+            The transaction's fields by name.
+        """
+        return {"sender": self.sender, "recipient": self.recipient, "amount": self.amount}
+
+    def canonical_bytes(self) -> bytes:
+        """
+        Deterministic encoding of the transaction: JSON with sorted keys and no whitespace.
+
+        Returns:
+            The encoded transaction.
+        """
+        return _canonical_json(self.dict())
+
+    @classmethod
+    def parse_obj(cls, content: Dict[str, Any]) -> "Transaction":
+        """
+        Builds a transaction from decoded JSON content.
+
+        Args:
+            content (Dict[str, Any]): the transaction's fields by name.
+
+        Returns:
+            The new Transaction object.
+
+        Raises:
+            KeyError: if a field is missing.
+            TypeError, ValueError: if a field does not have the expected type.
+        """
+        return cls(str(content["sender"]), str(content["recipient"]), float(content["amount"]))
+
+
+class Block:
+    """
+    A block of the chain. Fields are stored as plain attributes, without any validation: blocks
+    built from untrusted content should go through `parse_obj`. The block's hash covers its header
+    only, which commits to its transactions through their Merkle root.
+    """
+
+    __slots__ = {
+        "index": "Position of the block in the chain, 1 being the genesis block",
+        "timestamp": "Time at which the block was created",
+        "transactions": "List of Transaction objects recorded in the block",
+        "proof": "Proof of work of the block, an integer",
+        "previous_hash": "Hash of the previous block in the chain",
+        "difficulty": "Number of leading zero bits the block's proof was mined at",
+        "merkle_root": "Root of the Merkle tree of the block's transactions",
+        "_digest": "Memoized hash of the block, not part of its contents",
+        "_encoded": "Memoized canonical encoding of the block, not part of its contents",
+        "_packed": "Memoized binary encoding of the block, not part of its contents",
+    }
+
+    def __init__(
+        self,
+        index: int,
+        timestamp: float,
+        transactions: List[Transaction],
+        proof: Optional[int],
+        previous_hash: str,
+        difficulty: int = DEFAULT_DIFFICULTY,
+        merkle_root: Optional[str] = None,
+    ):
+        self.index: int = index
+        self.timestamp: float = timestamp
+        self.transactions: List[Transaction] = transactions
+        self.proof: Optional[int] = proof
+        self.previous_hash: str = previous_hash
+        self.difficulty: int = difficulty
+        self.merkle_root: str = (
+            merkle_root if merkle_root is not None else self.compute_merkle_root()
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Block):
+            return NotImplemented
+        return self.dict() == other.dict()
+
+    def __repr__(self) -> str:
+        return f"Block(index={self.index!r}, proof={self.proof!r}, previous={self.previous_hash!r})"
+
+    def dict(self) -> Dict[str, Any]:
+        """
+        Gives the block's contents as a dictionary, to encode it.
+
+        Returns:
+            The block's fields by name, with its transactions as dictionaries.
+        """
+        return {
+            **self.header_fields(),
+            "transactions": [transaction.dict() for transaction in self.transactions],
+        }
+
+    def header_fields(self) -> Dict[str, Any]:
+        """
+        Gives the fields of the block's header: all of them but its transactions.
+
+        Returns:
+            The header's fields by name.
+        """
+        return {
+            "index": self.index,
+            "timestamp": self.timestamp,
+            "proof": self.proof,
+            "previous_hash": self.previous_hash,
+            "difficulty": self.difficulty,
+            "merkle_root": self.merkle_root,
+        }
+
+    @classmethod
+    def parse_obj(cls, content: Dict[str, Any]) -> "Block":
+        """
+        Builds a block from decoded JSON content, such as blocks received from other nodes. The
+        Merkle root is taken as given, and computed only if missing.
+
+        Args:
+            content (Dict[str, Any]): the block's fields by name.
+
+        Returns:
+            The new Block object.
+
+        Raises:
+            KeyError: if a field is missing.
+            TypeError, ValueError: if a field does not have the expected type.
+        """
+        proof = content["proof"]
+        merkle_root = content.get("merkle_root")
+        return cls(
+            index=int(content["index"]),
+            timestamp=float(content["timestamp"]),
+            transactions=[Transaction.parse_obj(item) for item in content["transactions"]],
+            proof=None if proof is None else int(proof),
+            previous_hash=str(content["previous_hash"]),
+            difficulty=int(content.get("difficulty", DEFAULT_DIFFICULTY)),
+            merkle_root=None if merkle_root is None else str(merkle_root),
+        )
+
+    @classmethod
+    def parse_raw(cls, encoded: Union[str, bytes]) -> "Block":
+        """
+        Builds a block from its JSON encoding.
+
+        Args:
+            encoded (Union[str, bytes]): the encoded block.
+
+        Returns:
+            The new Block object.
+
+        Raises:
+            KeyError: if a field is missing.
+            TypeError, ValueError: if the content is not valid JSON or a field does not have the
+                expected type.
+        """
+        return cls.parse_obj(json.loads(encoded))
+
+    @classmethod
+    def parse_packed(cls, buffer: wire.Buffer) -> "Block":
+        """
+        Builds a block from its binary encoding, see `toychain.wire`. The buffer is read in place,
+        and can be a `memoryview` on part of a larger message.
+
+        Args:
+            buffer (wire.Buffer): the packed block, and nothing else.
+
+        Returns:
+            The new Block object.
+
+        Raises:
+            ValueError: if the packed block is truncated or malformed.
+        """
+        try:
+            fields, offset = wire.unpack_fields(buffer)
+            addresses, entries, offset = wire.unpack_transactions(buffer, offset)
+            if offset != len(buffer):
+                raise ValueError("Unexpected bytes after the packed block")
+            transactions: List[Transaction] = [
+                Transaction(addresses[sender], addresses[recipient], amount)
+                for amount, sender, recipient in entries
+            ]
+        except (IndexError, struct.error) as error:
+            raise ValueError(f"Malformed packed block: {error}") from error
+
+        index, timestamp, proof, difficulty, merkle_root, previous_hash = fields
+        return cls(index, timestamp, transactions, proof, previous_hash, difficulty, merkle_root)
+
+    def header(self) -> "BlockHeader":
+        """
+        Summarizes the block without its transactions.
+
+        Returns:
+            The block's header, a BlockHeader object.
+        """
+        return BlockHeader(**self.header_fields(), hash=self.digest)
+
+    def compute_merkle_root(self) -> str:
+        """
+        Computes the root of the Merkle tree of the block's transactions.
+
+        Returns:
+            The hex digest of the root.
+        """
+        return merkle_root([transaction.canonical_bytes() for transaction in self.transactions])
+
+    def merkle_root_is_valid(self) -> bool:
+        """
+        Checks that the block's Merkle root commits to its transactions.
+
+        Returns:
+            True if the recorded Merkle root matches the block's transactions, False otherwise.
+        """
+        return self.compute_merkle_root() == self.merkle_root
+
+    def transaction_proof(self, position: int) -> List[ProofStep]:
+        """
+        Proves that a transaction is part of the block, in a number of steps logarithmic in the
+        number of transactions. See `verify_transaction_proof`.
+
+        Args:
+            position (int): position of the transaction in the block.
+
+        Returns:
+            The Merkle proof of the transaction.
+
+        Raises:
+            IndexError: if the block has no transaction at `position`.
+        """
+        encoded = [transaction.canonical_bytes() for transaction in self.transactions]
+        return merkle_proof(encoded, position)
+
+    def canonical_bytes(self) -> bytes:
+        """
+        Deterministic encoding of the block's contents: JSON with sorted keys and no whitespace.
+        Like the digest, it is computed on first use and then stored on the block.
+
+        Returns:
+            The encoded block.
+        """
+        try:
+            return self._encoded
+        except AttributeError:
+            self._encoded = _canonical_json(self.dict())
+            return self._encoded
+
+    def packed_bytes(self) -> bytes:
+        """
+        Compact binary encoding of the block, see `toychain.wire`. Like the canonical encoding,
+        it is computed on first use and then stored on the block.
+
+        Returns:
+            The packed block.
+
+        Raises:
+            ValueError: if a field can not be packed, such as a Merkle root that is not a digest.
+        """
+        try:
+            return self._packed
+        except AttributeError:
+            self._packed = b"".join(
+                [
+                    wire.pack_fields(
+                        self.index,
+                        self.timestamp,
+                        self.proof,
+                        self.difficulty,
+                        self.merkle_root,
+                        self.previous_hash,
+                    ),
+                    wire.pack_transactions(
+                        (transaction.sender, transaction.recipient, transaction.amount)
+                        for transaction in self.transactions
+                    ),
+                ]
+            )
+            return self._packed
+
+    @property
+    def digest(self) -> str:
+        """
+        The SHA-256 hex digest of the canonical encoding of the block's header, which does not
+        depend on the number of transactions. It is computed on first access and then stored on
+        the block, which should therefore not be modified afterwards.
+
+        Returns:
+            The block's hash.
+        """
+        try:
+            return self._digest
+        except AttributeError:
+            self._digest = hashlib.sha256(_canonical_json(self.header_fields())).hexdigest()
+            _BLOCK_HASHES.inc()
+            return self._digest
+
+
+class BlockHeader:
+    """A block without its transactions, plus its hash."""
+
+    __slots__ = {
+        "index": "Position of the block in the chain, 1 being the genesis block",
+        "timestamp": "Time at which the block was created",
+        "proof": "Proof of work of the block, an integer",
+        "previous_hash": "Hash of the previous block in the chain",
+        "difficulty": "Number of leading zero bits the block's proof was mined at",
+        "merkle_root": "Root of the Merkle tree of the block's transactions",
+        "hash": "Hash of the block, which is the hash of this header's other fields",
+    }
+
+    def __init__(
+        self,
+        index: int,
+        timestamp: float,
+        proof: Optional[int],
+        previous_hash: str,
+        merkle_root: str,
+        hash: str,
+        difficulty: int = DEFAULT_DIFFICULTY,
+    ):
+        self.index: int = index
+        self.timestamp: float = timestamp
+        self.proof: Optional[int] = proof
+        self.previous_hash: str = previous_hash
+        self.difficulty: int = difficulty
+        self.merkle_root: str = merkle_root
+        self.hash: str = hash
+
+    def dict(self) -> Dict[str, Any]:
+        """
+        Gives the header's contents as a dictionary, to encode it.
+
+        Returns:
+            The header's fields by name.
+        """
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def parse_obj(cls, content: Dict[str, Any]) -> "BlockHeader":
+        """
+        Builds a header from decoded JSON content, such as headers received from other nodes, and
+        checks its advertised hash against its other fields.
+
+        Args:
+            content (Dict[str, Any]): the header's fields by name.
+
+        Returns:
+            The new BlockHeader object.
+
+        Raises:
+            KeyError: if a field is missing.
+            TypeError, ValueError: if a field does not have the expected type, or if the hash
+                does not match the other fields.
+        """
+        proof = content["proof"]
+        header = cls(
+            index=int(content["index"]),
+            timestamp=float(content["timestamp"]),
+            proof=None if proof is None else int(proof),
+            previous_hash=str(content["previous_hash"]),
+            difficulty=int(content.get("difficulty", DEFAULT_DIFFICULTY)),
+            merkle_root=str(content["merkle_root"]),
+            hash=str(content["hash"]),
+        )
+        return header._checked()
+
+    @classmethod
+    def parse_packed(cls, buffer: wire.Buffer) -> "BlockHeader":
+        """
+        Builds a header from its binary encoding, see `toychain.wire`, and checks its advertised
+        hash against its other fields. The buffer is read in place.
+
+        Args:
+            buffer (wire.Buffer): the packed header, and nothing else.
+
+        Returns:
+            The new BlockHeader object.
+
+        Raises:
+            ValueError: if the packed header is truncated or malformed, or if the hash does not
+                match the other fields.
+        """
+        try:
+            fields, offset = wire.unpack_fields(buffer)
+        except (IndexError, struct.error) as error:
+            raise ValueError(f"Malformed packed header: {error}") from error
+        if len(buffer) - offset != 32:
+            raise ValueError("Packed header does not end with a hash")
+
+        index, timestamp, proof, difficulty, merkle_root, previous_hash = fields
+        hash_: str = buffer[offset:].hex()
+        return cls(
+            index, timestamp, proof, previous_hash, merkle_root, hash_, difficulty
+        )._checked()
+
+    def packed_bytes(self) -> bytes:
+        """
+        Compact binary encoding of the header, see `toychain.wire`.
+
+        Returns:
+            The packed header.
+        """
+        fields: bytes = wire.pack_fields(
+            self.index,
+            self.timestamp,
+            self.proof,
+            self.difficulty,
+            self.merkle_root,
+            self.previous_hash,
+        )
+        return fields + wire.pack_digest(self.hash)
+
+    def _checked(self) -> "BlockHeader":
+        """Checks the header's hash against its other fields, raising ValueError if it differs."""
+        fields: Dict[str, Any] = self.dict()
+        del fields["hash"]
+        if hashlib.sha256(_canonical_json(fields)).hexdigest() != self.hash:
+            raise ValueError(f"Header of block {self.index} does not match its hash")
+        return self
+
+    @property
+    def digest(self) -> str:
+        """The hash of the block this header summarizes, checked when the header is parsed."""
+        return self.hash
+
+    def merkle_root_is_valid(self) -> bool:
+        """A header carries no transactions to check its Merkle root against."""
+        return True
+
+
+def verify_transaction_proof(
+    transaction: Transaction, proof: List[ProofStep], expected_root: str
+) -> bool:
+    """
+    Checks a proof that a transaction is part of a block, as given by `Block.transaction_proof`,
+    without needing the block's other transactions.
+
+    Args:
+        transaction (Transaction): the transaction to check.
+        proof (List[ProofStep]): the Merkle proof of the transaction.
+        expected_root (str): the Merkle root of the block, as found in its header.
+
+    Returns:
+        True if the proof shows that the transaction is part of the block, False otherwise.
+    """
+    try:
+        return root_from_proof(transaction.canonical_bytes(), proof) == expected_root
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+def _canonical_json(content: Any) -> bytes:
+    """Deterministic JSON encoding: sorted keys and no whitespace."""
+    return json.dumps(content, sort_keys=True, separators=(",", ":")).encode()
+
+
+def _parse_headers(content: Union[memoryview, Any]) -> Tuple[int, List[BlockHeader]]:
+    """Decodes a node's `/headers` response, in the binary wire format or JSON."""
+    if isinstance(content, memoryview):
+        length, records = wire.unpack_message(content)
+        return length, [BlockHeader.parse_packed(record) for record in records]
+    return content["length"], [BlockHeader.parse_obj(header) for header in content["headers"]]
+
+
+def parse_block(record: Union[bytes, memoryview, Any]) -> Block:
+    """
+    Decodes a block streamed by a node, see `PeerClient.iter_negotiated`.
+
+    Args:
+        record (Union[bytes, memoryview, Any]): the block's record in the binary wire format, or
+            its decoded line of NDJSON.
+
+    Returns:
+        The decoded Block object.
+
+    Raises:
+        KeyError, TypeError, ValueError: if the record is not a valid block.
+    """
+    if isinstance(record, (bytes, memoryview)):
+        return Block.parse_packed(record)
+    return Block.parse_obj(record)
+
+
+def _read_checkpoint_file(path: Path) -> Optional[Tuple[Checkpoint, bytes]]:
+    """Reads a checkpoint file left by a previous run, if there is a well-formed one at `path`."""
+    if not path.exists():
+        return None
+    content: bytes = path.read_bytes()
+    try:
+        return Checkpoint.of(content), content
+    except ValueError as error:
+        logger.warning("Ignoring checkpoint file '{}': {}", path, error)
+        return None
+
+
+async def _timed_query(node: str, stage: str, query: Awaitable[Result]) -> Result:
+    """Awaits a query to a node, recording how long it took for the node and stage."""
+    with _PEER_QUERY_SECONDS.time((node, stage)):
+        return await query
 
 
 class BlockChain:
     """Simple class to emulate a blockchain"""
 
     __slots__ = {
-        "chain": "List of different Block objects making up the blockchain",
-        "current_transactions": "List of Transaction objects to be added to the next block",
-        "nodes": "Set of different nodes registered on the network",
+        "chain": "Storage (MemoryStore or FileStore) of the Block objects making up the blockchain",
+        "mempool": "Mempool object holding the transactions waiting to be added to a block",
+        "block_size": "Maximum number of transactions recorded in a block",
+        "peers": "PeerRegistry of the other nodes of the network, with their health and tip",
+        "miner": "ParallelMiner object running the proof of work search",
+        "difficulty": "Number of leading zero bits required from the proofs of new blocks",
+        "validator": "ChainValidator object running the chain validation",
+        "client": "PeerClient object querying other nodes of the network",
+        "consensus_timeout": "Deadline in seconds to receive chains from other nodes in consensus",
+        "consensus_peers": "Maximum number of nodes queried for their chain in consensus",
+        "peer_verdicts": "Dict of each node's last checked tip hash and validated chain, or None",
+        "address_index": "AddressIndex object holding balances and transactions by address",
+        "lock": "ReadWriteLock guarding the chain and the address index",
+        "encoded_chain": "Number of blocks and JSON array encoding them, cached for responses",
+        "check_balances": "Whether transactions and blocks can only spend their senders' balances",
+        "_admission_lock": "Lock making the balance check and addition of transactions atomic",
+        "checkpoint_interval": "Number of blocks between two checkpoints of the chain, 0 for none",
+        "checkpoint_path": "Path of the latest checkpoint's file, None to keep it in memory",
+        "checkpoint": "Checkpoint object summarizing the latest checkpoint of the chain, or None",
+        "_checkpoint_bytes": "The latest checkpoint file, when it is kept in memory",
+        "on_change": "Callable called with the blockchain after its chain changed, or None",
     }
 
-    def __init__(self):
-        self.chain: List[Block] = []
-        self.current_transactions: List[Transaction] = []
-        self.nodes: Set[str] = set()
-        logger.debug("Initiating first block")
-        self.add_block(previous_hash=1, proof=100)
+    def __init__(
+        self,
+        mining_workers: int = 1,
+        difficulty: int = DEFAULT_DIFFICULTY,
+        validation_workers: int = 1,
+        peer_timeout: float = DEFAULT_PEER_TIMEOUT,
+        consensus_timeout: float = DEFAULT_CONSENSUS_TIMEOUT,
+        consensus_peers: int = DEFAULT_CONSENSUS_PEERS,
+        store: Optional[Union[MemoryStore, FileStore]] = None,
+        mempool_capacity: int = DEFAULT_MEMPOOL_CAPACITY,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        check_balances: bool = False,
+        checkpoint_interval: int = 0,
+    ):
+        self.lock: ReadWriteLock = ReadWriteLock()
+        self.chain: Union[MemoryStore, FileStore] = store if store is not None else MemoryStore()
+        self.mempool: Mempool = Mempool(capacity=mempool_capacity)
+        self.block_size: int = block_size
+        self.peers: PeerRegistry = PeerRegistry()
+        self.miner: ParallelMiner = ParallelMiner(workers=mining_workers)
+        self.difficulty: int = difficulty
+        self.validator: ChainValidator = ChainValidator(workers=validation_workers)
+        self.client: PeerClient = PeerClient(timeout=peer_timeout)
+        self.consensus_timeout: float = consensus_timeout
+        self.consensus_peers: int = consensus_peers
+        self.peer_verdicts: Dict[str, Tuple[str, Optional[List[Block]]]] = {}
+        self.address_index: AddressIndex = AddressIndex()
+        self._index_chain()
+        self.encoded_chain: Tuple[int, bytes] = (0, b"[]")
+        self.check_balances: bool = check_balances
+        self._admission_lock: threading.Lock = threading.Lock()
+        self.checkpoint_interval: int = checkpoint_interval
+        self.checkpoint_path: Optional[Path] = None
+        self.checkpoint: Optional[Checkpoint] = None
+        self._checkpoint_bytes: Optional[bytes] = None
+        self.on_change: Optional[Callable[["BlockChain"], None]] = None
+        if not self.chain:
+            logger.debug("Initiating first block")
+            self.add_block(previous_hash="1", proof=100)
 
-    def add_block(self, previous_hash: Optional[str] = None, proof: int = None) -> Block:
+    def add_block(
+        self,
+        previous_hash: Optional[str] = None,
+        proof: int = None,
+        reward: Optional[Transaction] = None,
+    ) -> Block:
         """
-        Create a new block and add it to the chain.
+        Create a new block and add it to the chain, with the oldest transactions of the mempool.
+        If `self.check_balances` is True, transactions spending more than their sender's balance,
+        which can happen once the chain they were accepted on was replaced, are dropped.
 
         Args:
             previous_hash (Optional[str]): hash of the previous block in the chain.
             proof (int): the proof given by the proof of work algorithm.
+            reward (Optional[Transaction]): a transaction rewarding the miner, recorded first in
+                the block without going through the mempool.
 
         Returns:
             The new block.
         """
-        logger.debug("Creating a new block")
-        block = Block(
-            index=len(self.chain) + 1,
-            timestamp=time(),
-            transactions=self.current_transactions,
-            proof=proof,
-            previous_hash=previous_hash or self.hash(self.chain[-1]),
-        )
-
-        logger.debug("Resetting the current list of transations")
-        self.current_transactions = []
-
-        logger.debug("Adding block to the chain")
-        self.chain.append(block)
+        if LOGGING.debug:
+            logger.debug("Creating a new block")
+        with self.lock.write_locked():
+            transactions: List[Transaction] = [reward] if reward is not None else []
+            transactions.extend(self.mempool.take(self.block_size - len(transactions)))
+            if self.check_balances:
+                candidates: int = len(transactions)
+                transactions = spendable(self.address_index.balances, transactions)
+                if len(transactions) < candidates:
+                    logger.warning("Dropped {} overspending tx(s)", candidates - len(transactions))
+            block = Block(
+                index=len(self.chain) + 1,
+                timestamp=time(),
+                transactions=transactions,
+                proof=proof,
+                previous_hash=previous_hash or self.hash(self.chain[-1]),
+                difficulty=self.difficulty,
+            )
+            self.chain.append(block)
+            self.address_index.add_block(block)
+            self.lock.after_write(self._chain_changed)
         logger.success("Added block to the chain")
         return block
 
@@ -76,7 +737,7 @@ class BlockChain:
         self, sender: str = None, recipient: str = None, amount: float = None
     ) -> int:
         """
-        Adds a new transaction to the list of transactions.
+        Adds a new transaction to the mempool, unless the same transaction is already waiting.
 
         Args:
             sender (str): address of the sender.
@@ -85,13 +746,70 @@ class BlockChain:
 
         Returns:
             An integer containing the index of the block that will hold this transaction.
+
+        Raises:
+            ValueError: if `self.check_balances` is True and the transaction is invalid, see
+                `add_transactions`.
         """
-        logger.debug("Adding transaction to the list of current transactions")
-        self.current_transactions.append(
-            Transaction(sender=sender, recipient=recipient, amount=amount)
-        )
+        self.add_transactions([Transaction(sender=sender, recipient=recipient, amount=amount)])
         return self.last_block.index  # index is already incremented in block creation
 
+    def add_transactions(self, transactions: Iterable[Transaction]) -> int:
+        """
+        Adds new transactions to the mempool, dropping those already waiting. If
+        `self.check_balances` is True, all transactions are checked first and none is added if
+        one of them is invalid: it must move a positive amount, not come from the mint address,
+        and its sender's balance must cover it along with the sender's waiting transactions.
+
+        Args:
+            transactions (Iterable[Transaction]): the transactions to add.
+
+        Returns:
+            The number of transactions added, duplicates aside.
+
+        Raises:
+            ValueError: if `self.check_balances` is True and a transaction is invalid.
+        """
+        if not self.check_balances:
+            added: int = self.mempool.add_many(transactions)
+        else:
+            transactions = list(transactions)
+            with self._admission_lock, self.lock.read_locked():
+                failure: Optional[Tuple[int, str]] = self._check_admission(transactions)
+                if failure is not None:
+                    raise ValueError(f"Transaction {failure[0]} is invalid: {failure[1]}")
+                added = self.mempool.add_many(transactions)
+        if LOGGING.debug:
+            logger.debug(
+                "Added {} transaction(s) to the mempool, {} waiting", added, len(self.mempool)
+            )
+        return added
+
+    def _check_admission(self, transactions: List[Transaction]) -> Optional[Tuple[int, str]]:
+        """
+        Checks transactions against their senders' balances and waiting transactions, in order.
+
+        Returns:
+            The position of the first invalid transaction and the reason it is invalid, or None.
+        """
+        spent: Dict[str, float] = {}
+        seen: Set[bytes] = set()
+        for position, transaction in enumerate(transactions):
+            transaction_hash: bytes = Mempool.hash(transaction)
+            if transaction_hash in seen or self.mempool.get(transaction_hash) is not None:
+                continue  # a duplicate, dropped by the mempool
+            seen.add(transaction_hash)
+            sender: str = transaction.sender
+            if sender not in spent:
+                spent[sender] = self.mempool.spending(sender)
+            reason: Optional[str] = check_transfer(
+                transaction, self.address_index.balance(sender) - spent[sender]
+            )
+            if reason is not None:
+                return position, reason
+            spent[sender] += transaction.amount
+        return None
+
     @property
     def last_block(self) -> Block:
         """
@@ -100,12 +818,24 @@ class BlockChain:
         Returns:
             The last block in the chain.
         """
-        return self.chain[-1]
+        with self.lock.read_locked():
+            return self.chain[-1]
+
+    def tip(self) -> Tuple[int, str]:
+        """
+        Gives the length of the chain and the hash of its last block, taken at once.
+
+        Returns:
+            A tuple of the length of the chain and the hash of its last block.
+        """
+        with self.lock.read_locked():
+            return len(self.chain), self.chain[-1].digest
 
     @staticmethod
     def hash(block: Block) -> str:
         """
-        Hashes a new block.
+        Hashes a block's contents, through its canonical encoding. The digest is computed once per
+        block and stored on it, so hashing the same block again costs nothing.
 
         Args:
             block (Block): the block's contents.
@@ -113,52 +843,72 @@ class BlockChain:
         Returns:
             The block's hash.
         """
-        # Ordering the block dict for consistent hashes
-        logger.debug("Ordering block dictionary and dumping to json")
-        block_bytes: bytes = block.schema_json().encode()
-
-        logger.debug("Hashing dumped block")
-        return hashlib.sha256(block_bytes).hexdigest()
+        return block.digest
 
     @staticmethod
-    def validate_proof(last_proof: int = None, new_proof: int = None) -> bool:
+    def validate_proof(
+        last_proof: int = None, new_proof: int = None, difficulty: int = DEFAULT_DIFFICULTY
+    ) -> bool:
         """
-        Validates a proof: does hash(last_proof, new_proof) contain 4 leading zeroes?
+        Validates a proof: does hash(last_proof, new_proof) have `difficulty` leading zero bits?
 
         Args:
             last_proof (int): the previous proof in the chain.
             new_proof (int): the new proof.
+            difficulty (int): the number of leading zero bits required, defaults to 16.
 
         Returns:
             True if new_proof is validated, False otherwise.
         """
-        logger.trace("Checking proof validity")
-        guess: bytes = f"{last_proof}{new_proof}".encode()
-        guess_hash: str = hashlib.sha256(guess).hexdigest()
-        if guess_hash[:4] == "0000":
-            logger.debug("Proof iteration is valid")
-            return True
-        logger.trace("Proof is invalid")
-        return False
+        return proof_is_valid(last_proof=last_proof, new_proof=new_proof, difficulty=difficulty)
 
-    def proof_of_work(self, last_proof: int = None) -> int:
+    def proof_of_work(
+        self, last_proof: int = None, should_stop: Optional[Callable[[int], bool]] = None
+    ) -> Optional[int]:
         """
         Simple Proof of Work Algorithm:
-            - Find a number p' such that hash(pp') has leading 4 zeroes, where p is the previous p'
+            - Find a number p' such that hash(pp') has `self.difficulty` leading zero bits
              - p is the previous proof, and p' is the new proof
+             - candidates are split over `self.miner`'s worker processes, if it has several
         Args:
             last_proof (int): the previous proof in the chain.
+            should_stop (Optional[Callable[[int], bool]]): called with the number of candidates
+                handed out so far, the search is abandoned when it returns True. See
+                `ParallelMiner.mine`.
 
         Returns:
-            The new proof, an integer.
+            The new proof, an integer, or None if the search was stopped.
         """
-        proof: int = 0
-        while self.validate_proof(last_proof=last_proof, new_proof=proof) is False:
-            logger.trace("Proof didn't pass, iterating")
-            proof += 1
-        logger.debug("Successfully mined block proof")
+        if LOGGING.debug:
+            logger.debug("Mining block proof with {} worker(s)", self.miner.workers)
+        started: float = perf_counter()
+        handed_out: List[int] = [0]
+        if METRICS.enabled and should_stop is not None:
+            stop_check: Callable[[int], bool] = should_stop
+
+            def should_stop(searched: int) -> bool:
+                handed_out[0] = searched
+                return stop_check(searched)
+
+        proof: Optional[int] = self.miner.mine(
+            last_proof=last_proof, difficulty=self.difficulty, should_stop=should_stop
+        )
+        if METRICS.enabled:
+            elapsed: float = perf_counter() - started
+            hashes: int = proof + 1 if proof is not None else handed_out[0]
+            _MINING_SECONDS.observe(elapsed, ("found" if proof is not None else "stopped",))
+            _MINING_HASHES.inc(hashes)
+            if elapsed > 0:
+                _MINING_HASH_RATE.set(hashes / elapsed)
+        if LOGGING.debug:
+            logger.debug("Mined block proof" if proof is not None else "Mining stopped")
         return proof
 
+    @property
+    def nodes(self) -> FrozenSet[str]:
+        """The netlocs of the nodes registered on the network."""
+        return self.peers.addresses()
+
     def register_node(self, address: str = None) -> None:
         """
         Register a new node as part of the network by adding it to the list of nodes.
@@ -169,82 +919,938 @@ class BlockChain:
         Returns:
             Nothing, adds in place.
         """
-        logger.debug(f"Parsing new node address '{address}'")
+        logger.debug("Parsing new node address '{}'", address)
         parsed_url: Union[ParseResult, ParseResultBytes] = urlparse(address)
         node_netloc: str = str(parsed_url.netloc)
-        logger.debug(f"Netloc for new node is {node_netloc}")
+        logger.debug("Netloc for new node is {}", node_netloc)
 
-        logger.debug(f"{self.nodes}")
-        if node_netloc in self.nodes:
-            logger.warning(f"Node at {address} is already registered, skipping")
-        else:
-            logger.debug(f"Adding new element with address {address} to network's registered nodes")
-            self.nodes.add(node_netloc)
+        if not self.peers.add(node_netloc):
+            logger.warning("Node at {} is already registered, skipping", address)
+            return
+        logger.debug("Added new element with address {} to network's registered nodes", address)
 
-    def validate_chain(self, chain: List[Block]) -> bool:
+    def find_invalid_block(self, chain: List[Block], start: int = 1) -> Optional[int]:
         """
-        Determine if a given blockchain from any arbitrary node in the network is valid.
+        Finds the first invalid block of a given blockchain from any arbitrary node in the network.
+        Each block's proof is checked against the difficulty recorded in the block, which can not
+        be lower than this chain's difficulty. Long chains are split over `self.validator`'s
+        worker processes, if it has several.
 
         Args:
-            chain (List[Block]): a complete blockchain (list of blocks as dicts).
+            chain (List[Block]): a complete blockchain (list of Block objects).
+            start (int): position in `chain` of the first block to check against its predecessor.
+                Blocks before it are trusted. Defaults to 1, the first non-dummy block.
+
+        Returns:
+            The position of the first invalid block in `chain`, or None if the chain is valid.
+        """
+        if LOGGING.trace:
+            logger.trace("Determining chain validity, starting with block at position {}", start)
+        started: float = perf_counter()
+        failure: Optional[Tuple[int, str]] = self.validator.first_invalid(
+            chain, start=start, min_difficulty=self.difficulty
+        )
+        if METRICS.enabled:
+            _VALIDATION_SECONDS.observe(perf_counter() - started, (str(failure is None).lower(),))
+            _VALIDATED_BLOCKS.inc(len(chain) - start)
+        if failure is None:
+            if LOGGING.debug:
+                logger.debug("Chain is valid")
+            return None
+
+        position, reason = failure
+        logger.error("Block at position {} is invalid. {}", position, reason)
+        return position
+
+    def validate_chain(self, chain: List[Block], start: int = 1) -> bool:
+        """
+        Determine if a given blockchain from any arbitrary node in the network is valid. See
+        `find_invalid_block` for the checks that are made.
+
+        Args:
+            chain (List[Block]): a complete blockchain (list of Block objects).
+            start (int): position in `chain` of the first block to check against its predecessor.
+                Blocks before it are trusted. Defaults to 1, the first non-dummy block.
 
         Returns:
             True if the chain is valid, False otherwise
         """
-        logger.trace("Determining chain validity, starting with first non-dummy block")
+        return self.find_invalid_block(chain, start=start) is None
 
-        for previous_block, inspected_block in zip(chain[:-1], chain[1:]):
-            logger.trace("Checking block's hash")
-            if inspected_block.previous_hash != self.hash(previous_block):
-                logger.error(f"Invalid block tag 'previous_hash': {inspected_block.previous_hash}")
-                return False
+    def common_prefix_length(self, chain: List[Block]) -> int:
+        """
+        Finds how many leading blocks a given chain shares with this node's chain, by matching the
+        `previous_hash` tags of its blocks against the hashes of this node's blocks. None of the
+        given chain's blocks are hashed. Since hashes chain up, a block linking to this node's
+        block at position k - 1 commits to this node's first k blocks, which makes a binary
+        search possible.
 
-            logger.trace("Checking block's proof of work")
-            if not self.validate_proof(
-                last_proof=previous_block.proof, new_proof=inspected_block.proof
-            ):
-                logger.error(
-                    f"Discrepancy between last block's proof '{previous_block.proof}' and "
-                    f"inspected block's proof '{inspected_block.proof}'"
+        Args:
+            chain (List[Block]): a complete blockchain (list of Block objects).
+
+        Returns:
+            The length k of the common prefix: `chain[k]` links to this node's `chain[k - 1]`.
+        """
+        with self.lock.read_locked():
+            low, high = 0, min(len(self.chain), len(chain) - 1)
+            while low < high:
+                middle: int = (low + high + 1) // 2
+                if chain[middle].previous_hash == self.hash(self.chain[middle - 1]):
+                    low = middle
+                else:
+                    high = middle - 1
+            return low
+
+    def evaluate_chain(self, node: str, chain: List[Block]) -> Optional[List[Block]]:
+        """
+        Validates a complete chain received from a node, only checking the blocks after its common
+        prefix with this node's chain. See `evaluate_suffix`.
+
+        Args:
+            node (str): netloc of the node the chain comes from.
+            chain (List[Block]): the node's complete blockchain (list of Block objects).
+
+        Returns:
+            The validated chain, made of this node's blocks for the common prefix and of the given
+            chain's blocks afterwards, or None if the given chain is invalid.
+        """
+        remembered_chain = self._remembered_verdict(node, self.hash(chain[-1]))
+        if remembered_chain is not False:
+            return remembered_chain
+
+        prefix_length: int = self.common_prefix_length(chain)
+        return self.evaluate_suffix(node, prefix_length, chain[prefix_length:])
+
+    def evaluate_suffix(
+        self, node: str, prefix_length: int, blocks: List[Block]
+    ) -> Optional[List[Block]]:
+        """
+        Validates the blocks a node has after the first `prefix_length` blocks of this node's
+        chain. The verdict is remembered per node and tip hash, so a node whose chain did not
+        change since the last call is not checked again.
+
+        Args:
+            node (str): netloc of the node the blocks come from.
+            prefix_length (int): how many leading blocks the node's chain shares with this one's.
+            blocks (List[Block]): the node's blocks after the common prefix.
+
+        Returns:
+            The validated chain, made of this node's blocks for the common prefix and of the given
+            blocks afterwards, or None if the given blocks are invalid.
+        """
+        with self.lock.read_locked():
+            prefix: List[Block] = self.chain[:prefix_length]
+        tip_hash: str = self.hash(blocks[-1]) if blocks else self.hash(prefix[-1])
+        remembered_chain = self._remembered_verdict(node, tip_hash)
+        if remembered_chain is not False:
+            return remembered_chain
+
+        logger.debug(
+            "Chain from node '{}' shares {} block(s) with this node's, checking the remaining {}",
+            node,
+            prefix_length,
+            len(blocks),
+        )
+        merged_chain: List[Block] = prefix + blocks
+        verdict: Optional[List[Block]] = (
+            merged_chain if self.validate_chain(merged_chain, start=prefix_length) else None
+        )
+        if verdict is not None and self.check_balances:
+            with self.lock.read_locked():
+                failure = check_blocks(
+                    self.address_index.balances, blocks, reverted=self.chain[prefix_length:]
+                )
+            if failure is not None:
+                logger.warning(
+                    "Chain from node '{}' has invalid block {}: {}",
+                    node,
+                    failure[0] + 1,
+                    failure[1],
                 )
+                verdict = None
+        self.peer_verdicts[node] = (tip_hash, verdict)
+        return verdict
+
+    def _remembered_verdict(self, node: str, tip_hash: str) -> Union[Optional[List[Block]], bool]:
+        """Gives the remembered verdict for the node's chain if its tip is unchanged, else False."""
+        remembered_tip_hash, remembered_chain = self.peer_verdicts.get(node, (None, None))
+        if remembered_tip_hash == tip_hash:
+            logger.debug("Chain from node '{}' did not change since it was last checked", node)
+            return remembered_chain
+        return False
+
+    def snapshot(self, start: int = 1, limit: Optional[int] = None) -> Tuple[Block, ...]:
+        """
+        Gives an immutable view of consecutive blocks of the chain, by block index. It is taken at
+        once under the read lock, and is not affected by blocks added or replaced afterwards, so
+        that readers can work on it without holding the lock. Blocks themselves are never modified
+        once in the chain.
+
+        Args:
+            start (int): index of the first block to give, the genesis block being at index 1.
+            limit (Optional[int]): maximum number of blocks to give. Gives all blocks until the
+                end of the chain if None.
+
+        Returns:
+            The tuple of blocks, empty if the chain is shorter than `start`.
+        """
+        first_position: int = max(start, 1) - 1
+        with self.lock.read_locked():
+            return tuple(
+                self.chain[first_position : None if limit is None else first_position + limit]
+            )
+
+    def blocks_range(self, start: int = 1, limit: Optional[int] = None) -> List[Block]:
+        """
+        Gives consecutive blocks of the chain, by block index. See `snapshot`.
+
+        Args:
+            start (int): index of the first block to give, the genesis block being at index 1.
+            limit (Optional[int]): maximum number of blocks to give. Gives all blocks until the
+                end of the chain if None.
+
+        Returns:
+            The list of blocks, empty if the chain is shorter than `start`.
+        """
+        return list(self.snapshot(start, limit))
+
+    def encoded_blocks(self, start: int = 1, limit: Optional[int] = None) -> Tuple[bytes, int, str]:
+        """
+        Encodes consecutive blocks of the chain, by block index, as a JSON array. Each block's
+        encoding is computed once and kept on the block. The encoding of the whole chain is also
+        kept and only extended with new blocks, until the chain is replaced.
+
+        Args:
+            start (int): index of the first block to give, the genesis block being at index 1.
+            limit (Optional[int]): maximum number of blocks to give. Gives all blocks until the
+                end of the chain if None.
+
+        Returns:
+            A tuple of the JSON array of the blocks' canonical encodings, the length of the chain
+            and the hash of its last block, all taken at once.
+        """
+        first_position: int = max(start, 1) - 1
+        with self.lock.read_locked():
+            length: int = len(self.chain)
+            tip_hash: str = self.chain[-1].digest
+            if first_position or (limit is not None and limit < length):
+                end: Optional[int] = None if limit is None else first_position + limit
+                blocks: Iterable[Block] = self.chain[first_position:end]
+                encoded: bytes = b",".join(block.canonical_bytes() for block in blocks)
+                return b"[" + encoded + b"]", length, tip_hash
+
+            cached_length, encoded = self.encoded_chain
+            if cached_length < length:
+                blocks = self.chain[cached_length:]
+                new_blocks: bytes = b",".join(block.canonical_bytes() for block in blocks)
+                encoded = encoded[:-1] + (b"," if cached_length else b"") + new_blocks + b"]"
+                self.encoded_chain = (length, encoded)
+            return encoded, length, tip_hash
+
+    def packed_blocks(self, start: int = 1, limit: Optional[int] = None) -> Tuple[bytes, int, str]:
+        """
+        Encodes consecutive blocks of the chain, by block index, as a message in the binary wire
+        format, see `toychain.wire`. Each block's encoding is computed once and kept on the block.
+
+        Args:
+            start (int): index of the first block to give, the genesis block being at index 1.
+            limit (Optional[int]): maximum number of blocks to give. Gives all blocks until the
+                end of the chain if None.
+
+        Returns:
+            A tuple of the message, the length of the chain and the hash of its last block, all
+            taken at once.
+        """
+        first_position: int = max(start, 1) - 1
+        end: Optional[int] = None if limit is None else first_position + limit
+        with self.lock.read_locked():
+            length: int = len(self.chain)
+            tip_hash: str = self.chain[-1].digest
+            blocks: Iterable[Block] = self.chain[first_position:end]
+            return (
+                wire.pack_message((block.packed_bytes() for block in blocks), length),
+                length,
+                tip_hash,
+            )
+
+    def replace_chain(self, new_chain: List[Block]) -> None:
+        """
+        Replaces this node's chain with a validated one, keeping the blocks both chains share so
+        that the storage and the address index only have to drop and add the blocks after the fork.
+
+        Args:
+            new_chain (List[Block]): the validated chain to adopt.
+
+        Returns:
+            Nothing, replaces in place.
+        """
+        with self.lock.write_locked():
+            prefix_length: int = self.common_prefix_length(new_chain)
+            self.rollback_to(prefix_length)
+            self.chain.extend(new_chain[prefix_length:])
+            self.chain.flush()
+            for block in new_chain[prefix_length:]:
+                self.address_index.add_block(block)
+                self.mempool.discard(block.transactions)
+            self.lock.after_write(self._chain_changed)
+
+    def rollback_to(self, height: int) -> List[Block]:
+        """
+        Drops the blocks after the first `height` ones, undoing their transactions in the address
+        index from the tip down, so that balances are back to what they were at that height.
+
+        Args:
+            height (int): number of blocks to keep.
+
+        Returns:
+            The dropped blocks, in chain order.
+        """
+        if height < 0:
+            raise ValueError(f"Can not roll back to negative height {height}")
+        with self.lock.write_locked():
+            dropped: List[Block] = self.chain[height:]
+            for block in reversed(dropped):
+                self.address_index.remove_block(block)
+            if dropped:
+                del self.chain[height:]
+                self.encoded_chain = (0, b"[]")
+                self.chain.flush()
+            if self.checkpoint is not None and self.checkpoint.height > height:
+                logger.info("Dropping the checkpoint at height {}", self.checkpoint.height)
+                self._install_checkpoint(None, None)
+        return dropped
+
+    def append_block(self, block: Block) -> bool:
+        """
+        Appends a block received from another node, if it extends this node's chain: it must come
+        right after the tip, link to it and be valid, and if `self.check_balances` is True its
+        transactions must only spend their senders' balances. Its transactions leave the mempool.
+
+        Args:
+            block (Block): the received block.
+
+        Returns:
+            True if the block was appended, False otherwise.
+        """
+        with self.lock.write_locked():
+            tip: Block = self.chain[-1]
+            if block.index != tip.index + 1:
                 return False
+            failure = check_links([tip, block], tip.index - 1, self.difficulty)
+            if failure is None and self.check_balances:
+                failure = check_blocks(self.address_index.balances, [block])
+            if failure is not None:
+                logger.warning("Rejecting block {}: {}", block.index, failure[1])
+                return False
+            self.chain.append(block)
+            self.address_index.add_block(block)
+            self.mempool.discard(block.transactions)
+            self.lock.after_write(self._chain_changed)
+        logger.success("Appended block {} received from another node", block.index)
+        return True
+
+    def write_checkpoint(self) -> Optional[Checkpoint]:
+        """
+        Writes a checkpoint of the chain: its blocks and the balances and postings of its address
+        index, as of now, see `toychain.checkpoint`. It replaces the previous checkpoint, in the
+        file at `self.checkpoint_path` or in memory. The checkpoint is encoded and written without
+        holding the chain's lock, unless the caller holds it.
+
+        Returns:
+            The Checkpoint object summarizing the latest checkpoint, which is not the new one if
+            the chain was replaced in the meantime.
+        """
+        with self.lock.read_locked():
+            blocks: Tuple[Block, ...] = tuple(self.chain)
+            state: bytes = pack_state(self.address_index.balances, self.address_index.postings)
+        encoded: bytes = pack_checkpoint(
+            len(blocks), blocks[-1].digest, (block.packed_bytes() for block in blocks), state
+        )
+        summary: Checkpoint = Checkpoint.of(encoded)
+        staged: Union[bytes, Path] = self._stage_checkpoint(encoded)
+        with self.lock.write_locked():
+            outdated: bool = self.checkpoint is not None and self.checkpoint.height > summary.height
+            replaced: bool = (
+                len(self.chain) < summary.height
+                or self.chain[summary.height - 1].digest != summary.tip_hash
+            )
+            if outdated or replaced:
+                logger.debug("Chain changed while writing a checkpoint, dropping it")
+                if isinstance(staged, Path):
+                    staged.unlink()
+                return self.checkpoint
+            self._install_checkpoint(staged, summary)
+        logger.success("Wrote checkpoint of {} block(s), {}", summary.height, summary.digest)
+        return summary
+
+    def open_checkpoint(self) -> Optional[Tuple[Checkpoint, bytes]]:
+        """
+        Gives the latest checkpoint, to serve it to other nodes.
+
+        Returns:
+            The Checkpoint object summarizing the latest checkpoint and the checkpoint file, or None
+            if the chain has no checkpoint.
+        """
+        with self.lock.read_locked():
+            summary: Optional[Checkpoint] = self.checkpoint
+            if summary is None or self.checkpoint_path is None:
+                return None if summary is None else (summary, self._checkpoint_bytes)
+            # The file is replaced rather than modified, so it can be read once the lock is released
+            checkpoint_file = open(self.checkpoint_path, "rb")
+        with checkpoint_file:
+            return summary, checkpoint_file.read()
+
+    def use_checkpoint_file(self, path: Union[str, Path]) -> None:
+        """
+        Keeps checkpoints in a file rather than in memory from now on. A checkpoint already in the
+        file, from a previous run, is kept if it is part of the current chain, and the address
+        index is restored from it.
+
+        Args:
+            path (Union[str, Path]): path of the checkpoint file.
+
+        Returns:
+            Nothing, switches in place.
+        """
+        path = Path(path)
+        found: Optional[Tuple[Checkpoint, bytes]] = _read_checkpoint_file(path)
+        with self.lock.write_locked():
+            if self._switch_checkpoint_file(path, found):
+                self._index_chain(found)
+
+    def _switch_checkpoint_file(
+        self, path: Path, found: Optional[Tuple[Checkpoint, bytes]]
+    ) -> bool:
+        """
+        Moves checkpoints to a file, keeping the checkpoint found in it if it is part of the chain.
+
+        Returns:
+            True if the found checkpoint was kept, False otherwise.
+        """
+        encoded: Optional[bytes] = self._checkpoint_bytes
+        self.checkpoint_path, self._checkpoint_bytes = path, None
+        if found is not None and 0 < found[0].height <= len(self.chain):
+            if self.chain[found[0].height - 1].digest == found[0].tip_hash:
+                self.checkpoint = found[0]
+                return True
+        if encoded is not None:
+            self._install_checkpoint(self._stage_checkpoint(encoded), self.checkpoint)
+        else:
+            self.checkpoint = None
+        return False
+
+    def load_checkpoint(self, buffer: wire.Buffer, trusted_digest: str) -> Checkpoint:
+        """
+        Replaces the chain with the one of a checkpoint, along with its address index, without
+        checking its blocks: the checkpoint is trusted because its digest is the expected one.
+
+        Args:
+            buffer (wire.Buffer): the checkpoint file.
+            trusted_digest (str): the SHA-256 hex digest the checkpoint file must have.
+
+        Returns:
+            The Checkpoint object summarizing the loaded checkpoint.
+
+        Raises:
+            ValueError: if the checkpoint's digest is not the trusted one, or it is malformed.
+        """
+        summary: Checkpoint = Checkpoint.of(buffer)
+        if summary.digest != trusted_digest:
+            raise ValueError(f"Checkpoint digest {summary.digest} is not the trusted one")
+        _, tip_hash, records, (balances, postings) = unpack_checkpoint(buffer)
+        blocks: List[Block] = [Block.parse_packed(record) for record in records]
+        if not blocks or blocks[-1].digest != tip_hash:
+            raise ValueError("Checkpoint blocks do not end with its tip")
+
+        staged: Union[bytes, Path] = self._stage_checkpoint(bytes(buffer))
+        with self.lock.write_locked():
+            self.rollback_to(0)
+            self.chain.extend(blocks)
+            self.chain.flush()
+            self.address_index.restore(balances, postings)
+            self.peer_verdicts.clear()
+            self._install_checkpoint(staged, summary)
+            self.lock.after_write(self._chain_changed)
+        logger.success("Loaded checkpoint of {} block(s) ending with {}", summary.height, tip_hash)
+        return summary
 
-            logger.trace("Moving on to next block")
+    async def bootstrap(self, node: str, trusted_digest: str) -> bool:
+        """
+        Joins the network from a node's checkpoint: loads it if its digest is the trusted one and
+        it is ahead of this node's chain, then synchronizes from the node, which only validates
+        the blocks added after the checkpoint.
+
+        Args:
+            node (str): netloc of the node to bootstrap from.
+            trusted_digest (str): the SHA-256 hex digest of the checkpoint file to trust.
 
-        logger.debug("Chain is valid")
+        Returns:
+            True if the checkpoint was loaded or this node's chain was already ahead of it, False
+            if the checkpoint could not be fetched or is not the trusted one.
+        """
+        try:
+            content = await self.client.fetch_negotiated(node, "/snapshot", whole_deadline=False)
+            if not isinstance(content, memoryview):
+                raise ValueError("Response is not a checkpoint file")
+            if Checkpoint.of(content).height > len(self.chain):
+                self.load_checkpoint(content, trusted_digest)
+            else:
+                logger.info("Chain is not behind the checkpoint of node '{}', keeping it", node)
+        except (asyncio.TimeoutError, requests.RequestException, ValueError) as error:
+            logger.warning("Could not bootstrap from node '{}': {!r}", node, error)
+            self.peers.record_failure(node)
+            return False
+        await self.sync_from(node)
         return True
 
+    def _chain_changed(self) -> None:
+        """
+        Writes a checkpoint if `self.checkpoint_interval` blocks were added since the last, and
+        calls `self.on_change`, once the chain changed. Changes of the chain leave it for when the
+        lock is released, with `ReadWriteLock.after_write`, so that readers do not wait on it even
+        when the caller holds the lock around the change, as the mining scheduler does.
+        """
+        last_height: int = self.checkpoint.height if self.checkpoint is not None else 0
+        if self.checkpoint_interval and len(self.chain) - last_height >= self.checkpoint_interval:
+            self.write_checkpoint()
+        if self.on_change is not None:
+            self.on_change(self)
+
+    def _stage_checkpoint(self, encoded: bytes) -> Union[bytes, Path]:
+        """Writes a checkpoint file next to the checkpoint's path, if it has one, for installing."""
+        if self.checkpoint_path is None:
+            return encoded
+        descriptor, temporary = tempfile.mkstemp(
+            dir=self.checkpoint_path.parent, prefix=self.checkpoint_path.name
+        )
+        with open(descriptor, "wb") as checkpoint_file:
+            checkpoint_file.write(encoded)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        return Path(temporary)
+
+    def _install_checkpoint(
+        self, staged: Optional[Union[bytes, Path]], summary: Optional[Checkpoint]
+    ) -> None:
+        """Makes a staged checkpoint the latest one, or drops the latest one if None."""
+        if isinstance(staged, Path):
+            os.replace(staged, self.checkpoint_path)
+        elif self.checkpoint_path is not None:
+            try:
+                self.checkpoint_path.unlink()
+            except FileNotFoundError:  # there was no checkpoint to drop
+                pass
+        else:
+            self._checkpoint_bytes = staged
+        self.checkpoint = summary
+
+    def use_store(
+        self,
+        store: Union[MemoryStore, FileStore],
+        checkpoint_path: Optional[Union[str, Path]] = None,
+    ) -> None:
+        """
+        Moves the blockchain to another storage. An empty store receives the current chain, while
+        the chain held by a non-empty store replaces the current one. The address index is
+        restored from the checkpoint found at `checkpoint_path` if it is part of the chain, so that
+        only the blocks after it are read, and rebuilt from all blocks otherwise.
+
+        Args:
+            store (Union[MemoryStore, FileStore]): the storage to use from now on.
+            checkpoint_path (Optional[Union[str, Path]]): path of the checkpoint file to use from
+                now on, see `use_checkpoint_file`. Defaults to None, keeping checkpoints as they
+                are.
+
+        Returns:
+            Nothing, switches in place.
+        """
+        found: Optional[Tuple[Checkpoint, bytes]] = None
+        if checkpoint_path is not None:
+            checkpoint_path = Path(checkpoint_path)
+            found = _read_checkpoint_file(checkpoint_path)
+        with self.lock.write_locked():
+            if not store:
+                store.extend(self.chain)
+                store.flush()
+            self.chain.close()
+            self.chain = store
+            self.encoded_chain = (0, b"[]")
+            self.peer_verdicts.clear()
+            if checkpoint_path is not None and self._switch_checkpoint_file(checkpoint_path, found):
+                self._index_chain(found)
+            else:
+                self._index_chain()
+            self.lock.after_write(self._chain_changed)
+        logger.info("Blockchain now has {} block(s) in {}", len(self.chain), type(store).__name__)
+
+    def _index_chain(self, checkpoint: Optional[Tuple[Checkpoint, bytes]] = None) -> None:
+        """
+        Indexes the transactions of the chain, starting from the address index saved in a
+        checkpoint of it if given, so that only the blocks after the checkpoint are read. Blocks
+        are decoded without being kept in memory by the store.
+        """
+        start: int = 0
+        if checkpoint is not None:
+            try:
+                self.address_index.restore(*read_state(checkpoint[1]))
+                start = checkpoint[0].height
+            except ValueError as error:
+                logger.warning("Could not restore the address index from checkpoint: {}", error)
+        if not start:
+            self.address_index.rebuild(self.chain.scan())
+            return
+        for block in self.chain.scan(start):
+            self.address_index.add_block(block)
+        logger.debug("Indexed {} block(s) after the checkpoint", len(self.chain) - start)
+
+    def close(self) -> None:
+        """
+        Releases the worker processes, connections and storage used by the blockchain.
+
+        Returns:
+            Nothing.
+        """
+        self.miner.close()
+        self.validator.close()
+        self.client.close()
+        self.chain.close()
+
+    def balance(self, address: str) -> float:
+        """
+        Gives the balance of an address over the blocks of the chain, pending transactions aside.
+
+        Args:
+            address (str): the address to look up.
+
+        Returns:
+            The amounts received by the address minus the amounts it sent, as a float.
+        """
+        with self.lock.read_locked():
+            return self.address_index.balance(address)
+
+    def transactions_of(self, address: str) -> List[Tuple[Posting, Transaction]]:
+        """
+        Gives the transactions of the chain an address takes part in, pending transactions aside.
+
+        Args:
+            address (str): the address to look up.
+
+        Returns:
+            A list of the (block index, position in block) of each transaction sent or received by
+            the address and the transaction itself, in chain order.
+        """
+        with self.lock.read_locked():
+            return [
+                ((block_index, position), self.chain[block_index - 1].transactions[position])
+                for block_index, position in self.address_index.postings_of(address)
+            ]
+
+    def iter_blocks(self, start: int = 1, limit: Optional[int] = None) -> Iterator[Block]:
+        """
+        Iterates over a snapshot of consecutive blocks of the chain, see `snapshot`. The lock is
+        not held while iterating, so the blocks can be consumed slowly.
+
+        Yields:
+            Consecutive blocks of the chain, from index `start`.
+        """
+        return iter(self.snapshot(start, limit))
+
     def resolve_conflicts(self) -> bool:
         """
         This is the Consensus Algorithm. It resolves conflicts by replacing the node's chain with
-        the longest valid one in the network.
+        the longest valid one in the network. Blocking version of `resolve_conflicts_async`, to
+        call from outside an event loop.
 
         Returns:
             True if the node's chain was replaced, False otherwise
         """
-        neighbouring_nodes = self.nodes
-        new_chain: List[Block] = None
-        max_length: int = len(self.chain)  # initialize with this node's length
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(self.resolve_conflicts_async())
+        finally:
+            loop.close()
 
-        logger.debug("Verifying chains from all nodes in the network")
-        for node in neighbouring_nodes:
-            logger.debug(f"Querying node '{node}' for its full chain")
-            node_chain_response = requests.get(f"http://{node}/chain")
+    async def resolve_conflicts_async(self) -> bool:
+        """
+        This is the Consensus Algorithm. It resolves conflicts by replacing the node's chain with
+        the longest valid one in the network. Chains are synchronized headers-first:
+            - the `self.consensus_peers` nodes most likely to have a longer chain, as ranked by
+             `self.peers`, are queried at once for the block headers after their fork from this
+             node's chain, and those headers' links and proofs are checked as they arrive,
+            - starting from the longest valid candidate, only the block bodies after the fork
+             are downloaded and validated, until a valid chain is found.
+        Nodes that do not answer within `self.client`'s deadline are skipped and backed off from,
+        and the whole process is abandoned after `self.consensus_timeout` seconds.
 
-            if node_chain_response.status_code == 200:
-                logger.trace("Full chain received")
-                length = node_chain_response.json()["length"]
-                chain = node_chain_response.json()["chain"]
+        Returns:
+            True if the node's chain was replaced, False otherwise
+        """
+        started: float = perf_counter()
+        replaced: bool = await self._resolve_conflicts()
+        _CONSENSUS_SECONDS.observe(perf_counter() - started, ("replaced" if replaced else "kept",))
+        return replaced
 
-                logger.trace("Checking if requested chain is valid and longer than mine")
-                if length > max_length and self.validate_chain(chain):
-                    max_length = length
-                    new_chain = chain
+    async def _resolve_conflicts(self) -> bool:
+        """Runs the consensus algorithm, see `resolve_conflicts_async`."""
+        loop = asyncio.get_event_loop()
+        deadline: float = loop.time() + self.consensus_timeout
 
-        if new_chain:
-            logger.info("Found a valid chain longer than this node's, adopting it now")
-            self.chain = new_chain
-            return True
+        nodes: List[str] = self.peers.ranked(limit=self.consensus_peers)
+        logger.debug("Fetching headers from {} node(s) of the network", len(nodes))
+        candidates: List[Tuple[str, int, List[BlockHeader]]] = []
+        queries = {
+            asyncio.ensure_future(_timed_query(node, "headers", self._fetch_candidate(node))): node
+            for node in nodes
+        }
+        try:
+            for next_query in asyncio.as_completed(queries, timeout=self.consensus_timeout):
+                try:
+                    candidate = await next_query
+                except asyncio.TimeoutError:
+                    logger.warning("Consensus deadline reached, ignoring nodes yet to answer")
+                    break
+                if candidate is not None:
+                    candidates.append(candidate)
+        finally:
+            for query, node in queries.items():
+                if not query.done():
+                    query.cancel()
+                    self.peers.record_failure(node)
+
+        for node, prefix_length, headers in sorted(
+            candidates, key=lambda candidate: candidate[1] + len(candidate[2]), reverse=True
+        ):
+            remaining_time: float = deadline - loop.time()
+            if remaining_time <= 0:
+                logger.warning("Consensus deadline reached, not downloading further chains")
+                break
+
+            try:
+                new_chain = await asyncio.wait_for(
+                    _timed_query(
+                        node, "blocks", self._download_candidate(node, prefix_length, headers)
+                    ),
+                    remaining_time,
+                )
+            except asyncio.TimeoutError:
+                logger.warning("Could not get blocks from node '{}' before the deadline", node)
+                self.peers.record_failure(node)
+                continue
+
+            if new_chain is None:
+                continue
+            if await loop.run_in_executor(self.client.executor, self._adopt, new_chain):
+                logger.info("Adopted a valid chain longer than this node's")
+                return True
 
         logger.info("No valid chain was longer than this node's")
         return False
+
+    async def sync_from(self, node: str) -> bool:
+        """
+        Adopts a node's chain if it is longer than this node's and valid, fetching headers first
+        and then only the blocks after the fork, like `resolve_conflicts_async` but with a single
+        node. Used when a node announces a block too far ahead of this node's tip to append it.
+
+        Args:
+            node (str): netloc of the node to synchronize from.
+
+        Returns:
+            True if the node's chain was adopted, False otherwise.
+        """
+        candidate = await _timed_query(node, "headers", self._fetch_candidate(node))
+        if candidate is None:
+            return False
+        _, prefix_length, headers = candidate
+        new_chain: Optional[List[Block]] = await _timed_query(
+            node, "blocks", self._download_candidate(node, prefix_length, headers)
+        )
+        if new_chain is None:
+            return False
+        loop = asyncio.get_event_loop()
+        if not await loop.run_in_executor(self.client.executor, self._adopt, new_chain):
+            return False
+        logger.info("Adopted the longer chain of node '{}'", node)
+        return True
+
+    def _adopt(self, new_chain: List[Block]) -> bool:
+        """
+        Replaces the chain with a validated one if it is still longer than this node's, see
+        `replace_chain`. Blocking, consensus runs it on a thread rather than its event loop.
+
+        Returns:
+            True if the chain was replaced, False otherwise.
+        """
+        with self.lock.write_locked():
+            if len(new_chain) <= len(self.chain):
+                return False
+            self.replace_chain(new_chain)
+            return True
+
+    async def _fetch_candidate(self, node: str) -> Optional[Tuple[str, int, List[BlockHeader]]]:
+        """
+        Locates where a node's chain forks from this one's and checks the node's headers after
+        the fork, walking back from this node's tip with exponentially growing steps. Comparing
+        and checking headers against this node's chain takes its lock, so it runs on the client's
+        thread pool rather than the event loop, which may be the node's serving requests.
+
+        Returns:
+            A tuple of the node, the common prefix length and the headers after it, or None if the
+            node's chain is not longer than this one's, not valid or not available.
+        """
+        local_length: int = len(self.chain)
+        first_position: int = local_length - 1  # position of the first header we hold
+        loop = asyncio.get_event_loop()
+        try:
+            started: float = loop.time()
+            length, headers = await self.client.fetch_negotiated(
+                node, "/headers", {"start": first_position + 1}, parse=_parse_headers
+            )
+            self.peers.record_success(
+                node,
+                latency=loop.time() - started,
+                tip_height=length,
+                tip_hash=headers[-1].hash if headers else None,
+            )
+            if length <= local_length:
+                logger.debug("Chain from node '{}' is not longer than this node's", node)
+                return None
+
+            prefix_length = await loop.run_in_executor(
+                self.client.executor,
+                self._matched_prefix_length,
+                headers,
+                first_position,
+                first_position,
+            )
+            step: int = 1
+            while prefix_length is None and first_position > 0:
+                step *= 2
+                earlier_position: int = max(first_position - step, 0)
+                _, earlier_headers = await self.client.fetch_negotiated(
+                    node,
+                    "/headers",
+                    {"start": earlier_position + 1, "limit": first_position - earlier_position},
+                    parse=_parse_headers,
+                )
+                if len(earlier_headers) != first_position - earlier_position:
+                    raise ValueError("Node sent an unexpected number of headers")
+
+                prefix_length = await loop.run_in_executor(
+                    self.client.executor,
+                    self._matched_prefix_length,
+                    earlier_headers,
+                    earlier_position,
+                    first_position - 1,
+                )
+                headers = earlier_headers + headers
+                first_position = earlier_position
+            prefix_length = prefix_length or 0
+
+        except (
+            asyncio.TimeoutError,
+            requests.RequestException,
+            KeyError,
+            TypeError,
+            ValueError,
+        ) as error:
+            logger.warning("Could not get headers from node '{}': {!r}", node, error)
+            self.peers.record_failure(node)
+            return None
+
+        new_headers: List[BlockHeader] = headers[prefix_length - first_position :]
+        failure = await loop.run_in_executor(
+            self.client.executor, self._check_new_headers, prefix_length, new_headers
+        )
+        if failure is not None or prefix_length + len(new_headers) <= local_length:
+            logger.warning("Headers from node '{}' do not make a longer valid chain", node)
+            self.peers.record_failure(node)
+            return None
+        return node, prefix_length, new_headers
+
+    def _check_new_headers(
+        self, prefix_length: int, headers: List[BlockHeader]
+    ) -> Optional[Tuple[int, str]]:
+        """
+        Checks that headers link to the last block of this node's first `prefix_length` blocks and
+        to each other, see `check_links`. Blocking, consensus runs it on a thread.
+
+        Returns:
+            None if the headers are valid, else the position of the first invalid one and why.
+        """
+        anchor: List[Union[Block, BlockHeader]] = (
+            list(self.snapshot(prefix_length, 1)) if prefix_length else []
+        )
+        return check_links(anchor + headers, max(prefix_length - 1, 0), self.difficulty)
+
+    def _matched_prefix_length(
+        self, headers: List[BlockHeader], first_position: int, last_position: int
+    ) -> Optional[int]:
+        """
+        Looks for the last of this node's blocks between `first_position` and `last_position`
+        whose hash is advertised by the header at the same position, `headers[0]` being at
+        `first_position`.
+
+        Returns:
+            The length of the common prefix ending at that block, or None if no header matches.
+        """
+        with self.lock.read_locked():
+            last_position = min(
+                last_position, first_position + len(headers) - 1, len(self.chain) - 1
+            )
+            for position in range(last_position, first_position - 1, -1):
+                if headers[position - first_position].hash == self.hash(self.chain[position]):
+                    return position + 1
+            return None
+
+    async def _download_candidate(
+        self, node: str, prefix_length: int, headers: List[BlockHeader]
+    ) -> Optional[List[Block]]:
+        """
+        Downloads and validates the block bodies a node has after the common prefix, unless its
+        advertised tip was already checked. The bodies must be those of the advertised headers,
+        which were checked and ranked, one for one: a node serving fewer or other blocks is
+        rejected.
+
+        Returns:
+            The validated chain, or None if the node's blocks are invalid, not available or not
+            those of its headers.
+        """
+        remembered_chain = self._remembered_verdict(node, headers[-1].hash)
+        if remembered_chain is not False:
+            return remembered_chain
+
+        logger.debug("Streaming {} block(s) from node '{}'", len(headers), node)
+        try:
+            blocks: List[Block] = await self.client.fetch_streamed(
+                node,
+                "/chain",
+                {"start": prefix_length + 1, "limit": len(headers), "stream": "true"},
+                parse=parse_block,
+            )
+        except (
+            asyncio.TimeoutError,
+            requests.RequestException,
+            KeyError,
+            TypeError,
+            ValueError,
+        ) as error:
+            logger.warning("Could not get blocks from node '{}': {!r}", node, error)
+            self.peers.record_failure(node)
+            return None
+
+        if len(blocks) != len(headers) or any(
+            self.hash(block) != header.hash for block, header in zip(blocks, headers)
+        ):
+            logger.warning("Blocks from node '{}' do not match the headers it advertised", node)
+            self.peers.record_failure(node)
+            return None
+
+        # the bodies' tip is the advertised one, so the verdict is remembered by the header tip
+        loop = asyncio.get_event_loop()
+        new_chain: Optional[List[Block]] = await loop.run_in_executor(
+            self.client.executor, self.evaluate_suffix, node, prefix_length, blocks
+        )
+        if new_chain is None:
+            self.peers.record_failure(node)
+        return new_chain
@@ -0,0 +1,221 @@
+"""
+Checkpoints of a chain: its blocks up to a given height and the state derived from them, the
+balances and postings of the address index, in a single compact file. A new node trusting a
+checkpoint's digest can load it at once, without checking the blocks it holds or indexing their
+transactions, and only has to validate the blocks added after it.
+
+A checkpoint file starts with a fixed header (magic bytes, height and hash of the last block),
+followed by the size of the blocks section and the blocks as a message of the binary wire format,
+see `toychain.wire`. The address index follows: the number of addresses, then for each address
+the size of its UTF-8 encoding, its balance and its number of postings, the encoded address and
+its postings as pairs of fixed-width integers. The digest of a checkpoint is the SHA-256 digest of
+the whole file.
+"""
+
+import hashlib
+import itertools
+import struct
+
+from typing import Dict, Iterable, List, Mapping, Sequence, Tuple
+
+from toychain import wire
+from toychain.index import Posting
+
+DEFAULT_CHECKPOINT_INTERVAL: int = 1_000  # blocks between two checkpoints of a node's chain
+MAGIC: bytes = b"TCK\x01"
+
+HEADER = struct.Struct(">4sI32s")  # magic, height, hash of the last block
+SECTION_SIZE = struct.Struct(">Q")
+ACCOUNT = struct.Struct(">HdI")  # size of the address, balance, number of postings
+POSTING = struct.Struct(">II")  # index of a block, position of a transaction in that block
+
+State = Tuple[Dict[str, float], Dict[str, List[Posting]]]  # balances and postings by address
+
+
+class Checkpoint:
+    """Summary of a checkpoint file, identifying the chain and the file's contents."""
+
+    __slots__ = {
+        "height": "Number of blocks in the checkpoint",
+        "tip_hash": "Hash of the checkpoint's last block",
+        "digest": "SHA-256 hex digest of the checkpoint file, which nodes trust it by",
+    }
+
+    def __init__(self, height: int, tip_hash: str, digest: str):
+        self.height: int = height
+        self.tip_hash: str = tip_hash
+        self.digest: str = digest
+
+    def __repr__(self) -> str:
+        return f"Checkpoint(height={self.height}, digest='{self.digest[:16]}')"
+
+    def dict(self) -> Dict[str, object]:
+        """Gives the checkpoint's fields by name, to encode them."""
+        return {"height": self.height, "tip_hash": self.tip_hash, "digest": self.digest}
+
+    @classmethod
+    def of(cls, buffer: wire.Buffer) -> "Checkpoint":
+        """
+        Summarizes a checkpoint file from its header, without decoding the rest of it.
+
+        Args:
+            buffer (wire.Buffer): the whole checkpoint file.
+
+        Returns:
+            The new Checkpoint object.
+
+        Raises:
+            ValueError: if the file does not start with a checkpoint header.
+        """
+        height, tip_hash = _unpack_header(buffer)
+        return cls(height, tip_hash, digest(buffer))
+
+
+def digest(buffer: wire.Buffer) -> str:
+    """Gives the SHA-256 hex digest of a checkpoint file."""
+    return hashlib.sha256(buffer).hexdigest()
+
+
+def pack_state(balances: Mapping[str, float], postings: Mapping[str, Sequence[Posting]]) -> bytes:
+    """
+    Packs the balances and postings of an address index.
+
+    Args:
+        balances (Mapping[str, float]): the balance of each address.
+        postings (Mapping[str, Sequence[Posting]]): the postings of each address, in chain order.
+
+    Returns:
+        The packed state.
+
+    Raises:
+        ValueError: if an address is longer than 65535 bytes once encoded.
+    """
+    parts: List[bytes] = [wire.COUNT.pack(len(postings))]
+    for address, address_postings in postings.items():
+        encoded: bytes = address.encode()
+        try:
+            parts.append(
+                ACCOUNT.pack(len(encoded), balances.get(address, 0.0), len(address_postings))
+            )
+        except struct.error as error:
+            raise ValueError(f"Can not pack address '{address[:32]}...': {error}") from error
+        parts.append(encoded)
+        flat: Iterable[int] = itertools.chain.from_iterable(address_postings)
+        parts.append(struct.pack(f">{2 * len(address_postings)}I", *flat))
+    return b"".join(parts)
+
+
+def unpack_state(buffer: wire.Buffer, offset: int = 0) -> Tuple[State, int]:
+    """
+    Decodes the state packed by `pack_state`.
+
+    Returns:
+        The balances and postings by address, and the offset of the bytes following them.
+
+    Raises:
+        struct.error, ValueError: if the state is truncated or malformed.
+    """
+    view = memoryview(buffer)
+    balances: Dict[str, float] = {}
+    postings: Dict[str, List[Posting]] = {}
+    (count,) = wire.COUNT.unpack_from(view, offset)
+    offset += wire.COUNT.size
+    for _ in range(count):
+        size, balance, posting_count = ACCOUNT.unpack_from(view, offset)
+        offset += ACCOUNT.size
+        if offset + size > len(view):
+            raise ValueError("Packed address goes past the end of the checkpoint")
+        address: str = str(view[offset : offset + size], "utf-8")
+        offset += size
+        end: int = offset + posting_count * POSTING.size
+        if end > len(view):
+            raise ValueError("Packed postings go past the end of the checkpoint")
+        balances[address] = balance
+        postings[address] = list(POSTING.iter_unpack(view[offset:end]))
+        offset = end
+    return (balances, postings), offset
+
+
+def pack_checkpoint(height: int, tip_hash: str, records: Iterable[bytes], state: bytes) -> bytes:
+    """
+    Assembles a checkpoint file.
+
+    Args:
+        height (int): number of blocks in the checkpoint.
+        tip_hash (str): hash of the last block.
+        records (Iterable[bytes]): the packed blocks, in chain order.
+        state (bytes): the address index at the last block, packed by `pack_state`.
+
+    Returns:
+        The checkpoint file.
+    """
+    blocks: bytes = wire.pack_message(records, height)
+    header: bytes = HEADER.pack(MAGIC, height, wire.pack_digest(tip_hash))
+    return b"".join([header, SECTION_SIZE.pack(len(blocks)), blocks, state])
+
+
+def unpack_checkpoint(buffer: wire.Buffer) -> Tuple[int, str, List[memoryview], State]:
+    """
+    Splits a checkpoint file in its parts, without decoding its blocks.
+
+    Args:
+        buffer (wire.Buffer): the checkpoint file.
+
+    Returns:
+        A tuple of the height, the hash of the last block, a view on each packed block and the
+        address index's balances and postings.
+
+    Raises:
+        ValueError: if the file is malformed.
+    """
+    view = memoryview(buffer)
+    height, tip_hash = _unpack_header(view)
+    try:
+        (size,) = SECTION_SIZE.unpack_from(view, HEADER.size)
+        start: int = HEADER.size + SECTION_SIZE.size
+        if start + size > len(view):
+            raise ValueError("Truncated checkpoint")
+        _, records = wire.unpack_message(view[start : start + size])
+        state, offset = unpack_state(view, start + size)
+    except struct.error as error:
+        raise ValueError(f"Malformed checkpoint: {error}") from error
+    if offset != len(view):
+        raise ValueError("Unexpected bytes after the state of the checkpoint")
+    if len(records) != height:
+        raise ValueError(f"Checkpoint of height {height} holds {len(records)} block(s)")
+    return height, tip_hash, records, state
+
+
+def read_state(buffer: wire.Buffer) -> State:
+    """
+    Decodes the address index of a checkpoint file, skipping over its blocks.
+
+    Args:
+        buffer (wire.Buffer): the checkpoint file.
+
+    Returns:
+        The address index's balances and postings.
+
+    Raises:
+        ValueError: if the file is malformed.
+    """
+    view = memoryview(buffer)
+    _unpack_header(view)
+    try:
+        (size,) = SECTION_SIZE.unpack_from(view, HEADER.size)
+        state, offset = unpack_state(view, HEADER.size + SECTION_SIZE.size + size)
+    except struct.error as error:
+        raise ValueError(f"Malformed checkpoint: {error}") from error
+    if offset != len(view):
+        raise ValueError("Unexpected bytes after the state of the checkpoint")
+    return state
+
+
+def _unpack_header(buffer: wire.Buffer) -> Tuple[int, str]:
+    try:
+        magic, height, tip_hash = HEADER.unpack_from(buffer, 0)
+    except struct.error as error:
+        raise ValueError("Truncated checkpoint") from error
+    if magic != MAGIC:
+        raise ValueError("Not a checkpoint file")
+    return height, tip_hash.hex()
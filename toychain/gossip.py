@@ -0,0 +1,258 @@
+"""
+Push propagation of new blocks and transactions: a node announces the hashes of what it mines or
+accepts to a few of its peers, which fetch what they are missing and announce it in turn.
+"""
+
+import asyncio
+import random
+import threading
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+from typing import Any, Dict, Iterable, List, Optional
+
+import requests
+
+from loguru import logger
+
+from toychain.blockchain import Block, BlockChain, Transaction, parse_block
+from toychain.mempool import Mempool
+
+DEFAULT_FANOUT: int = 8  # peers per announcement
+DEFAULT_SEEN_CAPACITY: int = 100_000  # remembered hashes
+
+_FETCH_ERRORS = (requests.RequestException, KeyError, TypeError, ValueError)
+
+
+class Gossip:
+    """
+    Announces new blocks and transactions to at most `fanout` randomly picked peers, by hash only.
+    A peer receiving an announcement fetches the blocks and transactions it has not seen yet from
+    the announcing node, adds them and announces them to its own peers, so that they spread
+    through the network in a few hops without any node pulling whole chains. Recently seen hashes
+    are remembered so that each node fetches and relays each item once.
+
+    A block coming right after this node's tip is appended. A block further ahead makes this
+    node synchronize headers-first from the announcing node, as the consensus does. Only
+    registered peers are listened to: announcements from other nodes are ignored, so that no one
+    can make this node query arbitrary addresses.
+    """
+
+    __slots__ = {
+        "blockchain": "BlockChain object whose new blocks and transactions are propagated",
+        "address": "Netloc other nodes fetch announced items from, None to not announce anything",
+        "fanout": "Maximum number of peers each announcement is sent to",
+        "seen_capacity": "Maximum number of remembered block and transaction hashes",
+        "_seen": "OrderedDict of recently seen block and transaction hashes, oldest first",
+        "_lock": "Lock guarding the seen hashes",
+        "_executor": "ThreadPoolExecutor sending announcements and fetching announced items",
+    }
+
+    def __init__(
+        self,
+        blockchain: BlockChain,
+        address: Optional[str] = None,
+        fanout: int = DEFAULT_FANOUT,
+        seen_capacity: int = DEFAULT_SEEN_CAPACITY,
+        workers: int = 4,
+    ):
+        self.blockchain: BlockChain = blockchain
+        self.address: Optional[str] = address
+        self.fanout: int = fanout
+        self.seen_capacity: int = seen_capacity
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="gossip"
+        )
+
+    def mark_seen(self, item_hash: str) -> bool:
+        """
+        Remembers a block or transaction hash, forgetting the oldest one if there are too many.
+
+        Args:
+            item_hash (str): hex digest of the block or transaction.
+
+        Returns:
+            True if the hash was not seen before, False otherwise.
+        """
+        with self._lock:
+            if item_hash in self._seen:
+                return False
+            self._seen[item_hash] = None
+            if len(self._seen) > self.seen_capacity:
+                self._seen.popitem(last=False)
+            return True
+
+    def announce_block(self, block: Block, exclude: Optional[str] = None) -> List[str]:
+        """
+        Announces a block to peers in the background.
+
+        Args:
+            block (Block): the block mined or received by this node.
+            exclude (Optional[str]): netloc of a node not to announce it to, such as its sender.
+
+        Returns:
+            The peers the announcement is sent to.
+        """
+        self.mark_seen(block.digest)
+        return self._announce({"blocks": [{"hash": block.digest, "index": block.index}]}, exclude)
+
+    def announce_transactions(
+        self, transactions: Iterable[Transaction], exclude: Optional[str] = None
+    ) -> List[str]:
+        """
+        Announces transactions to peers in the background, leaving out those already seen.
+
+        Args:
+            transactions (Iterable[Transaction]): the transactions accepted by this node.
+            exclude (Optional[str]): netloc of a node not to announce them to, such as their
+                sender.
+
+        Returns:
+            The peers the announcement is sent to, if any transaction was new.
+        """
+        hashes: List[str] = [
+            transaction_hash
+            for transaction_hash in (Mempool.hash(tx).hex() for tx in transactions)
+            if self.mark_seen(transaction_hash)
+        ]
+        if not hashes:
+            return []
+        return self._announce({"transactions": hashes}, exclude)
+
+    def receive(
+        self,
+        sender: str,
+        blocks: Iterable[Dict[str, Any]] = (),
+        transactions: Iterable[str] = (),
+    ) -> Dict[str, int]:
+        """
+        Handles an announcement, fetching the announced items not seen yet in the background.
+        The announcing node's tip is recorded in the peer registry from the blocks it announces.
+        Announcements from nodes not registered as peers are ignored.
+
+        Args:
+            sender (str): netloc of the announcing node, to fetch the items from.
+            blocks (Iterable[Dict[str, Any]]): the hash and index of each announced block.
+            transactions (Iterable[str]): the hash of each announced transaction.
+
+        Returns:
+            The number of blocks and transactions that will be fetched.
+        """
+        if sender not in self.blockchain.peers:
+            logger.debug("Ignoring an announcement from unregistered node '{}'", sender)
+            return {"blocks": 0, "transactions": 0}
+        announced_blocks: List[Dict[str, Any]] = list(blocks)
+        if announced_blocks:
+            tip: Dict[str, Any] = max(announced_blocks, key=lambda block: block["index"])
+            self.blockchain.peers.record_tip(sender, tip["index"], tip["hash"])
+        new_blocks: List[Dict[str, Any]] = [
+            block for block in announced_blocks if self.mark_seen(block["hash"])
+        ]
+        new_transactions: List[str] = [
+            transaction_hash
+            for transaction_hash in transactions
+            if self.mark_seen(transaction_hash)
+        ]
+        for block in new_blocks:
+            self._executor.submit(self._fetch_block, sender, block["hash"], block["index"])
+        if new_transactions:
+            self._executor.submit(self._fetch_transactions, sender, new_transactions)
+        return {"blocks": len(new_blocks), "transactions": len(new_transactions)}
+
+    def close(self) -> None:
+        """
+        Waits for pending announcements and fetches, and stops the background threads.
+
+        Returns:
+            Nothing.
+        """
+        self._executor.shutdown(wait=True)
+
+    def _announce(self, content: Dict[str, Any], exclude: Optional[str]) -> List[str]:
+        if self.address is None:
+            return []
+        candidates: List[str] = sorted(self.blockchain.peers.available((exclude, self.address)))
+        peers: List[str] = random.sample(candidates, min(self.fanout, len(candidates)))
+        for peer in peers:
+            self._executor.submit(self._send, peer, {"sender": self.address, **content})
+        return peers
+
+    def _send(self, peer: str, content: Dict[str, Any]) -> None:
+        started: float = monotonic()
+        try:
+            self.blockchain.client.post_json(peer, "/gossip", content)
+        except _FETCH_ERRORS as error:
+            logger.debug("Could not announce to node '{}': {!r}", peer, error)
+            self.blockchain.peers.record_failure(peer)
+            return
+        self.blockchain.peers.record_success(peer, latency=monotonic() - started)
+
+    def _forget(self, item_hash: str) -> None:
+        """Forgets a hash whose item could not be fetched, so a later announcement is handled."""
+        with self._lock:
+            self._seen.pop(item_hash, None)
+
+    def _fetch_block(self, sender: str, block_hash: str, index: int) -> None:
+        length: int = len(self.blockchain.chain)
+        if index <= length:  # this node has a chain at least as long, with or without the block
+            return
+        if index > length + 1:
+            logger.info("Node '{}' announced block {}, synchronizing from it", sender, index)
+            if asyncio.run(self.blockchain.sync_from(sender)):
+                self.announce_block(self.blockchain.last_block, exclude=sender)
+            else:
+                self._forget(block_hash)
+            return
+
+        try:
+            records = self.blockchain.client.iter_negotiated(
+                sender, "/chain", {"start": index, "limit": 1, "stream": "true"}
+            )
+            received: List[Block] = [parse_block(record) for record in records]
+        except _FETCH_ERRORS as error:
+            logger.warning("Could not fetch block {} from node '{}': {!r}", index, sender, error)
+            self.blockchain.peers.record_failure(sender)
+            self._forget(block_hash)
+            return
+
+        if len(received) != 1 or received[0].digest != block_hash:
+            logger.warning("Node '{}' did not send the block it announced", sender)
+            self._forget(block_hash)
+        elif self.blockchain.append_block(received[0]):
+            self.announce_block(received[0], exclude=sender)
+        elif received[0].index > len(self.blockchain.chain):  # not on this node's tip: a fork
+            if asyncio.run(self.blockchain.sync_from(sender)):
+                self.announce_block(self.blockchain.last_block, exclude=sender)
+
+    def _admit(self, transaction: Transaction) -> bool:
+        """Adds a received transaction to the mempool, unless it is invalid or already waiting."""
+        try:
+            return self.blockchain.add_transactions([transaction]) == 1
+        except ValueError as error:
+            logger.debug("Dropping announced transaction: {}", error)
+            return False
+
+    def _fetch_transactions(self, sender: str, hashes: List[str]) -> None:
+        try:
+            content = self.blockchain.client.post_json(
+                sender, "/gossip/transactions", {"hashes": hashes}
+            )
+            received: List[Transaction] = [
+                Transaction.parse_obj(transaction) for transaction in content["transactions"]
+            ]
+        except _FETCH_ERRORS as error:
+            logger.warning("Could not fetch transactions from node '{}': {!r}", sender, error)
+            self.blockchain.peers.record_failure(sender)
+            for transaction_hash in hashes:
+                self._forget(transaction_hash)
+            return
+
+        added: List[Transaction] = [
+            transaction for transaction in received if self._admit(transaction)
+        ]
+        if added:
+            logger.debug("Added {} transaction(s) announced by node '{}'", len(added), sender)
+            self._announce({"transactions": [Mempool.hash(tx).hex() for tx in added]}, sender)
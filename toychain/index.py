@@ -0,0 +1,130 @@
+"""
+Index of the chain's transactions by address, maintained as blocks are added and removed.
+"""
+
+from collections import defaultdict
+from typing import TYPE_CHECKING, DefaultDict, Iterable, List, Mapping, Tuple
+
+from loguru import logger
+
+if TYPE_CHECKING:
+    from toychain.blockchain import Block
+
+Posting = Tuple[int, int]  # index of a block, and position of a transaction in that block
+
+
+class AddressIndex:
+    """
+    Balances of addresses and postings of the transactions they take part in. Postings of an
+    address are kept in chain order, so that blocks can be removed from the tip of the chain as
+    cheaply as they were added.
+    """
+
+    __slots__ = {
+        "balances": "Dict of the balance of each address, over all indexed blocks",
+        "postings": "Dict of the (block index, position) of each transaction touching an address",
+    }
+
+    def __init__(self):
+        self.balances: DefaultDict[str, float] = defaultdict(float)
+        self.postings: DefaultDict[str, List[Posting]] = defaultdict(list)
+
+    def add_block(self, block: "Block") -> None:
+        """
+        Indexes the transactions of a block appended to the chain.
+
+        Args:
+            block (Block): the new tip of the chain.
+
+        Returns:
+            Nothing, updates in place.
+        """
+        for position, transaction in enumerate(block.transactions):
+            self.balances[transaction.sender] -= transaction.amount
+            self.balances[transaction.recipient] += transaction.amount
+            self.postings[transaction.sender].append((block.index, position))
+            if transaction.recipient != transaction.sender:
+                self.postings[transaction.recipient].append((block.index, position))
+
+    def remove_block(self, block: "Block") -> None:
+        """
+        Removes the transactions of a block dropped from the tip of the chain.
+
+        Args:
+            block (Block): the current tip of the chain, about to be dropped.
+
+        Returns:
+            Nothing, updates in place.
+        """
+        for transaction in reversed(block.transactions):
+            self.balances[transaction.sender] += transaction.amount
+            self.balances[transaction.recipient] -= transaction.amount
+            for address in {transaction.sender, transaction.recipient}:
+                self.postings[address].pop()
+                if not self.postings[address]:
+                    del self.postings[address]
+                    del self.balances[address]
+
+    def rebuild(self, blocks: Iterable["Block"]) -> None:
+        """
+        Drops all indexed data and indexes a whole chain.
+
+        Args:
+            blocks (Iterable[Block]): the blocks of the chain, in order.
+
+        Returns:
+            Nothing, rebuilds in place.
+        """
+        self.balances.clear()
+        self.postings.clear()
+        for block in blocks:
+            self.add_block(block)
+        logger.debug("Indexed transactions of {} address(es)", len(self.postings))
+
+    def restore(
+        self, balances: Mapping[str, float], postings: Mapping[str, Iterable[Posting]]
+    ) -> None:
+        """
+        Drops all indexed data and replaces it with the index of a chain computed elsewhere, such
+        as one loaded from a checkpoint.
+
+        Args:
+            balances (Mapping[str, float]): the balance of each address.
+            postings (Mapping[str, Iterable[Posting]]): the postings of each address, in chain
+                order.
+
+        Returns:
+            Nothing, replaces in place.
+        """
+        self.balances.clear()
+        self.postings.clear()
+        self.balances.update(balances)
+        for address, address_postings in postings.items():
+            self.postings[address] = list(address_postings)
+        logger.debug("Restored the index of {} address(es)", len(self.postings))
+
+    def balance(self, address: str) -> float:
+        """
+        Gives the balance of an address.
+
+        Args:
+            address (str): the address to look up.
+
+        Returns:
+            The sum of the amounts received by the address minus the amounts it sent, 0 if it
+            does not appear in the chain.
+        """
+        return self.balances.get(address, 0.0)
+
+    def postings_of(self, address: str) -> List[Posting]:
+        """
+        Gives the location of the transactions an address takes part in.
+
+        Args:
+            address (str): the address to look up.
+
+        Returns:
+            The (block index, position in block) of each transaction sent or received by the
+            address, in chain order.
+        """
+        return self.postings.get(address, [])
@@ -0,0 +1,108 @@
+"""
+Reader/writer lock guarding the state of a BlockChain shared by the node's request threads.
+"""
+
+import threading
+
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
+
+
+class ReadWriteLock:
+    """
+    Lock letting any number of readers in at once, or a single writer. Waiting writers go before
+    newly arriving readers, so that a steady stream of reads can not starve writes. A thread
+    holding the lock, for reading or writing, can take it again for reading, and a writer can take
+    it again for writing. A reader can not take it for writing, which would deadlock.
+
+    Work following a write, but not needing the lock, can be left for when the writer releases
+    it with `after_write`, so that readers are not kept waiting on it.
+    """
+
+    __slots__ = {
+        "_condition": "Condition on which threads wait for the lock",
+        "_readers": "Number of threads holding the lock for reading",
+        "_writer": "Identifier of the thread holding the lock for writing, if any",
+        "_waiting_writers": "Number of threads waiting to take the lock for writing",
+        "_local": "Thread-local depth of the calling thread's read holds",
+        "_after_write": "List of the functions to call once the writer releases the lock",
+    }
+
+    def __init__(self):
+        self._condition: threading.Condition = threading.Condition(threading.Lock())
+        self._readers: int = 0
+        self._writer: Optional[int] = None
+        self._waiting_writers: int = 0
+        self._local: threading.local = threading.local()
+        self._after_write: List[Callable[[], None]] = []
+
+    @contextmanager
+    def read_locked(self) -> Iterator[None]:
+        """Holds the lock for reading for the duration of the `with` block."""
+        depth: int = getattr(self._local, "depth", 0)
+        if depth or self._writer == threading.get_ident():
+            self._local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._local.depth = depth
+            return
+
+        with self._condition:
+            while self._writer is not None or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        self._local.depth = 1
+        try:
+            yield
+        finally:
+            self._local.depth = 0
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write_locked(self) -> Iterator[None]:
+        """Holds the lock for writing for the duration of the `with` block."""
+        thread: int = threading.get_ident()
+        if self._writer == thread:
+            yield
+            return
+        if getattr(self._local, "depth", 0):
+            raise RuntimeError("Can not take a lock for writing while holding it for reading")
+
+        with self._condition:
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = thread
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = None
+                callbacks, self._after_write = self._after_write, []
+                self._condition.notify_all()
+            for callback in callbacks:
+                callback()
+
+    def after_write(self, callback: Callable[[], None]) -> None:
+        """
+        Calls a function once the calling thread releases the lock for writing, from that thread,
+        or right away if the thread does not hold the lock for writing. A function registered
+        several times while the lock is held is called once.
+
+        Args:
+            callback (Callable[[], None]): the function to call.
+
+        Returns:
+            Nothing.
+        """
+        if self._writer != threading.get_ident():
+            callback()
+        elif callback not in self._after_write:
+            self._after_write.append(callback)
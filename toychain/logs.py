@@ -0,0 +1,82 @@
+"""
+Node-wide logging configuration. Messages go through loguru, which drops those below the
+configured level before formatting them, as long as they are given as a format string and
+arguments rather than as an f-string. The mining, hashing and validation paths skip their logging
+calls altogether below the configured level, by checking the flags of `LOGGING` first.
+"""
+
+import sys
+
+from typing import TextIO
+
+from loguru import logger
+
+LEVELS: tuple = ("TRACE", "DEBUG", "INFO", "SUCCESS", "WARNING", "ERROR", "CRITICAL")
+DEFAULT_LOG_LEVEL: str = "INFO"
+
+
+class LogLevel:
+    """The level messages are logged from, and whether the lowest levels are enabled."""
+
+    __slots__ = {
+        "name": "Name of the lowest level logged, one of `LEVELS`",
+        "trace": "Whether TRACE messages are logged",
+        "debug": "Whether DEBUG messages are logged",
+    }
+
+    def __init__(self, name: str = "DEBUG"):
+        self.name: str = name
+        self.trace: bool = False
+        self.debug: bool = False
+        self.set(name)
+
+    def __repr__(self) -> str:
+        return f"LogLevel('{self.name}')"
+
+    def set(self, name: str) -> None:
+        """
+        Changes the level messages are logged from, without touching loguru's handlers.
+
+        Args:
+            name (str): name of the lowest level to log, case insensitive.
+
+        Returns:
+            Nothing, updates in place.
+
+        Raises:
+            ValueError: if the level is not one of `LEVELS`.
+        """
+        name = name.upper()
+        if name not in LEVELS:
+            raise ValueError(f"Unknown log level '{name}', expected one of {', '.join(LEVELS)}")
+        self.name = name
+        self.trace = LEVELS.index(name) <= LEVELS.index("TRACE")
+        self.debug = LEVELS.index(name) <= LEVELS.index("DEBUG")
+
+
+def configure_logging(level: str = DEFAULT_LOG_LEVEL, sink: TextIO = sys.stderr) -> None:
+    """
+    Replaces loguru's handlers with a single one logging from the given level, and updates
+    `LOGGING` accordingly.
+
+    Args:
+        level (str): name of the lowest level to log, case insensitive. Defaults to INFO.
+        sink (TextIO): where to write messages. Defaults to the standard error stream.
+
+    Returns:
+        Nothing.
+
+    Raises:
+        ValueError: if the level is not one of `LEVELS`.
+    """
+    LOGGING.set(level)
+    logger.remove()
+    logger.add(sink, level=LOGGING.name)
+
+
+def uvicorn_level(level: str) -> str:
+    """Gives the name uvicorn knows a log level by, uvicorn having no SUCCESS level."""
+    return "warning" if level.upper() == "SUCCESS" else level.lower()
+
+
+LOGGING: LogLevel = LogLevel()  # matches loguru's default handler until configured
@@ -0,0 +1,210 @@
+"""
+Pool of transactions waiting to be recorded in a block, bounded and split in shards.
+"""
+
+import hashlib
+import heapq
+import itertools
+import threading
+
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+from toychain.logs import LOGGING
+
+if TYPE_CHECKING:
+    from toychain.blockchain import Transaction
+
+DEFAULT_MEMPOOL_CAPACITY: int = 100_000  # transactions
+DEFAULT_BLOCK_SIZE: int = 5_000  # transactions
+
+Entry = Tuple[int, bytes, "Transaction"]  # arrival number, hash and transaction
+Spending = Tuple[int, float]  # number of a sender's waiting transactions, and their total amount
+
+
+class Mempool:
+    """
+    Transactions waiting to be mined, identified by the hash of their canonical encoding so that
+    duplicates are dropped. They are spread over shards by hash, each with its own lock, so that
+    concurrent additions rarely wait on each other. When a shard is full, its oldest transaction
+    is evicted to make room for the new one. Transactions are taken out in arrival order. Each
+    shard also tallies what the senders of its transactions spend, to check new transactions
+    against their sender's balance.
+    """
+
+    __slots__ = {
+        "capacity": "Maximum number of transactions held, over all shards",
+        "evicted": "Number of transactions evicted to make room for newer ones",
+        "_shards": "List of OrderedDicts of the entries of each shard, by transaction hash",
+        "_locks": "List of the lock of each shard",
+        "_arrivals": "Counter numbering transactions in arrival order",
+        "_spending": "List of dicts of the number and total amount sent by each sender, by shard",
+    }
+
+    def __init__(self, capacity: int = DEFAULT_MEMPOOL_CAPACITY, shards: int = 16):
+        if capacity < shards:
+            raise ValueError("A mempool's capacity can not be lower than its number of shards")
+        self.capacity: int = capacity
+        self.evicted: int = 0
+        self._shards: List["OrderedDict[bytes, Entry]"] = [OrderedDict() for _ in range(shards)]
+        self._locks: List[threading.Lock] = [threading.Lock() for _ in range(shards)]
+        self._arrivals: Iterator[int] = itertools.count()
+        self._spending: List[Dict[str, Spending]] = [{} for _ in range(shards)]
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    def __contains__(self, transaction: "Transaction") -> bool:
+        transaction_hash: bytes = self.hash(transaction)
+        return transaction_hash in self._shards[self._shard_of(transaction_hash)]
+
+    @staticmethod
+    def hash(transaction: "Transaction") -> bytes:
+        """
+        Hashes a transaction's contents, through its canonical encoding.
+
+        Args:
+            transaction (Transaction): the transaction to hash.
+
+        Returns:
+            The SHA-256 digest of the transaction, as bytes.
+        """
+        return hashlib.sha256(transaction.canonical_bytes()).digest()
+
+    def add(self, transaction: "Transaction") -> bool:
+        """
+        Adds a transaction to the pool, unless the same transaction is already waiting. If its
+        shard is full, the oldest transaction of the shard is evicted.
+
+        Args:
+            transaction (Transaction): the transaction to add.
+
+        Returns:
+            True if the transaction was added, False if it is a duplicate.
+        """
+        transaction_hash: bytes = self.hash(transaction)
+        shard_number: int = self._shard_of(transaction_hash)
+        shard = self._shards[shard_number]
+        with self._locks[shard_number]:
+            if transaction_hash in shard:
+                return False
+            if len(shard) >= self.capacity // len(self._shards):
+                _, (_, _, evicted) = shard.popitem(last=False)
+                self._tally(shard_number, evicted, -1)
+                self.evicted += 1
+            shard[transaction_hash] = (next(self._arrivals), transaction_hash, transaction)
+            self._tally(shard_number, transaction, 1)
+        return True
+
+    def add_many(self, transactions: Iterable["Transaction"]) -> int:
+        """
+        Adds transactions to the pool, see `add`.
+
+        Args:
+            transactions (Iterable[Transaction]): the transactions to add.
+
+        Returns:
+            The number of transactions added, duplicates aside.
+        """
+        return sum(self.add(transaction) for transaction in transactions)
+
+    def get(self, transaction_hash: bytes) -> Optional["Transaction"]:
+        """
+        Looks up a waiting transaction by hash.
+
+        Args:
+            transaction_hash (bytes): the hash of the transaction, as given by `hash`.
+
+        Returns:
+            The transaction, or None if it is not waiting in the pool.
+        """
+        entry: Optional[Entry] = self._shards[self._shard_of(transaction_hash)].get(
+            transaction_hash
+        )
+        return entry[2] if entry is not None else None
+
+    def spending(self, sender: str) -> float:
+        """
+        Gives the total amount sent by an address in the waiting transactions.
+
+        Args:
+            sender (str): the address to look up.
+
+        Returns:
+            The sum of the amounts of the address' waiting transactions, 0 if it has none.
+        """
+        return sum(shard.get(sender, (0, 0.0))[1] for shard in self._spending)
+
+    def discard(self, transactions: Iterable["Transaction"]) -> int:
+        """
+        Removes transactions from the pool if they are waiting in it, for instance because they
+        were recorded in a block received from another node.
+
+        Args:
+            transactions (Iterable[Transaction]): the transactions to remove.
+
+        Returns:
+            The number of transactions removed.
+        """
+        removed: int = 0
+        for transaction in transactions:
+            transaction_hash: bytes = self.hash(transaction)
+            shard_number: int = self._shard_of(transaction_hash)
+            with self._locks[shard_number]:
+                if self._shards[shard_number].pop(transaction_hash, None) is not None:
+                    self._tally(shard_number, transaction, -1)
+                    removed += 1
+        return removed
+
+    def take(self, limit: int) -> List["Transaction"]:
+        """
+        Removes the oldest transactions from the pool, to record them in a block.
+
+        Args:
+            limit (int): the maximum number of transactions to take.
+
+        Returns:
+            Up to `limit` transactions, in arrival order.
+        """
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            taken: List[Entry] = list(
+                itertools.islice(heapq.merge(*(shard.values() for shard in self._shards)), limit)
+            )
+            for _, transaction_hash, transaction in taken:
+                shard_number: int = self._shard_of(transaction_hash)
+                del self._shards[shard_number][transaction_hash]
+                self._tally(shard_number, transaction, -1)
+        finally:
+            for lock in self._locks:
+                lock.release()
+        if taken and LOGGING.debug:
+            logger.debug("Took {} transaction(s) from the mempool, {} left", len(taken), len(self))
+        return [transaction for _, _, transaction in taken]
+
+    def pending(self) -> List["Transaction"]:
+        """
+        Lists the transactions in the pool without removing them.
+
+        Returns:
+            The waiting transactions, in arrival order.
+        """
+        entries: List[Entry] = sorted(
+            itertools.chain.from_iterable(list(shard.values()) for shard in self._shards)
+        )
+        return [transaction for _, _, transaction in entries]
+
+    def _shard_of(self, transaction_hash: bytes) -> int:
+        return transaction_hash[0] % len(self._shards)
+
+    def _tally(self, shard_number: int, transaction: "Transaction", sign: int) -> None:
+        """Counts a transaction in or out of its sender's spending, under its shard's lock."""
+        spending: Dict[str, Spending] = self._spending[shard_number]
+        count, total = spending.get(transaction.sender, (0, 0.0))
+        if count + sign:
+            spending[transaction.sender] = (count + sign, total + sign * transaction.amount)
+        else:
+            del spending[transaction.sender]
@@ -0,0 +1,124 @@
+"""
+Merkle trees committing to the transactions of a block, and proofs of inclusion in them.
+"""
+
+import hashlib
+
+from typing import Dict, List
+
+# Leaves and inner nodes are hashed with different prefixes, so that an inner node can not be
+# passed off as a leaf.
+_LEAF_PREFIX = b"\x00"
+_NODE_PREFIX = b"\x01"
+
+ProofStep = Dict[str, str]  # hash of a sibling node, and its side: "left" or "right"
+
+
+def leaf_hash(encoded_leaf: bytes) -> bytes:
+    """
+    Hashes a leaf of the tree.
+
+    Args:
+        encoded_leaf (bytes): the canonical encoding of a transaction.
+
+    Returns:
+        The SHA-256 digest of the leaf.
+    """
+    return hashlib.sha256(_LEAF_PREFIX + encoded_leaf).digest()
+
+
+def node_hash(left: bytes, right: bytes) -> bytes:
+    """
+    Hashes an inner node of the tree from its two children.
+
+    Args:
+        left (bytes): digest of the left child.
+        right (bytes): digest of the right child.
+
+    Returns:
+        The SHA-256 digest of the node.
+    """
+    return hashlib.sha256(_NODE_PREFIX + left + right).digest()
+
+
+def merkle_root(encoded_leaves: List[bytes]) -> str:
+    """
+    Computes the root of the tree over the given leaves. A level with an odd number of nodes
+    carries its last node up to the next level as is, rather than pairing it with itself.
+
+    Args:
+        encoded_leaves (List[bytes]): the canonical encoding of each transaction, in order.
+
+    Returns:
+        The hex digest of the root, the SHA-256 of nothing if there are no leaves.
+    """
+    if not encoded_leaves:
+        return hashlib.sha256(b"").hexdigest()
+
+    level: List[bytes] = [leaf_hash(leaf) for leaf in encoded_leaves]
+    while len(level) > 1:
+        level = _next_level(level)
+    return level[0].hex()
+
+
+def merkle_proof(encoded_leaves: List[bytes], position: int) -> List[ProofStep]:
+    """
+    Computes the proof that a leaf is part of the tree: the siblings of each node on the path
+    from the leaf to the root, a level without sibling being skipped.
+
+    Args:
+        encoded_leaves (List[bytes]): the canonical encoding of each transaction, in order.
+        position (int): position of the leaf to prove.
+
+    Returns:
+        The proof, from the leaf's level up, as a list of the hex digest and side of each sibling.
+
+    Raises:
+        IndexError: if there is no leaf at `position`.
+    """
+    if not 0 <= position < len(encoded_leaves):
+        raise IndexError("Merkle tree leaf index out of range")
+
+    proof: List[ProofStep] = []
+    level: List[bytes] = [leaf_hash(leaf) for leaf in encoded_leaves]
+    while len(level) > 1:
+        sibling: int = position ^ 1
+        if sibling < len(level):
+            side: str = "left" if sibling < position else "right"
+            proof.append({"hash": level[sibling].hex(), "side": side})
+        level = _next_level(level)
+        position //= 2
+    return proof
+
+
+def root_from_proof(encoded_leaf: bytes, proof: List[ProofStep]) -> str:
+    """
+    Recomputes the root of a tree from one of its leaves and the proof of its inclusion.
+
+    Args:
+        encoded_leaf (bytes): the canonical encoding of the transaction.
+        proof (List[ProofStep]): the proof, as given by `merkle_proof`.
+
+    Returns:
+        The hex digest of the root the proof leads to.
+
+    Raises:
+        KeyError, ValueError: if the proof is malformed.
+    """
+    current: bytes = leaf_hash(encoded_leaf)
+    for step in proof:
+        sibling: bytes = bytes.fromhex(step["hash"])
+        if step["side"] == "left":
+            current = node_hash(sibling, current)
+        elif step["side"] == "right":
+            current = node_hash(current, sibling)
+        else:
+            raise ValueError(f"Invalid side '{step['side']}' in Merkle proof")
+    return current.hex()
+
+
+def _next_level(level: List[bytes]) -> List[bytes]:
+    parents: List[bytes] = [node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+    if len(level) % 2:
+        parents.append(level[-1])
+    return parents
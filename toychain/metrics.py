@@ -0,0 +1,279 @@
+"""
+Counters, gauges and histograms of what a node spends its time on, rendered in the Prometheus
+text exposition format. Metrics are disabled by default: recording then only costs an attribute
+lookup and a branch, and timing a block of code enters a shared no-op context manager, so that
+instrumented code can run under production load with metrics off.
+"""
+
+import threading
+
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+from typing import ContextManager, Dict, Iterator, List, Sequence, Tuple
+
+Labels = Tuple[str, ...]  # label values, in the order of the metric's label names
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+MEDIA_TYPE: str = "text/plain; version=0.0.4; charset=utf-8"
+_DISABLED: ContextManager[None] = nullcontext()
+
+
+class Registry:
+    """The metrics of a process, recorded only while the registry is enabled."""
+
+    __slots__ = {
+        "enabled": "Whether metrics record anything, False by default",
+        "_metrics": "Dict of the registered metrics by name, in registration order",
+        "_lock": "Lock guarding the registration of metrics",
+    }
+
+    def __init__(self, enabled: bool = False):
+        self.enabled: bool = enabled
+        self._metrics: Dict[str, "_Metric"] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> "Counter":
+        """Registers a counter, see `Counter`."""
+        return self._register(Counter(self, name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> "Gauge":
+        """Registers a gauge, see `Gauge`."""
+        return self._register(Gauge(self, name, documentation, labels))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> "Histogram":
+        """Registers a histogram, see `Histogram`."""
+        return self._register(Histogram(self, name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        """
+        Renders all metrics that recorded something.
+
+        Returns:
+            The metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics: List["_Metric"] = list(self._metrics.values())
+        return "".join(metric.render() for metric in metrics)
+
+    def reset(self) -> None:
+        """
+        Drops all recorded values, keeping the registered metrics.
+
+        Returns:
+            Nothing, resets in place.
+        """
+        with self._lock:
+            metrics: List["_Metric"] = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+    def _register(self, metric: "_Metric") -> "_Metric":
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"A metric named '{metric.name}' is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+
+class _Metric:
+    """Common parts of all metrics: name, documentation and recorded values by label values."""
+
+    __slots__ = {
+        "registry": "Registry the metric records for, and checks for being enabled",
+        "name": "Name of the metric",
+        "documentation": "One line description of the metric",
+        "label_names": "Names of the metric's labels",
+        "_values": "Dict of the recorded values by label values",
+        "_lock": "Lock guarding the recorded values",
+    }
+    kind: str = "untyped"
+
+    def __init__(self, registry: Registry, name: str, documentation: str, labels: Sequence[str]):
+        self.registry: Registry = registry
+        self.name: str = name
+        self.documentation: str = documentation
+        self.label_names: Tuple[str, ...] = tuple(labels)
+        self._values: Dict[Labels, object] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def reset(self) -> None:
+        """Drops all recorded values."""
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> str:
+        """Renders the metric's help and type lines and its samples, nothing if it has none."""
+        with self._lock:
+            samples: List[str] = [
+                line
+                for labels, value in self._values.items()
+                for line in self._lines(labels, value)
+            ]
+        if not samples:
+            return ""
+        documentation: str = self.documentation.replace("\\", r"\\").replace("\n", r"\n")
+        header: str = f"# HELP {self.name} {documentation}\n# TYPE {self.name} {self.kind}\n"
+        return header + "".join(samples)
+
+    def _lines(self, labels: Labels, value: object) -> Iterator[str]:
+        yield f"{self.name}{self._format_labels(labels)} {_format_number(value)}\n"
+
+    def _format_labels(self, labels: Labels, extra: str = "") -> str:
+        pairs: List[str] = [
+            f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels)
+        ]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter(_Metric):
+    """A count that only goes up, such as a number of hashes tried."""
+
+    __slots__ = {}
+    kind = "counter"
+
+    def inc(self, amount: float = 1, labels: Labels = ()) -> None:
+        """
+        Adds to the count for the given label values, if the registry is enabled.
+
+        Args:
+            amount (float): how much to add, not negative.
+            labels (Labels): the label values, in the order of the metric's label names.
+
+        Returns:
+            Nothing.
+        """
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: Labels = ()) -> float:
+        """Gives the count for the given label values, 0 if nothing was counted."""
+        return self._values.get(labels, 0)
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, such as the hash rate of the last proof of work search."""
+
+    __slots__ = {}
+    kind = "gauge"
+
+    def set(self, value: float, labels: Labels = ()) -> None:
+        """
+        Sets the value for the given label values, if the registry is enabled.
+
+        Args:
+            value (float): the new value.
+            labels (Labels): the label values, in the order of the metric's label names.
+
+        Returns:
+            Nothing.
+        """
+        if self.registry.enabled:
+            self._values[labels] = value
+
+    def value(self, labels: Labels = ()) -> float:
+        """Gives the value for the given label values, 0 if it was never set."""
+        return self._values.get(labels, 0)
+
+
+class Histogram(_Metric):
+    """
+    The distribution of observed values, such as durations in seconds: the number of values
+    falling under each bucket's upper bound, and the count and sum of all values.
+    """
+
+    __slots__ = {"buckets": "Sorted upper bounds of the buckets, +Inf aside"}
+    kind = "histogram"
+
+    def __init__(
+        self,
+        registry: Registry,
+        name: str,
+        documentation: str,
+        labels: Sequence[str],
+        buckets: Sequence[float],
+    ):
+        super().__init__(registry, name, documentation, labels)
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        """
+        Records a value for the given label values, if the registry is enabled.
+
+        Args:
+            value (float): the observed value.
+            labels (Labels): the label values, in the order of the metric's label names.
+
+        Returns:
+            Nothing.
+        """
+        if not self.registry.enabled:
+            return
+        bucket: int = bisect_left(self.buckets, value)
+        with self._lock:
+            recorded = self._values.get(labels)
+            if recorded is None:
+                recorded = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            recorded[0][bucket] += 1
+            recorded[1] += value
+
+    def time(self, labels: Labels = ()) -> ContextManager[None]:
+        """
+        Measures the duration of a `with` block in seconds and records it, if the registry is
+        enabled when the block starts.
+
+        Args:
+            labels (Labels): the label values, in the order of the metric's label names.
+
+        Returns:
+            A context manager, a shared no-op one if the registry is disabled.
+        """
+        if not self.registry.enabled:
+            return _DISABLED
+        return self._timed(labels)
+
+    def count(self, labels: Labels = ()) -> int:
+        """Gives the number of values recorded for the given label values."""
+        recorded = self._values.get(labels)
+        return sum(recorded[0]) if recorded is not None else 0
+
+    @contextmanager
+    def _timed(self, labels: Labels) -> Iterator[None]:
+        start: float = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, labels)
+
+    def _lines(self, labels: Labels, value: object) -> Iterator[str]:
+        counts, total = value
+        cumulative: int = 0
+        for bound, count in zip((*self.buckets, float("inf")), counts):
+            cumulative += count
+            bucket_labels: str = self._format_labels(labels, f'le="{_format_number(bound)}"')
+            yield f"{self.name}_bucket{bucket_labels} {cumulative}\n"
+        yield f"{self.name}_sum{self._format_labels(labels)} {_format_number(total)}\n"
+        yield f"{self.name}_count{self._format_labels(labels)} {cumulative}\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _format_number(value: object) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+METRICS: Registry = Registry()  # the registry of the node's metrics
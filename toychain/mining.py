@@ -0,0 +1,193 @@
+"""
+Proof of work search, either serial or spread over a pool of worker processes.
+"""
+
+import hashlib
+import itertools
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import Callable, Iterator, Optional, Tuple
+
+from loguru import logger
+
+from toychain.parallel import first_in_order
+
+DEFAULT_DIFFICULTY: int = 16  # leading zero bits, the historical 4 leading zeroes in hex form
+_BATCH_SIZE: int = 4_096
+
+
+@lru_cache(maxsize=None)
+def max_digest(difficulty: int = DEFAULT_DIFFICULTY) -> bytes:
+    """
+    Gives the highest digest meeting a difficulty. Since digests are big-endian, comparing raw
+    digest bytes to it is the same as checking for `difficulty` leading zero bits.
+
+    Args:
+        difficulty (int): the number of leading zero bits required, from 0 to 256.
+
+    Returns:
+        The highest valid digest, as 32 bytes.
+    """
+    if not 0 <= difficulty <= 256:
+        raise ValueError(f"Difficulty should be between 0 and 256 bits, got {difficulty}")
+    return ((1 << (256 - difficulty)) - 1).to_bytes(32, "big")
+
+
+def proof_is_valid(
+    last_proof: int = None, new_proof: int = None, difficulty: int = DEFAULT_DIFFICULTY
+) -> bool:
+    """
+    Validates a proof: does hash(last_proof, new_proof) have `difficulty` leading zero bits? The
+    check is done on the raw digest bytes.
+
+    Args:
+        last_proof (int): the previous proof in the chain.
+        new_proof (int): the new proof.
+        difficulty (int): the number of leading zero bits required.
+
+    Returns:
+        True if new_proof is validated, False otherwise.
+    """
+    guess: bytes = f"{last_proof}{new_proof}".encode()
+    return hashlib.sha256(guess).digest() <= max_digest(difficulty)
+
+
+def search_range(
+    last_proof: int, start: int, stop: Optional[int] = None, difficulty: int = DEFAULT_DIFFICULTY
+) -> Optional[int]:
+    """
+    Looks for the first proof in [start, stop) such that hash(last_proof, proof) has `difficulty`
+    leading zero bits. This is the unit of work handed to each worker, and does not log anything.
+    The hash state of the constant `last_proof` prefix is computed once and copied for each
+    candidate, which are walked in batches.
+
+    Args:
+        last_proof (int): the previous proof in the chain.
+        start (int): first candidate proof to try.
+        stop (Optional[int]): candidate proof to stop at, excluded. Searches forever if None.
+        difficulty (int): the number of leading zero bits required.
+
+    Returns:
+        The first valid proof in the range, or None if there is none.
+    """
+    new_prefix_state = hashlib.sha256(f"{last_proof}".encode()).copy
+    highest_digest: bytes = max_digest(difficulty)
+    batch_start: int = start
+
+    while stop is None or batch_start < stop:
+        batch_stop: int = (
+            batch_start + _BATCH_SIZE if stop is None else min(batch_start + _BATCH_SIZE, stop)
+        )
+        for candidate in range(batch_start, batch_stop):
+            state = new_prefix_state()
+            state.update(b"%d" % candidate)
+            if state.digest() <= highest_digest:
+                return candidate
+        batch_start = batch_stop
+    return None
+
+
+class ParallelMiner:
+    """
+    Proof of work engine splitting the candidate proofs in chunks over a pool of processes. The
+    found proof is always the smallest valid one, the same the serial search would return. A
+    search that can be stopped hands out smaller chunks, a single batch of `search_range` by
+    default, since it only checks whether to stop between chunks.
+    """
+
+    __slots__ = {
+        "workers": "Number of worker processes to mine with, mining serially if 1 or less",
+        "chunk_size": "Number of candidate proofs handed to a worker at once",
+        "stoppable_chunk_size": "Number of candidate proofs handed at once to a stoppable search",
+        "_executor": "Lazily created pool of worker processes",
+    }
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        chunk_size: int = 20_000,
+        stoppable_chunk_size: Optional[int] = None,
+    ):
+        self.workers: int = workers if workers is not None else (os.cpu_count() or 1)
+        self.chunk_size: int = chunk_size
+        self.stoppable_chunk_size: int = (
+            stoppable_chunk_size
+            if stoppable_chunk_size is not None
+            else min(chunk_size, _BATCH_SIZE)
+        )
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def mine(
+        self,
+        last_proof: int = None,
+        difficulty: int = DEFAULT_DIFFICULTY,
+        should_stop: Optional[Callable[[int], bool]] = None,
+    ) -> Optional[int]:
+        """
+        Finds the smallest proof p' such that hash(pp') has `difficulty` leading zero bits, where p
+        is the previous proof. Falls back to the serial search if a single worker is configured or
+        if the pool of processes is not usable.
+
+        Args:
+            last_proof (int): the previous proof in the chain.
+            difficulty (int): the number of leading zero bits required.
+            should_stop (Optional[Callable[[int], bool]]): called with the number of candidates
+                handed out so far before each chunk of `stoppable_chunk_size` candidates is
+                searched. The search is abandoned as soon as it returns True. Without it, the
+                search goes on until a proof is found.
+
+        Returns:
+            The new proof, an integer, or None if the search was stopped.
+        """
+        if self.workers > 1:
+            try:
+                return self._mine_parallel(last_proof, difficulty, should_stop)
+            except (OSError, NotImplementedError, BrokenProcessPool) as pool_error:
+                logger.warning("Parallel mining failed ({!r}), mining serially", pool_error)
+                self.close()
+        if should_stop is None:
+            return search_range(last_proof, 0, difficulty=difficulty)
+        for arguments in self._chunks(last_proof, difficulty, should_stop):
+            proof: Optional[int] = search_range(*arguments)
+            if proof is not None:
+                return proof
+        return None
+
+    def close(self) -> None:
+        """
+        Shuts down the pool of worker processes, if any. It is created again on the next mine.
+
+        Returns:
+            Nothing.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _mine_parallel(
+        self, last_proof: int, difficulty: int, should_stop: Optional[Callable[[int], bool]]
+    ) -> Optional[int]:
+        if self._executor is None:
+            logger.debug("Starting a pool of {} mining processes", self.workers)
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        hit = first_in_order(
+            self._executor,
+            search_range,
+            self._chunks(last_proof, difficulty, should_stop),
+            window=2 * self.workers,
+        )
+        return hit[1] if hit is not None else None
+
+    def _chunks(
+        self, last_proof: int, difficulty: int, should_stop: Optional[Callable[[int], bool]]
+    ) -> Iterator[Tuple[int, int, int, int]]:
+        chunk_size: int = self.chunk_size if should_stop is None else self.stoppable_chunk_size
+        for start in itertools.count(0, chunk_size):
+            if should_stop is not None and should_stop(start):
+                logger.debug("Stopped mining after handing out {} candidates", start)
+                return
+            yield last_proof, start, start + chunk_size, difficulty
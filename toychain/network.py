@@ -0,0 +1,246 @@
+"""
+Client to query other nodes of the network, with pooled connections.
+"""
+
+import asyncio
+import json
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+import requests
+
+from loguru import logger
+from requests.adapters import HTTPAdapter
+
+from toychain import wire
+
+DEFAULT_PEER_TIMEOUT: float = 5.0  # seconds
+NDJSON_MEDIA_TYPE: str = "application/x-ndjson"
+
+
+class PeerClient:
+    """
+    HTTP client shared by all queries to other nodes. Connections are kept alive and pooled in a
+    single session, and blocking requests are run on a thread pool so they can be awaited
+    concurrently.
+    """
+
+    __slots__ = {
+        "timeout": "Deadline in seconds for a single query to a node",
+        "session": "requests.Session pooling the connections to other nodes",
+        "executor": "ThreadPoolExecutor running the blocking requests",
+        "prefer_packed": "Whether to ask nodes for the binary wire format rather than JSON",
+    }
+
+    def __init__(
+        self,
+        timeout: float = DEFAULT_PEER_TIMEOUT,
+        max_connections: int = 32,
+        prefer_packed: bool = True,
+    ):
+        self.timeout: float = timeout
+        self.prefer_packed: bool = prefer_packed
+        self.session: requests.Session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=max_connections, thread_name_prefix="peer-client"
+        )
+
+    def get_json(self, node: str, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        Queries a node and decodes its JSON response.
+
+        Args:
+            node (str): netloc of the node to query.
+            path (str): the endpoint to query, starting with a slash.
+            params (Optional[Dict[str, Any]]): query parameters to send along.
+
+        Returns:
+            The decoded response.
+
+        Raises:
+            requests.RequestException: if the query fails, times out or gets an error status.
+            ValueError: if the response is not valid JSON.
+        """
+        logger.debug("Querying node '{}' at '{}'", node, path)
+        response = self.session.get(f"http://{node}{path}", params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def post_json(self, node: str, path: str, content: Any) -> Any:
+        """
+        Sends JSON content to a node and decodes its JSON response.
+
+        Args:
+            node (str): netloc of the node to send to.
+            path (str): the endpoint to send to, starting with a slash.
+            content (Any): the content to encode as the request's body.
+
+        Returns:
+            The decoded response.
+
+        Raises:
+            requests.RequestException: if the query fails, times out or gets an error status.
+            ValueError: if the response is not valid JSON.
+        """
+        logger.debug("Posting to node '{}' at '{}'", node, path)
+        response = self.session.post(f"http://{node}{path}", json=content, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    async def fetch_json(
+        self, node: str, path: str, params: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        """
+        Awaitable version of `get_json`, which also enforces the client's deadline on the whole
+        query rather than on each socket operation.
+
+        Raises:
+            asyncio.TimeoutError: if the node did not answer within the client's deadline.
+            requests.RequestException: if the query fails or gets an error status.
+            ValueError: if the response is not valid JSON.
+        """
+        loop = asyncio.get_event_loop()
+        query = loop.run_in_executor(self.executor, self.get_json, node, path, params)
+        return await asyncio.wait_for(query, timeout=self.timeout)
+
+    def get_negotiated(
+        self, node: str, path: str, params: Optional[Dict[str, Any]] = None
+    ) -> Union[memoryview, Any]:
+        """
+        Queries a node, asking for the binary wire format if the client prefers it, and accepting
+        JSON or newline-delimited JSON from nodes that do not support it.
+
+        Args:
+            node (str): netloc of the node to query.
+            path (str): the endpoint to query, starting with a slash.
+            params (Optional[Dict[str, Any]]): query parameters to send along.
+
+        Returns:
+            A memoryview over the response if it is in the binary wire format, see `toychain.wire`.
+            Otherwise the decoded JSON response, or the list of its decoded lines for NDJSON.
+
+        Raises:
+            requests.RequestException: if the query fails, times out or gets an error status.
+            ValueError: if the response is not valid JSON.
+        """
+        with self._get_negotiated(node, path, params) as response:
+            response.raise_for_status()
+            content_type: str = response.headers.get("content-type", "")
+            if content_type.startswith(wire.MEDIA_TYPE):
+                return memoryview(response.content)
+            if content_type.startswith(NDJSON_MEDIA_TYPE):
+                return [json.loads(line) for line in response.iter_lines() if line]
+            return response.json()
+
+    def iter_negotiated(
+        self, node: str, path: str, params: Optional[Dict[str, Any]] = None
+    ) -> Iterator[Union[bytes, Any]]:
+        """
+        Queries a node for a stream of records, such as streamed blocks, negotiating the format
+        like `get_negotiated`, and gives each record as it arrives without holding the full
+        response in memory.
+
+        Args:
+            node (str): netloc of the node to query.
+            path (str): the endpoint to query, starting with a slash.
+            params (Optional[Dict[str, Any]]): query parameters to send along.
+
+        Yields:
+            Each record of a response in the binary wire format, or each decoded line of an
+            NDJSON response.
+
+        Raises:
+            requests.RequestException: if the query fails, times out or gets an error status.
+            ValueError: if the response is malformed, or is neither in the binary wire format nor
+                NDJSON.
+        """
+        with self._get_negotiated(node, path, params) as response:
+            response.raise_for_status()
+            content_type: str = response.headers.get("content-type", "")
+            if content_type.startswith(wire.MEDIA_TYPE):
+                response.raw.decode_content = True
+                yield from wire.iter_message(response.raw)
+            elif content_type.startswith(NDJSON_MEDIA_TYPE):
+                for line in response.iter_lines():
+                    if line:
+                        yield json.loads(line)
+            else:
+                raise ValueError(f"Expected a stream of records, got '{content_type}'")
+
+    async def fetch_streamed(
+        self,
+        node: str,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        parse: Callable[[Union[bytes, Any]], Any] = lambda record: record,
+    ) -> List[Any]:
+        """
+        Awaitable version of `iter_negotiated`, applying `parse` to each record as it arrives, on
+        the client's threads. The client's deadline applies to receiving each part of the
+        response, not to the whole stream.
+
+        Raises:
+            requests.RequestException: if the query fails, times out or gets an error status.
+            ValueError: if the response is malformed.
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self.executor,
+            lambda: [parse(record) for record in self.iter_negotiated(node, path, params)],
+        )
+
+    async def fetch_negotiated(
+        self,
+        node: str,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        parse: Callable[[Union[memoryview, Any]], Any] = lambda content: content,
+        whole_deadline: bool = True,
+    ) -> Any:
+        """
+        Awaitable version of `get_negotiated`, applying `parse` to the response on the client's
+        threads. The client's deadline applies to the whole query if `whole_deadline` is True, and
+        otherwise to receiving each part of the response, for long transfers.
+
+        Raises:
+            asyncio.TimeoutError: if the node did not answer within the client's deadline.
+            requests.RequestException: if the query fails or gets an error status.
+            ValueError: if the response is not valid JSON.
+        """
+        loop = asyncio.get_event_loop()
+        query = loop.run_in_executor(
+            self.executor, lambda: parse(self.get_negotiated(node, path, params))
+        )
+        if not whole_deadline:
+            return await query
+        return await asyncio.wait_for(query, timeout=self.timeout)
+
+    def _get_negotiated(
+        self, node: str, path: str, params: Optional[Dict[str, Any]]
+    ) -> requests.Response:
+        """Sends a streamed query, with the `Accept` header matching the client's preference."""
+        accept: str = f"application/json, {NDJSON_MEDIA_TYPE}"
+        if self.prefer_packed:
+            accept = f"{wire.MEDIA_TYPE}, application/json;q=0.5, {NDJSON_MEDIA_TYPE};q=0.5"
+        logger.debug("Querying node '{}' at '{}'", node, path)
+        return self.session.get(
+            f"http://{node}{path}",
+            params=params,
+            timeout=self.timeout,
+            stream=True,
+            headers={"Accept": accept},
+        )
+
+    def close(self) -> None:
+        """
+        Closes the pooled connections and stops the threads running requests.
+
+        Returns:
+            Nothing.
+        """
+        self.session.close()
+        self.executor.shutdown(wait=False)
@@ -3,34 +3,136 @@ Node runner for Blockchain, to interact with using HTTP requests.
 """
 
 import argparse
+import asyncio
 
-from typing import List
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
 from uuid import uuid4
 
 import uvicorn
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
 from loguru import logger
-from pydantic import BaseModel
+from pydantic import BaseModel, conlist
+
+from toychain import wire, workers
+from toychain.blockchain import (
+    DEFAULT_CONSENSUS_PEERS,
+    DEFAULT_CONSENSUS_TIMEOUT,
+    Block,
+    BlockChain,
+    BlockHeader,
+    Transaction,
+)
+from toychain.checkpoint import DEFAULT_CHECKPOINT_INTERVAL, Checkpoint
+from toychain.gossip import DEFAULT_FANOUT, Gossip
+from toychain.logs import DEFAULT_LOG_LEVEL, LEVELS, configure_logging, uvicorn_level
+from toychain.mempool import DEFAULT_BLOCK_SIZE, DEFAULT_MEMPOOL_CAPACITY, Mempool
+from toychain.metrics import MEDIA_TYPE as METRICS_MEDIA_TYPE
+from toychain.metrics import METRICS
+from toychain.mining import DEFAULT_DIFFICULTY, ParallelMiner
+from toychain.network import DEFAULT_PEER_TIMEOUT
+from toychain.peers import Peer
+from toychain.responses import blocks_response, etag_matches, ndjson_lines
+from toychain.scheduler import MiningJob, MiningScheduler
+from toychain.storage import FileStore
+from toychain.validation import ChainValidator
+
+MAX_BATCH_SIZE: int = 10_000  # transactions per request to /transactions/batch
+MAX_ANNOUNCED: int = 10_000  # block or transaction hashes per request to /gossip
+
+_REQUEST_SECONDS = METRICS.histogram(
+    "toychain_http_request_seconds",
+    "Time spent serving requests, by method, endpoint and status code",
+    labels=("method", "endpoint", "status"),
+)
+_CHAIN_LENGTH = METRICS.gauge("toychain_chain_length", "Number of blocks in the node's chain")
+_MEMPOOL_SIZE = METRICS.gauge(
+    "toychain_mempool_transactions", "Number of transactions waiting in the node's mempool"
+)
+
+
+class RequestMetrics:
+    """
+    ASGI middleware timing each request by method, endpoint function and status code. It only
+    checks that metrics are disabled before handing requests over otherwise.
+    """
+
+    __slots__ = {"app": "The wrapped ASGI application"}
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not METRICS.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        status: List[int] = [500]  # if the application fails before starting a response
+
+        async def send_and_record_status(message) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        started: float = perf_counter()
+        try:
+            await self.app(scope, receive, send_and_record_status)
+        finally:
+            endpoint = scope.get("endpoint")  # set by the router once a route matched
+            labels = (scope["method"], getattr(endpoint, "__name__", "unmatched"), str(status[0]))
+            _REQUEST_SECONDS.observe(perf_counter() - started, labels)
 
-from toychain.blockchain import Block, BlockChain, Transaction
 
 logger.info("Instantiating node")
 node = FastAPI()
+node.add_middleware(RequestMetrics)
 
 logger.info("Generating globally unique address for this node")
 NODE_IDENTIFIER = str(uuid4()).replace("-", "")
-logger.info(f"This is node ID {NODE_IDENTIFIER}")
+logger.info("This is node ID {}", NODE_IDENTIFIER)
 
 logger.info("Instantiating Blockchain for this node")
-blockchain = BlockChain()
+blockchain = BlockChain(check_balances=True)
 logger.success("Blockchain up and running!")
+gossip = Gossip(blockchain)
+scheduler = MiningScheduler(
+    blockchain, reward_address=NODE_IDENTIFIER, on_mined=gossip.announce_block
+)
 
 
 class ActiveNode(BaseModel):
     nodes: List[str]
 
 
+class PostedTransaction(BaseModel):
+    sender: str
+    recipient: str
+    amount: float
+
+
+class PostedTransactionBatch(BaseModel):
+    transactions: conlist(PostedTransaction, max_items=MAX_BATCH_SIZE)
+
+
+class AnnouncedBlock(BaseModel):
+    hash: str
+    index: int
+
+
+class Announcement(BaseModel):
+    sender: str
+    blocks: conlist(AnnouncedBlock, max_items=MAX_ANNOUNCED) = []
+    transactions: conlist(str, max_items=MAX_ANNOUNCED) = []
+
+
+class RequestedTransactions(BaseModel):
+    hashes: conlist(str, max_items=MAX_ANNOUNCED)
+
+
 @node.get("/")
 def root():
     """
@@ -49,59 +151,155 @@ def root():
 @node.get("/mine")
 def mine_block():
     """
-    Mining endpoint. GETing `/mine` triggers the following actions:\n
-        - Calculating the Proof of Work.\n
-        - Rewarding the miner (this node) by adding a transaction granting 1 coin.\n
-        - Forging the new Block by adding it to the chain.\n
+    Mining endpoint. GETing `/mine` queues a mining job and returns its id at once. The job runs
+    in the background and:\n
+        - Calculates the Proof of Work.\n
+        - Rewards the miner (this node) with a transaction granting 1 coin.\n
+        - Forges the new Block with the oldest transactions of the mempool, and adds it to the
+        chain.\n
+    A request made while a job is queued or running is merged into that job. The job is cancelled
+    if the chain's tip changes before it is done, for instance when consensus replaces the chain.
 
     Returns:
         A JSON response.
     """
     logger.info("Received GET request to add a block")
+    job, merged = scheduler.submit()
+    return {
+        "message": "Merged into the running mining job" if merged else "Mining job queued",
+        **job.dict(),
+    }
 
-    logger.debug("Mining proof for a new block")
-    last_block: Block = blockchain.last_block
-    last_proof: int = last_block.proof
-    mined_proof: int = blockchain.proof_of_work(last_proof)
 
-    # We must receive a reward for finding the proof.
-    # The sender is "0" to signify that this node has mined a new coin.
-    logger.debug("Adding block reward transaction for mining this block")
-    blockchain.add_transaction(
-        sender="0", recipient=NODE_IDENTIFIER, amount=1,
-    )
+@node.get("/mine/status")
+def mining_status():
+    """
+    GETing `/mine/status` returns the active mining job, if any, and the number of recent jobs in
+    each state.
 
-    logger.debug("Forging new block and adding it to the chain")
-    previous_hash: str = blockchain.hash(last_block)
-    block: Block = blockchain.add_block(previous_hash=previous_hash, proof=mined_proof)
+    Returns:
+        A JSON response.
+    """
+    logger.info("Received GET request for the mining status")
+    return scheduler.status()
 
-    return {
-        "message": "New Block Forged",
-        "index": block.index,
-        "transactions": block.transactions,
-        "proof": block.proof,
-        "previous_hash": block.previous_hash,
-    }
+
+@node.get("/mine/{job_id}")
+def mining_job(job_id: str):
+    """
+    GETing `/mine/{job_id}` returns the state and progress of a mining job: the index of the block
+    it mines on, the number of candidate proofs handed out so far, its running time, and the index
+    of the mined block once done.
+
+    Returns:
+        A JSON response.
+    """
+    logger.info("Received GET request for mining job {}", job_id)
+    job: Optional[MiningJob] = scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No mining job with id {job_id}")
+    return job.dict()
 
 
 @node.post("/transactions/new")
-def new_transaction(posted_transaction: Transaction):
+def new_transaction(posted_transaction: PostedTransaction):
     """
-    Receives transaction data from a POST request and add it to the node's blockchain.
+    Receives transaction data from a POST request and add it to the node's blockchain. The
+    transaction is rejected with a 400 response if its amount is not positive or if its sender's
+    balance, minus what its waiting transactions spend, does not cover it.
+
+    Transactions carry no nonce, and are identified by their sender, recipient and amount only: a
+    transaction identical to one still waiting in the mempool is the same transaction sent again,
+    and is not added twice. The response then says so with `added` being false. Two identical
+    payments are made by sending the second once the first one is mined, or by making them differ.
 
     Returns:
         A JSON response.
     """
     logger.info("Received POST request for new transaction")
-    transaction_block_index: int = blockchain.add_transaction(
-        sender=posted_transaction.sender,
-        recipient=posted_transaction.recipient,
-        amount=posted_transaction.amount,
-    )
+    transaction = Transaction(**posted_transaction.dict())
+    try:
+        added: int = blockchain.add_transactions([transaction])
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error)) from error
+    if not added:
+        return {
+            "message": "The same transaction is already waiting in the mempool, it was not added "
+            "again",
+            "added": False,
+        }
+    gossip.announce_transactions([transaction])
 
     return {
         "message": "Transaction added to the list of current transactions and will be mined into "
-        f"the block at index {transaction_block_index}"
+        f"the block at index {blockchain.last_block.index}",
+        "added": True,
+    }
+
+
+@node.post("/transactions/batch")
+def new_transactions_batch(posted_batch: PostedTransactionBatch):
+    """
+    Receives many transactions from a single POST request and adds them to the node's mempool.
+    Transactions already waiting in the mempool are dropped and counted as `duplicates`, see
+    `new_transaction` for what makes two transactions the same. The whole batch is rejected with a
+    400 response if one of its transactions is invalid, see `new_transaction`.
+
+    Returns:
+        A JSON response.
+    """
+    logger.info("Received POST request for {} new transactions", len(posted_batch.transactions))
+    transactions: List[Transaction] = [
+        Transaction(
+            sender=posted_transaction.sender,
+            recipient=posted_transaction.recipient,
+            amount=posted_transaction.amount,
+        )
+        for posted_transaction in posted_batch.transactions
+    ]
+    try:
+        added: int = blockchain.add_transactions(transactions)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error)) from error
+    gossip.announce_transactions(transactions)
+
+    return {
+        "message": f"{added} transaction(s) added to the mempool",
+        "added": added,
+        "duplicates": len(posted_batch.transactions) - added,
+        "pending": len(blockchain.mempool),
+    }
+
+
+@node.get("/balances/{address}")
+def address_balance(address: str):
+    """
+    GETing `/balances/{address}` returns the balance of an address over the node's chain: the
+    amounts it received minus the amounts it sent. Pending transactions are not accounted for.
+
+    Returns:
+        A JSON response.
+    """
+    logger.info("Received GET request for the balance of address '{}'", address)
+    return {"address": address, "balance": blockchain.balance(address)}
+
+
+@node.get("/transactions/{address}")
+def address_transactions(address: str):
+    """
+    GETing `/transactions/{address}` returns the transactions of the node's chain sent or received
+    by an address, in chain order, with the index of their block and their position in it.
+
+    Returns:
+        A JSON response.
+    """
+    logger.info("Received GET request for the transactions of address '{}'", address)
+    return {
+        "address": address,
+        "transactions": [
+            {"block": block_index, "position": position, **transaction.dict()}
+            for (block_index, position), transaction in blockchain.transactions_of(address)
+        ],
     }
 
 
@@ -116,7 +314,7 @@ def register_nodes(posted_transaction: ActiveNode):
     logger.info("Received POST request for new nodes registration")
 
     for new_node in posted_transaction.nodes:
-        logger.debug(f"Attempting registration of new node `{new_node}` to the network")
+        logger.debug("Attempting registration of new node `{}` to the network", new_node)
         blockchain.register_node(address=new_node)
 
     return {
@@ -125,8 +323,71 @@ def register_nodes(posted_transaction: ActiveNode):
     }
 
 
+@node.post("/gossip")
+def receive_announcement(announcement: Announcement):
+    """
+    Receives another node's announcement of new blocks and transactions, by hash. This node
+    fetches those it has not seen yet from the announcing node in the background, adds them, and
+    announces them to some of its own peers in turn. Announcements from a `sender` that is not
+    a registered node are ignored.\n
+        - `sender`: netloc of the announcing node, as reachable from this node.\n
+        - `blocks`: the hash and index of each announced block.\n
+        - `transactions`: the hash of each announced transaction.
+
+    Returns:
+        A JSON response.
+    """
+    logger.debug("Received an announcement from node '{}'", announcement.sender)
+    fetching = gossip.receive(
+        announcement.sender,
+        blocks=[block.dict() for block in announcement.blocks],
+        transactions=announcement.transactions,
+    )
+    return {"fetching": fetching}
+
+
+@node.post("/gossip/transactions")
+def announced_transactions(requested: RequestedTransactions):
+    """
+    Receives the hashes of transactions this node announced from a POST request, and sends back
+    those still waiting in its mempool. Unknown or malformed hashes are skipped.
+
+    Returns:
+        A JSON response.
+    """
+    logger.debug("Received POST request for {} announced transaction(s)", len(requested.hashes))
+    found: List[Transaction] = []
+    for transaction_hash in requested.hashes:
+        try:
+            packed_hash: bytes = wire.pack_digest(transaction_hash)
+        except ValueError:
+            continue
+        transaction: Optional[Transaction] = blockchain.mempool.get(packed_hash)
+        if transaction is not None:
+            found.append(transaction)
+    return {"transactions": [transaction.dict() for transaction in found]}
+
+
+@node.get("/metrics")
+def metrics():
+    """
+    GETing `/metrics` returns the node's metrics in the Prometheus text format: timings of
+    mining, chain validation, consensus, queries to other nodes and requests to each endpoint,
+    along with counters of hashes and validated blocks. Metrics are only recorded when the node
+    runs with `--metrics`.
+
+    Returns:
+        A text response.
+    """
+    if not METRICS.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled, see --metrics")
+    _CHAIN_LENGTH.set(len(blockchain.chain))
+    _MEMPOOL_SIZE.set(len(blockchain.mempool))
+    return Response(content=METRICS.render(), media_type=METRICS_MEDIA_TYPE)
+
+
 @node.get("/nodes/resolve")
-def consensus():
+async def consensus():
     """
     Run consensus algorithm to resolve conflicts, sends back status (local node's chain changed,
     or not).
@@ -135,32 +396,202 @@ def consensus():
         A JSON response.
     """
     logger.info("Received a GET request to resolve conflicts")
-    is_replaced = blockchain.resolve_conflicts()
+    is_replaced = await blockchain.resolve_conflicts_async()
 
+    encoded_chain, _, _ = blockchain.encoded_blocks()
     if is_replaced:
-        response = {"message": "Our chain was replaced", "new_chain": blockchain.chain}
+        content = b'{"message":"Our chain was replaced","new_chain":' + encoded_chain + b"}"
     else:
-        response = {"message": "Our chain is authoritative", "chain": blockchain.chain}
-    return response
+        content = b'{"message":"Our chain is authoritative","chain":' + encoded_chain + b"}"
+    return Response(content=content, media_type="application/json")
+
+
+@node.get("/nodes")
+def registered_nodes():
+    """
+    GETing `/nodes` returns the nodes registered on the network, with what this node knows of
+    each: its average response time, its number of consecutive failures, when it last answered,
+    the length and tip of its chain when last heard of, and for how many more seconds it is
+    skipped after failing. Nodes are listed in the order consensus queries them.
+
+    Returns:
+        A JSON response.
+    """
+    logger.info("Received GET request for the registered nodes")
+    peers: List[Peer] = blockchain.peers.peers()
+    return {"nodes": [peer.dict() for peer in peers], "total_nodes": len(peers)}
+
+
+@node.get("/nodes/{address}")
+def registered_node(address: str):
+    """
+    GETing `/nodes/{address}` returns what this node knows of a registered node, given by its
+    netloc such as `127.0.0.1:5001`, see `/nodes`.
+
+    Returns:
+        A JSON response.
+    """
+    logger.info("Received GET request for registered node '{}'", address)
+    peer: Optional[Peer] = blockchain.peers.get(address)
+    if peer is None:
+        raise HTTPException(status_code=404, detail=f"No registered node at '{address}'")
+    return peer.dict()
 
 
 @node.get("/chain")
-def full_chain():
+def full_chain(
+    start: int = Query(1, ge=1),
+    limit: Optional[int] = Query(None, ge=0),
+    stream: bool = False,
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    GETing `/chain` will returns the full blockchain, or a page of it.\n
+        - `start`: index of the first block, 1 being the genesis block.\n
+        - `limit`: maximum number of blocks to return, all blocks until the tip if omitted.\n
+        - `stream`: if true, blocks are sent one by one as newline-delimited JSON.\n
+    A `start` below 1 or a negative `limit` gets a `422 Unprocessable Entity` response.
+    The response carries an `ETag` header identifying the chain's tip. A request sending it back
+    in an `If-None-Match` header gets an empty `304 Not Modified` response while the tip is the
+    same. A request preferring `application/x-toychain` in its `Accept` header gets the blocks in
+    the binary wire format of `toychain.wire` instead of JSON, streaming or not.
+
+    Returns:
+        The requested blocks and the length of the node's full blockchain, as a JSON response. In
+        streaming mode, only the blocks as an NDJSON response.
+    """
+    logger.info("Received GET request for the chain from index {}", start)
+    packed: bool = accept is not None and wire.accepts_packed(accept)
+    if stream and not packed:
+        return StreamingResponse(
+            ndjson_lines(block.canonical_bytes() for block in blockchain.iter_blocks(start, limit)),
+            media_type="application/x-ndjson",
+        )
+    return blocks_response(blockchain, "chain", start, limit, packed, if_none_match)
+
+
+@node.get("/headers")
+def chain_headers(
+    start: int = Query(1, ge=1),
+    limit: Optional[int] = Query(None, ge=0),
+    accept: Optional[str] = Header(None),
+):
+    """
+    GETing `/headers` returns the headers of a range of blocks: everything but their transactions,
+    plus their hash and a commitment to their transactions. Other nodes use it to compare chains
+    before downloading any block.\n
+        - `start`: index of the first block, 1 being the genesis block.\n
+        - `limit`: maximum number of headers to return, all headers until the tip if omitted.\n
+    Like `/chain`, it uses the binary wire format for requests preferring it.
+
+    Returns:
+        The headers and the length of the node's full blockchain, as a JSON response.
+    """
+    logger.info("Received GET request for headers from index {}", start)
+    headers: List[BlockHeader] = [block.header() for block in blockchain.blocks_range(start, limit)]
+    length: int = len(blockchain.chain)
+    if accept is not None and wire.accepts_packed(accept):
+        content: bytes = wire.pack_message((header.packed_bytes() for header in headers), length)
+        return Response(content=content, media_type=wire.MEDIA_TYPE, headers={"Vary": "Accept"})
+    return {"headers": [header.dict() for header in headers], "length": length}
+
+
+@node.get("/blocks")
+def chain_blocks(
+    start: int = Query(1, ge=1),
+    limit: Optional[int] = Query(None, ge=0),
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    GETing `/blocks` returns a range of full blocks.\n
+        - `start`: index of the first block, 1 being the genesis block.\n
+        - `limit`: maximum number of blocks to return, all blocks until the tip if omitted.\n
+    Like `/chain`, it supports `ETag` and `If-None-Match` headers, and the binary wire format.
+
+    Returns:
+        The blocks and the length of the node's full blockchain, as a JSON response.
+    """
+    logger.info("Received GET request for blocks from index {}", start)
+    packed: bool = accept is not None and wire.accepts_packed(accept)
+    return blocks_response(blockchain, "blocks", start, limit, packed, if_none_match)
+
+
+@node.get("/blocks/{index}/proof/{position}")
+def transaction_proof(index: int, position: int):
     """
-    GETing `/chain` will returns the full blockchain.
+    GETing `/blocks/{index}/proof/{position}` returns the proof that the transaction at `position`
+    in the block at `index` is part of that block: the hashes needed to go from the transaction to
+    the block's Merkle root, in a number of steps logarithmic in the number of transactions. It can
+    be checked with `toychain.blockchain.verify_transaction_proof`, knowing only the block's header.
 
     Returns:
-        The node's full blockchain list, as a JSON response.
+        The transaction, the block's Merkle root and hash, and the proof, as a JSON response.
     """
-    logger.info("Received GET request for the full chain")
+    logger.info("Received GET request for a proof of transaction {} in block {}", position, index)
+    found: Tuple[Block, ...] = blockchain.snapshot(index, 1) if index >= 1 else ()
+    if not found:
+        raise HTTPException(status_code=404, detail=f"No block at index {index}")
+    block: Block = found[0]
+    if not 0 <= position < len(block.transactions):
+        raise HTTPException(status_code=404, detail=f"No transaction {position} in block {index}")
+
     return {
-        "chain": blockchain.chain,
-        "length": len(blockchain.chain),
+        "block": index,
+        "position": position,
+        "transaction": block.transactions[position].dict(),
+        "merkle_root": block.merkle_root,
+        "block_hash": block.digest,
+        "proof": block.transaction_proof(position),
     }
 
 
+@node.get("/snapshot")
+def chain_snapshot(if_none_match: Optional[str] = Header(None)):
+    """
+    GETing `/snapshot` returns the node's latest checkpoint file: its chain up to a height and the
+    balances and transactions by address at that height, see `toychain.checkpoint`. A new node
+    trusting the checkpoint's digest can load it and only validate the blocks added afterwards.
+    The response carries the digest as its `ETag` header, and the checkpoint's height in an
+    `X-Checkpoint-Height` header.
+
+    Returns:
+        The checkpoint file, in the binary format of `toychain.checkpoint`.
+    """
+    logger.info("Received GET request for the chain's checkpoint")
+    summary: Optional[Checkpoint] = blockchain.checkpoint
+    if summary is not None and if_none_match is not None:
+        if etag_matches(if_none_match, f'"{summary.digest}"'):
+            return Response(status_code=304, headers={"ETag": f'"{summary.digest}"'})
+    latest: Optional[Tuple[Checkpoint, bytes]] = blockchain.open_checkpoint()
+    if latest is None:
+        raise HTTPException(status_code=404, detail="The chain has no checkpoint yet")
+    summary, content = latest
+    headers: Dict[str, str] = {
+        "ETag": f'"{summary.digest}"',
+        "X-Checkpoint-Height": str(summary.height),
+    }
+    return Response(content=content, media_type=wire.MEDIA_TYPE, headers=headers)
+
+
+@node.get("/snapshot/info")
+def chain_snapshot_info():
+    """
+    GETing `/snapshot/info` returns the height, tip hash and digest of the node's latest
+    checkpoint, the digest being what other nodes trust it by.
+
+    Returns:
+        A JSON response.
+    """
+    summary: Optional[Checkpoint] = blockchain.checkpoint
+    if summary is None:
+        raise HTTPException(status_code=404, detail="The chain has no checkpoint yet")
+    return summary.dict()
+
+
 def _parse_arguments():
-    """Simply parse the port on which to run."""
+    """Simply parse the port and host on which to run, and the node's settings."""
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "-p",
@@ -177,14 +608,187 @@ def _parse_arguments():
         type=str,
         help="The host on which to run the node. Defaults to '127.0.0.1', known as 'localhost'.",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--mining-workers",
+        dest="mining_workers",
+        default=1,
+        type=int,
+        help="The number of processes to run the proof of work on. Defaults to 1 (serial mining).",
+    )
+    parser.add_argument(
+        "--difficulty",
+        dest="difficulty",
+        default=DEFAULT_DIFFICULTY,
+        type=int,
+        help="The number of leading zero bits required from block proofs. Defaults to 16.",
+    )
+    parser.add_argument(
+        "--validation-workers",
+        dest="validation_workers",
+        default=1,
+        type=int,
+        help="The number of processes to validate long chains on. Defaults to 1 (serial checks).",
+    )
+    parser.add_argument(
+        "--peer-timeout",
+        dest="peer_timeout",
+        default=DEFAULT_PEER_TIMEOUT,
+        type=float,
+        help="The deadline in seconds for a single query to another node. Defaults to 5.",
+    )
+    parser.add_argument(
+        "--consensus-timeout",
+        dest="consensus_timeout",
+        default=DEFAULT_CONSENSUS_TIMEOUT,
+        type=float,
+        help="The deadline in seconds to receive other nodes' chains in consensus. Defaults to 10.",
+    )
+    parser.add_argument(
+        "--consensus-peers",
+        dest="consensus_peers",
+        default=DEFAULT_CONSENSUS_PEERS,
+        type=int,
+        help="The number of nodes queried for their chain in consensus, picking those with the "
+        "longest chains first. Defaults to 8.",
+    )
+    parser.add_argument(
+        "--mempool-capacity",
+        dest="mempool_capacity",
+        default=DEFAULT_MEMPOOL_CAPACITY,
+        type=int,
+        help="The maximum number of transactions waiting to be mined. Defaults to 100000.",
+    )
+    parser.add_argument(
+        "--block-size",
+        dest="block_size",
+        default=DEFAULT_BLOCK_SIZE,
+        type=int,
+        help="The maximum number of transactions recorded in a block. Defaults to 5000.",
+    )
+    parser.add_argument(
+        "--data-dir",
+        dest="data_dir",
+        default=None,
+        type=str,
+        help="The directory in which to persist the chain. Defaults to keeping it in memory only.",
+    )
+    parser.add_argument(
+        "--gossip-address",
+        dest="gossip_address",
+        default=None,
+        type=str,
+        help="The netloc other nodes reach this node at, sent in announcements of new blocks and "
+        "transactions. Defaults to 'host:port'.",
+    )
+    parser.add_argument(
+        "--gossip-fanout",
+        dest="gossip_fanout",
+        default=DEFAULT_FANOUT,
+        type=int,
+        help="The number of peers each new block or transaction is announced to. Defaults to 8.",
+    )
+    parser.add_argument(
+        "--checkpoint-interval",
+        dest="checkpoint_interval",
+        default=DEFAULT_CHECKPOINT_INTERVAL,
+        type=int,
+        help="The number of blocks between two checkpoints of the chain, served at '/snapshot'. "
+        "Defaults to 1000, 0 to not write checkpoints.",
+    )
+    parser.add_argument(
+        "--bootstrap-node",
+        dest="bootstrap_node",
+        default=None,
+        type=str,
+        help="The address of a node to load a checkpoint from at startup, such as "
+        "'http://127.0.0.1:5001'. Requires --trusted-checkpoint.",
+    )
+    parser.add_argument(
+        "--trusted-checkpoint",
+        dest="trusted_checkpoint",
+        default=None,
+        type=str,
+        help="The digest of the checkpoint to trust when bootstrapping, as given by the "
+        "'/snapshot/info' endpoint of a trusted node.",
+    )
+    parser.add_argument(
+        "--metrics",
+        dest="metrics",
+        action="store_true",
+        help="Record timings and counters of mining, validation, consensus and requests, served "
+        "at '/metrics'. Disabled by default.",
+    )
+    parser.add_argument(
+        "--http-workers",
+        dest="http_workers",
+        default=1,
+        type=int,
+        help="The number of processes serving HTTP requests, reading the chain from a snapshot "
+        "shared in memory and forwarding other requests to the process owning the chain. "
+        "Defaults to 1 (a single process), more are only supported on POSIX systems.",
+    )
+    parser.add_argument(
+        "--log-level",
+        dest="log_level",
+        default=DEFAULT_LOG_LEVEL,
+        type=str.upper,
+        choices=LEVELS,
+        help="The lowest level of the messages to log. Defaults to INFO, leaving out the DEBUG and "
+        "TRACE messages of mining and validation.",
+    )
+    arguments = parser.parse_args()
+    if (arguments.bootstrap_node is None) != (arguments.trusted_checkpoint is None):
+        parser.error("--bootstrap-node and --trusted-checkpoint go together")
+    if arguments.http_workers > 1 and not workers.SUPPORTED:
+        parser.error("--http-workers above 1 needs Unix sockets, only available on POSIX systems")
+    return arguments
 
 
 @logger.catch
 def run_node():
     """Runs the node"""
     commandline_arguments = _parse_arguments()
-    uvicorn.run(node, host=commandline_arguments.host, port=commandline_arguments.port)
+    configure_logging(commandline_arguments.log_level)
+    blockchain.miner = ParallelMiner(workers=commandline_arguments.mining_workers)
+    blockchain.difficulty = commandline_arguments.difficulty
+    blockchain.validator = ChainValidator(workers=commandline_arguments.validation_workers)
+    blockchain.client.timeout = commandline_arguments.peer_timeout
+    blockchain.consensus_timeout = commandline_arguments.consensus_timeout
+    blockchain.consensus_peers = commandline_arguments.consensus_peers
+    blockchain.mempool = Mempool(capacity=commandline_arguments.mempool_capacity)
+    blockchain.block_size = commandline_arguments.block_size
+    blockchain.checkpoint_interval = commandline_arguments.checkpoint_interval
+    METRICS.enabled = commandline_arguments.metrics
+    if commandline_arguments.data_dir is not None:
+        blockchain.use_store(
+            FileStore(commandline_arguments.data_dir),
+            checkpoint_path=Path(commandline_arguments.data_dir) / "checkpoint.bin",
+        )
+    if commandline_arguments.bootstrap_node is not None:
+        blockchain.register_node(commandline_arguments.bootstrap_node)
+        bootstrap_node: str = urlparse(commandline_arguments.bootstrap_node).netloc
+        asyncio.run(blockchain.bootstrap(bootstrap_node, commandline_arguments.trusted_checkpoint))
+    gossip.address = (
+        commandline_arguments.gossip_address
+        or f"{commandline_arguments.host}:{commandline_arguments.port}"
+    )
+    gossip.fanout = commandline_arguments.gossip_fanout
+    if commandline_arguments.http_workers > 1:
+        workers.serve(
+            node,
+            blockchain,
+            host=commandline_arguments.host,
+            port=commandline_arguments.port,
+            workers=commandline_arguments.http_workers,
+            log_level=commandline_arguments.log_level,
+        )
+        return
+    uvicorn.run(
+        node,
+        host=commandline_arguments.host,
+        port=commandline_arguments.port,
+        log_level=uvicorn_level(commandline_arguments.log_level),
+    )
 
 
 if __name__ == "__main__":
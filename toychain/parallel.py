@@ -0,0 +1,63 @@
+"""
+Helpers to spread ordered searches over a pool of worker processes.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from loguru import logger
+
+from toychain.logs import LOGGING
+
+
+def first_in_order(
+    executor: Executor, function: Callable, tasks: Iterable[tuple], window: int
+) -> Optional[Tuple[int, Any]]:
+    """
+    Runs `function` on each set of arguments in `tasks` through the provided executor, and returns
+    the first non-None result in task order, as a serial loop over `tasks` would. At most `window`
+    tasks are in flight at once. As soon as a task yields a result, no further task is submitted
+    and the pending tasks that come after it are cancelled. Tasks that come before it are still
+    awaited, since one of them could hold an earlier result.
+
+    Args:
+        executor (Executor): the executor to submit tasks to.
+        function (Callable): the function to run, should return None when it has no result.
+        tasks (Iterable[tuple]): arguments for each call of `function`, in order. Can be infinite.
+        window (int): maximum number of tasks in flight at once.
+
+    Returns:
+        A tuple of the task's position in `tasks` and its result, or None if no task had a result.
+    """
+    tasks = iter(tasks)
+    pending: Dict[int, Future] = {}
+    submitted: int = 0
+    exhausted: bool = False
+    best: Optional[Tuple[int, Any]] = None
+
+    while True:
+        while best is None and not exhausted and len(pending) < window:
+            try:
+                arguments = next(tasks)
+            except StopIteration:
+                exhausted = True
+                break
+            pending[submitted] = executor.submit(function, *arguments)
+            submitted += 1
+
+        if not pending:
+            return best
+
+        done, _ = wait(list(pending.values()), return_when=FIRST_COMPLETED)
+        for position in sorted(position for position, future in pending.items() if future in done):
+            result = pending.pop(position).result()
+            if result is not None and (best is None or position < best[0]):
+                best = (position, result)
+
+        if best is not None:
+            for position in [position for position in pending if position > best[0]]:
+                pending.pop(position).cancel()
+            if LOGGING.trace:
+                logger.trace(
+                    "Task {} has a result, waiting on {} earlier task(s)", best[0], len(pending)
+                )
@@ -0,0 +1,245 @@
+"""
+Registry of the other nodes of the network, with what is known of each one's health and chain.
+"""
+
+import threading
+
+from time import monotonic, time
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+DEFAULT_BASE_BACKOFF: float = 1.0  # seconds a peer is skipped after its first failure
+DEFAULT_MAX_BACKOFF: float = 300.0  # seconds, however many times a peer failed
+LATENCY_SMOOTHING: float = 0.3  # weight of the latest measure in a peer's average latency
+
+
+class Peer:
+    """What a node knows of another node of the network."""
+
+    __slots__ = {
+        "address": "Netloc of the node",
+        "latency": "Moving average of the node's response time in seconds, None until it answers",
+        "failures": "Number of consecutive failed queries to the node",
+        "last_seen": "Time of the node's last successful answer, or None",
+        "tip_height": "Length of the node's chain when last heard of, or None",
+        "tip_hash": "Hash of the last block of the node's chain when last heard of, or None",
+        "retry_at": "Monotonic time before which the node is not queried, after failures",
+    }
+
+    def __init__(self, address: str):
+        self.address: str = address
+        self.latency: Optional[float] = None
+        self.failures: int = 0
+        self.last_seen: Optional[float] = None
+        self.tip_height: Optional[int] = None
+        self.tip_hash: Optional[str] = None
+        self.retry_at: float = 0.0
+
+    def dict(self) -> Dict[str, Any]:
+        """
+        Gives what is known of the node as a dictionary, to encode it.
+
+        Returns:
+            The node's fields by name, with the time left before it is queried again in seconds
+            instead of the monotonic time at which it will be.
+        """
+        return {
+            "address": self.address,
+            "latency": self.latency,
+            "failures": self.failures,
+            "last_seen": self.last_seen,
+            "tip_height": self.tip_height,
+            "tip_hash": self.tip_hash,
+            "backoff": max(self.retry_at - monotonic(), 0.0),
+        }
+
+
+class PeerRegistry:
+    """
+    The other nodes of the network, with their latency, their failures and their chain's tip as
+    last heard of. A node failing to answer is skipped for a delay doubling with each consecutive
+    failure, from `base_backoff` up to `max_backoff` seconds, and is queried again as usual once
+    it answers. Nodes are ranked by the length of their chain so that the consensus queries the
+    nodes most likely to have a longer chain first.
+    """
+
+    __slots__ = {
+        "base_backoff": "Seconds a node is skipped for after its first consecutive failure",
+        "max_backoff": "Maximum number of seconds a node is skipped for",
+        "_peers": "Dict of the Peer object of each registered node, by netloc",
+        "_lock": "Lock guarding the registered nodes and their records",
+    }
+
+    def __init__(
+        self, base_backoff: float = DEFAULT_BASE_BACKOFF, max_backoff: float = DEFAULT_MAX_BACKOFF
+    ):
+        self.base_backoff: float = base_backoff
+        self.max_backoff: float = max_backoff
+        self._peers: Dict[str, Peer] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def __contains__(self, address: object) -> bool:
+        return address in self._peers
+
+    def __len__(self) -> int:
+        return len(self._peers)
+
+    def add(self, address: str) -> bool:
+        """
+        Registers a node.
+
+        Args:
+            address (str): netloc of the node.
+
+        Returns:
+            True if the node was added, False if it was already registered.
+        """
+        with self._lock:
+            if address in self._peers:
+                return False
+            self._peers[address] = Peer(address)
+            return True
+
+    def get(self, address: str) -> Optional[Peer]:
+        """
+        Looks up a registered node.
+
+        Args:
+            address (str): netloc of the node.
+
+        Returns:
+            The node's Peer object, or None if it is not registered.
+        """
+        return self._peers.get(address)
+
+    def addresses(self) -> FrozenSet[str]:
+        """Gives the netlocs of all registered nodes."""
+        with self._lock:
+            return frozenset(self._peers)
+
+    def peers(self) -> List[Peer]:
+        """Gives the Peer objects of all registered nodes, in ranking order, see `ranked`."""
+        with self._lock:
+            return sorted(self._peers.values(), key=_rank)
+
+    def record_success(
+        self,
+        address: str,
+        latency: Optional[float] = None,
+        tip_height: Optional[int] = None,
+        tip_hash: Optional[str] = None,
+    ) -> None:
+        """
+        Records that a node answered, clearing its failures.
+
+        Args:
+            address (str): netloc of the node.
+            latency (Optional[float]): the node's response time in seconds, if measured.
+            tip_height (Optional[int]): length of the node's chain, if it told it.
+            tip_hash (Optional[str]): hash of the node's last block, if it told it.
+
+        Returns:
+            Nothing, updates in place. Nodes that are not registered are ignored.
+        """
+        with self._lock:
+            peer: Optional[Peer] = self._peers.get(address)
+            if peer is None:
+                return
+            if latency is not None:
+                peer.latency = (
+                    latency
+                    if peer.latency is None
+                    else LATENCY_SMOOTHING * latency + (1 - LATENCY_SMOOTHING) * peer.latency
+                )
+            peer.failures = 0
+            peer.retry_at = 0.0
+            peer.last_seen = time()
+            if tip_height is not None:
+                peer.tip_height, peer.tip_hash = tip_height, tip_hash
+
+    def record_tip(self, address: str, tip_height: int, tip_hash: Optional[str] = None) -> None:
+        """
+        Records the tip of a node's chain heard of indirectly, for instance from its announcement
+        of a new block. Tips lower than the last one known are ignored.
+
+        Args:
+            address (str): netloc of the node.
+            tip_height (int): length of the node's chain.
+            tip_hash (Optional[str]): hash of the node's last block.
+
+        Returns:
+            Nothing, updates in place.
+        """
+        with self._lock:
+            peer: Optional[Peer] = self._peers.get(address)
+            if peer is not None and (peer.tip_height is None or tip_height >= peer.tip_height):
+                peer.tip_height, peer.tip_hash = tip_height, tip_hash
+
+    def record_failure(self, address: str) -> float:
+        """
+        Records that a node did not answer, or answered with something unusable, and backs off
+        from it.
+
+        Args:
+            address (str): netloc of the node.
+
+        Returns:
+            The number of seconds during which the node will be skipped.
+        """
+        with self._lock:
+            peer: Optional[Peer] = self._peers.get(address)
+            if peer is None:
+                return 0.0
+            peer.failures += 1
+            backoff: float = min(self.base_backoff * 2 ** (peer.failures - 1), self.max_backoff)
+            peer.retry_at = monotonic() + backoff
+        logger.debug(
+            "Node '{}' failed {} time(s), skipping it {}s", address, peer.failures, backoff
+        )
+        return backoff
+
+    def available(self, exclude: Iterable[Optional[str]] = ()) -> List[str]:
+        """
+        Gives the nodes that are not backed off from.
+
+        Args:
+            exclude (Iterable[Optional[str]]): netlocs of nodes to leave out.
+
+        Returns:
+            The netlocs of the nodes, in no particular order.
+        """
+        excluded = set(exclude)
+        now: float = monotonic()
+        with self._lock:
+            return [
+                address
+                for address, peer in self._peers.items()
+                if peer.retry_at <= now and address not in excluded
+            ]
+
+    def ranked(self, limit: Optional[int] = None) -> List[str]:
+        """
+        Gives the nodes that are not backed off from, most promising first: nodes whose chain is
+        not known yet, so that they get queried once, then by decreasing length of their chain,
+        fewer failures and lower latency.
+
+        Args:
+            limit (Optional[int]): maximum number of nodes to give, all of them if None.
+
+        Returns:
+            The netlocs of the nodes.
+        """
+        now: float = monotonic()
+        with self._lock:
+            ranked: List[Peer] = sorted(
+                (peer for peer in self._peers.values() if peer.retry_at <= now), key=_rank
+            )
+        return [peer.address for peer in ranked[:limit]]
+
+
+def _rank(peer: Peer) -> Tuple[bool, int, int, float, str]:
+    """Sorting key putting the nodes most likely to have the longest chain first."""
+    unknown: bool = peer.tip_height is None
+    latency: float = peer.latency if peer.latency is not None else float("inf")
+    return (not unknown, -(peer.tip_height or 0), peer.failures, latency, peer.address)
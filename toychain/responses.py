@@ -0,0 +1,77 @@
+"""
+Building blocks of the responses serving the chain, shared by a node's application and the HTTP
+workers serving reads of the chain from a shared snapshot, see `toychain.workers`.
+"""
+
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Union
+
+from fastapi.responses import Response
+
+from toychain import wire
+
+if TYPE_CHECKING:
+    from toychain.blockchain import BlockChain
+    from toychain.shared import ChainView
+
+
+def blocks_response(
+    source: Union["BlockChain", "ChainView"],
+    key: str,
+    start: int,
+    limit: Optional[int],
+    packed: bool,
+    if_none_match: Optional[str],
+) -> Response:
+    """
+    Builds a response holding a range of blocks and the length of the chain from the blocks'
+    cached encodings: a JSON object or a message in the binary wire format. Gives a `304 Not
+    Modified` response instead if the client already has it, which is told from the chain's tip
+    alone, without encoding anything.
+
+    Args:
+        source (Union[BlockChain, ChainView]): the chain, or a shared snapshot of it.
+        key (str): name of the field holding the blocks in a JSON response.
+        start (int): index of the first block, 1 being the genesis block.
+        limit (Optional[int]): maximum number of blocks, all blocks until the tip if None.
+        packed (bool): whether to use the binary wire format rather than JSON.
+        if_none_match (Optional[str]): the request's `If-None-Match` header, if any.
+
+    Returns:
+        The response.
+    """
+    if if_none_match is not None:
+        etag: str = blocks_etag(*source.tip(), start, limit, packed)
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept"})
+
+    if packed:
+        encoded_blocks, length, tip_hash = source.packed_blocks(start, limit)
+    else:
+        encoded_blocks, length, tip_hash = source.encoded_blocks(start, limit)
+    # from the encoded chain, which may have changed since its tip was compared
+    headers: Dict[str, str] = {
+        "ETag": blocks_etag(length, tip_hash, start, limit, packed),
+        "Vary": "Accept",
+    }
+    if packed:
+        return Response(content=encoded_blocks, media_type=wire.MEDIA_TYPE, headers=headers)
+    content: bytes = b'{"%s":%s,"length":%d}' % (key.encode(), encoded_blocks, length)
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+def blocks_etag(length: int, tip_hash: str, start: int, limit: Optional[int], packed: bool) -> str:
+    """Gives the entity tag of a range of blocks, from the chain's tip, the range and the format."""
+    end: str = "tip" if limit is None else str(limit)
+    return f'"{length}-{tip_hash}-{start}-{end}{"-packed" if packed else ""}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Tells whether an `If-None-Match` header lists the given entity tag, weak or strong."""
+    tags: List[str] = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+def ndjson_lines(encoded_blocks: Iterable[bytes]) -> Iterator[bytes]:
+    """Frames blocks' encodings one at a time, as lines of newline-delimited JSON."""
+    for encoded in encoded_blocks:
+        yield encoded + b"\n"
@@ -0,0 +1,234 @@
+"""
+Background mining: proof of work searches run as jobs on a dedicated thread, off the request path.
+"""
+
+import threading
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from uuid import uuid4
+
+from loguru import logger
+
+from toychain.blockchain import Block, BlockChain, Transaction
+from toychain.state import MINING_REWARD, MINT_ADDRESS
+
+QUEUED, RUNNING, DONE, CANCELLED, FAILED = "queued", "running", "done", "cancelled", "failed"
+
+
+class MiningJob:
+    """A request to mine a block on top of the chain's tip, and its progress."""
+
+    __slots__ = {
+        "job_id": "Unique identifier of the job, as a hex string",
+        "state": "One of 'queued', 'running', 'done', 'cancelled' or 'failed'",
+        "created": "Time at which the job was requested",
+        "started": "Time at which the job started running, or None",
+        "finished": "Time at which the job stopped running, or None",
+        "tip_index": "Index of the block the job mines on top of, once running",
+        "tip_hash": "Hash of the block the job mines on top of, once running",
+        "searched": "Number of candidate proofs handed out to the miner so far",
+        "block_index": "Index of the mined block, once done",
+        "reason": "Why the job was cancelled or failed, if it was",
+        "merged": "Number of requests merged into this job, beyond the first one",
+        "cancel_requested": "Whether the job was asked to stop",
+    }
+
+    def __init__(self):
+        self.job_id: str = uuid4().hex
+        self.state: str = QUEUED
+        self.created: float = time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.tip_index: Optional[int] = None
+        self.tip_hash: Optional[str] = None
+        self.searched: int = 0
+        self.block_index: Optional[int] = None
+        self.reason: Optional[str] = None
+        self.merged: int = 0
+        self.cancel_requested: bool = False
+
+    @property
+    def active(self) -> bool:
+        """Whether the job is queued or running."""
+        return self.state in (QUEUED, RUNNING)
+
+    def dict(self) -> Dict[str, Any]:
+        """
+        Gives the job's state and progress as a dictionary, to encode it.
+
+        Returns:
+            The job's fields by name, plus the time it has been running for in seconds.
+        """
+        elapsed: Optional[float] = None
+        if self.started is not None:
+            elapsed = (self.finished or time()) - self.started
+        return {
+            "job_id": self.job_id,
+            "state": self.state,
+            "tip_index": self.tip_index,
+            "searched": self.searched,
+            "elapsed": elapsed,
+            "block_index": self.block_index,
+            "reason": self.reason,
+            "merged": self.merged,
+        }
+
+
+class MiningScheduler:
+    """
+    Runs mining jobs one at a time on a background thread, while the proof of work search itself
+    uses the blockchain's miner. A mining request made while a job is queued or running is merged
+    into that job. A running job is cancelled as soon as the chain's tip changes under it, for
+    instance when consensus adopts another chain.
+    """
+
+    __slots__ = {
+        "blockchain": "BlockChain object to mine blocks for",
+        "reward_address": "Address rewarded for each mined block",
+        "history": "Number of finished jobs to remember",
+        "jobs": "OrderedDict of known MiningJob objects by id, oldest first",
+        "_active": "The queued or running MiningJob, if any",
+        "_lock": "Lock guarding job submission",
+        "_executor": "Single-threaded ThreadPoolExecutor running the jobs",
+        "on_mined": "Optional callable receiving each mined block, for instance to announce it",
+    }
+
+    def __init__(
+        self,
+        blockchain: BlockChain,
+        reward_address: str,
+        history: int = 100,
+        on_mined: Optional[Callable[[Block], Any]] = None,
+    ):
+        self.blockchain: BlockChain = blockchain
+        self.reward_address: str = reward_address
+        self.history: int = history
+        self.on_mined: Optional[Callable[[Block], Any]] = on_mined
+        self.jobs: "OrderedDict[str, MiningJob]" = OrderedDict()
+        self._active: Optional[MiningJob] = None
+        self._lock: threading.Lock = threading.Lock()
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="mining-scheduler"
+        )
+
+    def submit(self) -> Tuple[MiningJob, bool]:
+        """
+        Requests a block to be mined, merging the request into the active job if there is one.
+
+        Returns:
+            A tuple of the job that will mine the block, and whether the request was merged into
+            an existing job.
+        """
+        with self._lock:
+            if self._active is not None and self._active.active:
+                self._active.merged += 1
+                logger.debug("Merging mining request into job {}", self._active.job_id)
+                return self._active, True
+
+            job = MiningJob()
+            self._active = job
+            self.jobs[job.job_id] = job
+            while len(self.jobs) > self.history:
+                self.jobs.popitem(last=False)
+            self._executor.submit(self._run, job)
+            logger.info("Queued mining job {}", job.job_id)
+            return job, False
+
+    def get(self, job_id: str) -> Optional[MiningJob]:
+        """
+        Looks up a job.
+
+        Args:
+            job_id (str): identifier of the job.
+
+        Returns:
+            The MiningJob, or None if it is unknown or was forgotten.
+        """
+        return self.jobs.get(job_id)
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Summarizes the scheduler's state.
+
+        Returns:
+            The active job if any, and the number of remembered jobs in each state.
+        """
+        active: Optional[MiningJob] = self._active
+        counts: Dict[str, int] = {state: 0 for state in (QUEUED, RUNNING, DONE, CANCELLED, FAILED)}
+        for job in list(self.jobs.values()):
+            counts[job.state] += 1
+        return {
+            "active_job": active.dict() if active is not None and active.active else None,
+            "jobs": counts,
+        }
+
+    def cancel(self) -> Optional[MiningJob]:
+        """
+        Asks the active job to stop, which it does before searching its next chunk of candidates,
+        see `ParallelMiner.stoppable_chunk_size`.
+
+        Returns:
+            The cancelled job, or None if no job was active.
+        """
+        active: Optional[MiningJob] = self._active
+        if active is None or not active.active:
+            return None
+        active.cancel_requested = True
+        return active
+
+    def close(self) -> None:
+        """
+        Cancels the active job and stops the background thread.
+
+        Returns:
+            Nothing.
+        """
+        self.cancel()
+        self._executor.shutdown(wait=True)
+
+    def _run(self, job: MiningJob) -> None:
+        job.state, job.started = RUNNING, time()
+        try:
+            tip: Block = self.blockchain.last_block
+            job.tip_index, job.tip_hash = tip.index, tip.digest
+
+            def should_stop(searched: int) -> bool:
+                job.searched = searched
+                return job.cancel_requested or self._tip_changed(job)
+
+            proof: Optional[int] = self.blockchain.proof_of_work(tip.proof, should_stop=should_stop)
+            # Hold the lock from the tip check until the block is in, so the tip can not move
+            with self.blockchain.lock.write_locked():
+                if proof is None or job.cancel_requested or self._tip_changed(job):
+                    reason: str = "cancelled" if job.cancel_requested else "tip changed"
+                    self._finish(job, CANCELLED, reason)
+                    return
+
+                reward = Transaction(
+                    sender=MINT_ADDRESS, recipient=self.reward_address, amount=MINING_REWARD
+                )
+                block: Block = self.blockchain.add_block(
+                    previous_hash=job.tip_hash, proof=proof, reward=reward
+                )
+            job.block_index = block.index
+            self._finish(job, DONE)
+        except Exception as error:  # reported on the job, the scheduler keeps running
+            logger.exception("Mining job {} failed", job.job_id)
+            self._finish(job, FAILED, repr(error))
+            return
+
+        if self.on_mined is not None:
+            try:
+                self.on_mined(block)
+            except Exception:  # the block is mined all the same
+                logger.exception("Could not hand over the block mined by job {}", job.job_id)
+
+    def _tip_changed(self, job: MiningJob) -> bool:
+        return self.blockchain.last_block.digest != job.tip_hash
+
+    def _finish(self, job: MiningJob, state: str, reason: Optional[str] = None) -> None:
+        job.state, job.reason, job.finished = state, reason, time()
+        logger.info("Mining job {} is {}{}", job.job_id, state, f" ({reason})" if reason else "")
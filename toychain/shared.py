@@ -0,0 +1,354 @@
+"""
+Snapshot of a chain shared between the processes of a node, so that HTTP worker processes serve
+reads of the chain from memory without asking the process owning the chain. The owner publishes
+a new snapshot after each change of its chain: workers memory-map the current one, and only map
+the new one when it changed.
+
+A snapshot is made of an index file and two data files. The data files hold the blocks' canonical
+JSON encodings, each followed by a comma, and their records in the binary wire format, each
+prefixed by its size as in a message of `toychain.wire`. The index file starts with a fixed header
+(magic bytes, length of the chain, generation, epoch of the data files and hash of the last
+block), followed by two tables of offsets, one per block and one for the end of the section: the
+first into the JSON data file and the second into the wire format one. A range of blocks is then a
+single slice of either data file.
+
+Data files are only ever appended to: when the chain grows, the owner appends the new blocks to
+them and atomically replaces the index file, which is small next to the blocks. Mapped snapshots
+stay consistent, as the bytes they refer to never change. When the chain is replaced or rolled
+back, the owner writes data files for a new epoch instead, and removes those of the previous one.
+"""
+
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+from toychain import wire
+from toychain.blockchain import Block, BlockChain
+
+MAGIC: bytes = b"TCS\x02"
+SHARED_MEMORY_DIRECTORY: Optional[str] = "/dev/shm" if os.path.isdir("/dev/shm") else None
+SECTIONS: Tuple[str, str] = ("json", "wire")  # suffixes of the data files, in table order
+
+HEADER = struct.Struct(">4sIQQ32s")  # magic, chain length, generation, epoch, hash of last block
+OFFSET = struct.Struct(">Q")
+
+
+def section_path(path: Path, epoch: int, section: str) -> Path:
+    """
+    Gives the path of a data file of a snapshot.
+
+    Args:
+        path (Path): path of the snapshot's index file.
+        epoch (int): epoch of the data files.
+        section (str): one of `SECTIONS`.
+
+    Returns:
+        The path of the data file, next to the index file.
+    """
+    return path.with_name(f"{path.name}.{epoch}.{section}")
+
+
+def pack_index(
+    length: int,
+    generation: int,
+    epoch: int,
+    tip_hash: str,
+    encoded_offsets: List[int],
+    packed_offsets: List[int],
+) -> bytes:
+    """
+    Assembles a snapshot's index file.
+
+    Args:
+        length (int): number of blocks in the snapshot.
+        generation (int): number of the snapshot, increasing with each published one.
+        epoch (int): epoch of the data files holding the snapshot's blocks.
+        tip_hash (str): hash of the last block.
+        encoded_offsets (List[int]): offset of each block in the JSON data file, and of the end
+            of the last one.
+        packed_offsets (List[int]): offset of each block in the wire format data file, and of the
+            end of the last one.
+
+    Returns:
+        The index file.
+    """
+    offsets: bytes = struct.pack(f">{2 * (length + 1)}Q", *encoded_offsets, *packed_offsets)
+    return HEADER.pack(MAGIC, length, generation, epoch, wire.pack_digest(tip_hash)) + offsets
+
+
+def _append(path: Path, chunks: Iterable[bytes], offsets: List[int], mode: str) -> None:
+    """Writes chunks to a data file, recording the offset of the end of each one."""
+    with open(path, mode) as data_file:
+        for chunk in chunks:
+            data_file.write(chunk)
+            offsets.append(offsets[-1] + len(chunk))
+
+
+class ChainPublisher:
+    """
+    Writes snapshots of a node's chain, appending new blocks to the data files and replacing the
+    index file atomically.
+    """
+
+    __slots__ = {
+        "path": "Path of the snapshot's index file",
+        "generation": "Number of the last published snapshot, 0 before the first one",
+        "epoch": "Epoch of the current data files, 0 before the first snapshot",
+        "_published": "Tuple of the blocks in the last published snapshot",
+        "_offsets": "Offsets of the published blocks in each data file, and of their end",
+        "_lock": "Lock making publications happen one at a time",
+    }
+
+    def __init__(self, path: Union[str, Path]):
+        self.path: Path = Path(path)
+        self.generation: int = 0
+        self.epoch: int = 0
+        self._published: Tuple[Block, ...] = ()
+        self._offsets: Tuple[List[int], List[int]] = ([0], [0])
+        self._lock: threading.Lock = threading.Lock()
+
+    def publish(self, blockchain: BlockChain) -> int:
+        """
+        Publishes a snapshot of a chain as it is now. When the chain only grew since the last
+        snapshot, only its new blocks are written, and blocks cache their encodings, so that this
+        mostly copies the new blocks' bytes and the offset tables.
+
+        Args:
+            blockchain (BlockChain): the blockchain to take the snapshot of.
+
+        Returns:
+            The generation of the published snapshot.
+        """
+        with self._lock:
+            blocks: Tuple[Block, ...] = blockchain.snapshot()
+            published: int = len(self._published)
+            grew: bool = (
+                0 < published <= len(blocks)
+                and blocks[published - 1].digest == self._published[-1].digest
+            )
+            if grew:
+                new_blocks: Tuple[Block, ...] = blocks[published:]
+            else:  # first snapshot, or the chain was replaced or rolled back
+                new_blocks = blocks
+                self.epoch += 1
+                self._offsets = ([0], [0])
+
+            mode: str = "ab" if grew else "wb"
+            encoded_offsets, packed_offsets = self._offsets
+            _append(
+                section_path(self.path, self.epoch, "json"),
+                (block.canonical_bytes() + b"," for block in new_blocks),
+                encoded_offsets,
+                mode,
+            )
+            records: Iterator[bytes] = (block.packed_bytes() for block in new_blocks)
+            _append(
+                section_path(self.path, self.epoch, "wire"),
+                (wire.RECORD_SIZE.pack(len(record)) + record for record in records),
+                packed_offsets,
+                mode,
+            )
+
+            self.generation += 1
+            index: bytes = pack_index(
+                len(blocks),
+                self.generation,
+                self.epoch,
+                blocks[-1].digest,
+                encoded_offsets,
+                packed_offsets,
+            )
+            descriptor, temporary = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name)
+            with open(descriptor, "wb") as index_file:
+                index_file.write(index)
+            os.replace(temporary, self.path)
+            if not grew and self.epoch > 1:
+                for section in SECTIONS:  # still readable by the workers mapping them
+                    try:
+                        section_path(self.path, self.epoch - 1, section).unlink()
+                    except FileNotFoundError:  # the previous snapshot failed to be written
+                        pass
+            self._published = blocks
+            return self.generation
+
+
+def _map_file(path: Path) -> Tuple[os.stat_result, mmap.mmap]:
+    with open(path, "rb") as mapped_file:
+        status = os.fstat(mapped_file.fileno())
+        return status, mmap.mmap(mapped_file.fileno(), status.st_size, access=mmap.ACCESS_READ)
+
+
+class _Mapping:
+    """A memory-mapped snapshot: its index file and header, and its data files."""
+
+    __slots__ = {
+        "identity": "Inode, modification time and size of the mapped index file",
+        "buffer": "Memory-map of the index file",
+        "sections": "Memory-maps of the JSON and wire format data files",
+        "length": "Number of blocks in the snapshot",
+        "generation": "Number of the snapshot",
+        "epoch": "Epoch of the data files",
+        "tip_hash": "Hash of the snapshot's last block",
+    }
+
+    def __init__(self, path: Path):
+        status, self.buffer = _map_file(path)
+        self.identity: Tuple[int, int, int] = (status.st_ino, status.st_mtime_ns, status.st_size)
+        try:
+            magic, self.length, self.generation, self.epoch, tip_hash = HEADER.unpack_from(
+                self.buffer, 0
+            )
+        except struct.error as error:
+            raise ValueError(f"Truncated snapshot file '{path}'") from error
+        if magic != MAGIC:
+            raise ValueError(f"'{path}' is not a snapshot file")
+        self.tip_hash: str = tip_hash.hex()
+        # the data files were written before the index file, and only grow within an epoch
+        self.sections: List[mmap.mmap] = [
+            _map_file(section_path(path, self.epoch, section))[1] for section in SECTIONS
+        ]
+
+    @classmethod
+    def open(cls, path: Path, attempts: int = 3) -> "_Mapping":
+        """
+        Maps the current snapshot, trying again if its data files were removed while mapping it,
+        as a newer snapshot of a replaced chain got published.
+        """
+        for attempt in range(1, attempts + 1):
+            try:
+                return cls(path)
+            except FileNotFoundError:
+                if attempt == attempts:
+                    raise
+        raise ValueError("At least one attempt is needed")
+
+    def offset(self, table: int, position: int) -> int:
+        """Gives an offset from the JSON (0) or wire format (1) table."""
+        return OFFSET.unpack_from(
+            self.buffer, HEADER.size + (table * (self.length + 1) + position) * OFFSET.size
+        )[0]
+
+    def slice(self, table: int, first_position: int, end: int, trailing: int = 0) -> bytes:
+        """
+        Gives the bytes of a range of blocks from the JSON (0) or wire format (1) data file,
+        leaving out `trailing` bytes at its end.
+        """
+        section: mmap.mmap = self.sections[table]
+        return section[self.offset(table, first_position) : self.offset(table, end) - trailing]
+
+    def positions(self, start: int, limit: Optional[int]) -> Tuple[int, int]:
+        """Gives the positions of the first block of a range and of the block after its end."""
+        first_position: int = min(max(start, 1) - 1, self.length)
+        end: int = self.length if limit is None else min(self.length, first_position + limit)
+        return first_position, max(first_position, end)
+
+
+class ChainView:
+    """
+    Read-only view of the chain published by a `ChainPublisher`, as HTTP worker processes serve
+    it. Each read checks whether the index file was replaced, which costs a `stat` call, and
+    maps the new one if so.
+    """
+
+    __slots__ = {
+        "path": "Path of the snapshot's index file",
+        "_mapping": "The currently mapped snapshot",
+        "_lock": "Lock making a single thread map a new snapshot",
+    }
+
+    def __init__(self, path: Union[str, Path]):
+        self.path: Path = Path(path)
+        self._mapping: _Mapping = _Mapping.open(self.path)
+        self._lock: threading.Lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.current().length
+
+    @property
+    def generation(self) -> int:
+        """Number of the currently published snapshot."""
+        return self.current().generation
+
+    def tip(self) -> Tuple[int, str]:
+        """Gives the length of the chain and the hash of its last block, see `BlockChain.tip`."""
+        mapping: _Mapping = self.current()
+        return mapping.length, mapping.tip_hash
+
+    def current(self) -> _Mapping:
+        """
+        Gives the latest snapshot, mapping it first if the file was replaced. Mappings are never
+        closed while in use: a replaced one is released once nothing refers to it anymore.
+
+        Returns:
+            The mapped snapshot, consistent on its own whatever gets published afterwards.
+        """
+        status = os.stat(self.path)
+        identity: Tuple[int, int, int] = (status.st_ino, status.st_mtime_ns, status.st_size)
+        mapping: _Mapping = self._mapping
+        if mapping.identity != identity:
+            with self._lock:
+                if self._mapping.identity != identity:
+                    self._mapping = _Mapping.open(self.path)
+                mapping = self._mapping
+        return mapping
+
+    def encoded_blocks(self, start: int = 1, limit: Optional[int] = None) -> Tuple[bytes, int, str]:
+        """
+        Encodes consecutive blocks of the chain, by block index, as a JSON array. See
+        `BlockChain.encoded_blocks`.
+
+        Returns:
+            A tuple of the JSON array of the blocks' canonical encodings, the length of the chain
+            and the hash of its last block, all from the same snapshot.
+        """
+        mapping: _Mapping = self.current()
+        first_position, end = mapping.positions(start, limit)
+        if first_position == end:
+            return b"[]", mapping.length, mapping.tip_hash
+        section: bytes = mapping.slice(0, first_position, end, trailing=1)
+        return b"[" + section + b"]", mapping.length, mapping.tip_hash
+
+    def packed_blocks(self, start: int = 1, limit: Optional[int] = None) -> Tuple[bytes, int, str]:
+        """
+        Encodes consecutive blocks of the chain, by block index, as a message in the binary wire
+        format. See `BlockChain.packed_blocks`.
+
+        Returns:
+            A tuple of the message, the length of the chain and the hash of its last block, all
+            from the same snapshot.
+        """
+        mapping: _Mapping = self.current()
+        first_position, end = mapping.positions(start, limit)
+        section: bytes = mapping.slice(1, first_position, end)
+        prefix: bytes = wire.MESSAGE.pack(wire.MAGIC, mapping.length, end - first_position)
+        return prefix + section, mapping.length, mapping.tip_hash
+
+    def iter_encoded(self, start: int = 1, limit: Optional[int] = None) -> Iterator[bytes]:
+        """
+        Gives the canonical JSON encodings of consecutive blocks one at a time, all from the
+        snapshot current when called.
+
+        Yields:
+            The encoding of each block, in chain order.
+        """
+        mapping: _Mapping = self.current()
+        first_position, end = mapping.positions(start, limit)
+        for position in range(first_position, end):
+            yield mapping.slice(0, position, position + 1, trailing=1)
+
+    def blocks_range(self, start: int = 1, limit: Optional[int] = None) -> Tuple[List[Block], int]:
+        """
+        Decodes consecutive blocks of the chain, by block index.
+
+        Returns:
+            A tuple of the list of blocks, empty if the chain is shorter than `start`, and the
+            length of the chain, from the same snapshot.
+        """
+        message, length, _ = self.packed_blocks(start, limit)
+        _, records = wire.unpack_message(message)
+        return [Block.parse_packed(record) for record in records], length
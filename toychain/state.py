@@ -0,0 +1,180 @@
+"""
+Rules of the ledger: which transactions an account's balance allows. Balances themselves are kept
+by the chain's AddressIndex, updated block by block as blocks are added and removed. Candidate
+blocks are checked on an overlay of these balances, so that a fork can be checked without
+changing them and without replaying the chain.
+"""
+
+import math
+
+from collections import ChainMap
+from typing import TYPE_CHECKING, Iterable, List, Mapping, MutableMapping, Optional
+
+from toychain.validation import Failure
+
+if TYPE_CHECKING:
+    from toychain.blockchain import Block, Transaction
+
+MINT_ADDRESS: str = "0"  # sender of mining rewards, the only address spending without a balance
+MINING_REWARD: int = 1  # coins granted to the miner of a block
+
+
+def check_amount(transaction: "Transaction") -> Optional[str]:
+    """
+    Checks that a transaction moves a positive, finite amount.
+
+    Returns:
+        The reason the transaction is invalid, or None if it is valid.
+    """
+    if not (isinstance(transaction.amount, (int, float)) and math.isfinite(transaction.amount)):
+        return f"Amount {transaction.amount!r} is not a finite number"
+    if transaction.amount <= 0:
+        return f"Amount {transaction.amount!r} is not positive"
+    return None
+
+
+def check_transfer(transaction: "Transaction", available: float) -> Optional[str]:
+    """
+    Checks a transaction submitted to the mempool: it must move a positive amount, its sender
+    must not be the mint address, and the amount must not exceed what its sender has available.
+
+    Args:
+        transaction (Transaction): the submitted transaction.
+        available (float): the sender's balance, minus what its pending transactions spend.
+
+    Returns:
+        The reason the transaction is invalid, or None if it is valid.
+    """
+    reason: Optional[str] = check_amount(transaction)
+    if reason is not None:
+        return reason
+    if transaction.sender == MINT_ADDRESS:
+        return "Only mining rewards can be sent from the mint address"
+    if transaction.amount > available:
+        return (
+            f"Sender '{transaction.sender}' can not spend {transaction.amount}, only {available} "
+            "is available"
+        )
+    return None
+
+
+def apply_transactions(
+    balances: MutableMapping[str, float], transactions: Iterable["Transaction"], sign: int = 1
+) -> None:
+    """
+    Moves the amounts of transactions between balances, or back if `sign` is -1.
+
+    Returns:
+        Nothing, updates in place.
+    """
+    for transaction in transactions:
+        balances[transaction.sender] = balances.get(transaction.sender, 0.0) - (
+            sign * transaction.amount
+        )
+        balances[transaction.recipient] = balances.get(transaction.recipient, 0.0) + (
+            sign * transaction.amount
+        )
+
+
+def check_block_transactions(balances: MutableMapping[str, float], block: "Block") -> Optional[str]:
+    """
+    Checks and applies the transactions of a block, in order, see `check_recorded`.
+
+    Args:
+        balances (MutableMapping[str, float]): the balances before the block, updated in place
+            with its transactions up to the first invalid one.
+        block (Block): the block to check.
+
+    Returns:
+        The reason the block is invalid, or None if it is valid.
+    """
+    for position, transaction in enumerate(block.transactions):
+        reason: Optional[str] = check_recorded(balances, transaction, position)
+        if reason is not None:
+            return f"Transaction {position}: {reason}"
+        apply_transactions(balances, (transaction,))
+    return None
+
+
+def check_recorded(
+    balances: Mapping[str, float], transaction: "Transaction", position: int
+) -> Optional[str]:
+    """
+    Checks a transaction recorded in a block: it must move a positive amount, a mining reward can
+    only be the block's first transaction and grant at most `MINING_REWARD`, and no other sender
+    can spend more than its balance at that point of the block.
+
+    Args:
+        balances (Mapping[str, float]): the balances before the transaction.
+        transaction (Transaction): the transaction to check.
+        position (int): position of the transaction in its block.
+
+    Returns:
+        The reason the transaction is invalid, or None if it is valid.
+    """
+    reason: Optional[str] = check_amount(transaction)
+    if reason is not None:
+        return reason
+    if transaction.sender == MINT_ADDRESS:
+        if position != 0 or transaction.amount > MINING_REWARD:
+            return f"Only the first transaction can mint, at most {MINING_REWARD} coin(s)"
+        return None
+    balance: float = balances.get(transaction.sender, 0.0)
+    if transaction.amount > balance:
+        return (
+            f"Sender '{transaction.sender}' spends {transaction.amount}, more than its balance of "
+            f"{balance}"
+        )
+    return None
+
+
+def check_blocks(
+    balances: Mapping[str, float],
+    blocks: Iterable["Block"],
+    reverted: Iterable["Block"] = (),
+) -> Optional[Failure]:
+    """
+    Checks the transactions of consecutive blocks against the balances of a chain, without
+    changing them. The balances are first taken back to before the `reverted` blocks, the tip of
+    the chain that `blocks` would replace.
+
+    Args:
+        balances (Mapping[str, float]): the balances at the chain's tip.
+        blocks (Iterable[Block]): the blocks to check, in order.
+        reverted (Iterable[Block]): the chain's blocks after the fork, in order.
+
+    Returns:
+        The position in the chain of the first invalid block and the reason it is invalid, or
+        None if all blocks are valid.
+    """
+    overlay: ChainMap = ChainMap({}, balances)
+    for block in reversed(list(reverted)):
+        apply_transactions(overlay, reversed(block.transactions), sign=-1)
+    for block in blocks:
+        reason: Optional[str] = check_block_transactions(overlay, block)
+        if reason is not None:
+            return block.index - 1, reason
+    return None
+
+
+def spendable(
+    balances: Mapping[str, float], transactions: Iterable["Transaction"]
+) -> List["Transaction"]:
+    """
+    Keeps the transactions that can be recorded in a new block, in order, dropping those that
+    `check_recorded` rejects, for instance because the chain they were accepted on was replaced.
+
+    Args:
+        balances (Mapping[str, float]): the balances at the chain's tip.
+        transactions (Iterable[Transaction]): the candidate transactions, a mining reward first.
+
+    Returns:
+        The transactions to record.
+    """
+    overlay: ChainMap = ChainMap({}, balances)
+    kept: List["Transaction"] = []
+    for transaction in transactions:
+        if check_recorded(overlay, transaction, len(kept)) is None:
+            apply_transactions(overlay, (transaction,))
+            kept.append(transaction)
+    return kept
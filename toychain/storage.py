@@ -0,0 +1,283 @@
+"""
+Storage backends holding the blocks of a BlockChain. Both behave like a list of blocks that can
+only be appended to, or truncated from the end.
+"""
+
+import mmap
+import os
+import struct
+import threading
+
+from array import array
+from collections import OrderedDict
+from collections.abc import Sequence
+from itertools import islice
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Iterable, Iterator, List, Optional, Union
+
+from loguru import logger
+
+if TYPE_CHECKING:
+    from toychain.blockchain import Block
+
+_LENGTH_PREFIX = struct.Struct(">I")  # size of each record in the block log
+_OFFSET = struct.Struct(">Q")  # position of each record in the block log, in the offset index
+
+DEFAULT_CACHE_SIZE: int = 1_024  # decoded blocks a FileStore keeps in memory
+
+
+class MemoryStore(list):
+    """Default storage, keeping blocks in memory only."""
+
+    def flush(self) -> None:
+        """Nothing to write, blocks only live in memory."""
+
+    def close(self) -> None:
+        """Nothing to release, blocks only live in memory."""
+
+    def scan(self, start: int = 0) -> Iterator["Block"]:
+        """Iterates over the blocks from position `start` on, see `FileStore.scan`."""
+        return islice(self, start, None)
+
+
+class FileStore(Sequence):
+    """
+    Storage persisting blocks to a directory, in two append-only files:
+        - `blocks.log` holds each block's canonical encoding, prefixed by its size,
+        - `blocks.idx` holds the position of each record in the log, as fixed-width integers.
+    Opening a store memory-maps the index and reads nothing else, blocks are decoded from the log
+    when accessed. The `cache_size` most recently accessed or appended blocks are kept decoded,
+    while slices and iteration decode the blocks they go over without keeping them, so that going
+    over the whole chain does not bring it back in memory. Writes are fsynced every `sync_every`
+    appended blocks.
+    """
+
+    __slots__ = {
+        "directory": "Path to the directory holding the store's files",
+        "sync_every": "Number of appended blocks after which files are fsynced to disk",
+        "cache_size": "Maximum number of decoded blocks kept in memory",
+        "_log": "File object of the block log, opened for reading and appending",
+        "_index": "File object of the offset index, opened for reading and appending",
+        "_mapped_index": "Memory-map of the offset index as it was when last mapped",
+        "_mapped_length": "Number of offsets in the memory-mapped index",
+        "_new_offsets": "Offsets of blocks appended since the index was last mapped",
+        "_log_size": "Size in bytes of the block log",
+        "_loaded": "OrderedDict of recently decoded blocks by position, least recently used first",
+        "_unsynced": "Number of blocks appended since the files were last fsynced",
+        "_lock": "Lock guarding the decoded blocks and the position of the files when reading",
+    }
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        sync_every: int = 32,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+    ):
+        self.directory: Path = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.sync_every: int = sync_every
+        self.cache_size: int = cache_size
+        self._log = open(self.directory / "blocks.log", "a+b")
+        self._index = open(self.directory / "blocks.idx", "a+b")
+        self._mapped_index: Optional[mmap.mmap] = None
+        self._mapped_length: int = 0
+        self._new_offsets: array = array("Q")
+        self._log_size: int = os.fstat(self._log.fileno()).st_size
+        self._loaded: "OrderedDict[int, Block]" = OrderedDict()
+        self._unsynced: int = 0
+        self._lock: threading.Lock = threading.Lock()
+        self._recover()
+        self._map_index()
+        logger.debug("Opened block store at '{}' holding {} block(s)", self.directory, len(self))
+
+    def __len__(self) -> int:
+        return self._mapped_length + len(self._new_offsets)
+
+    def __getitem__(self, position: Union[int, slice]) -> Union["Block", List["Block"]]:
+        if isinstance(position, slice):
+            return [self._peek(index) for index in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("block store index out of range")
+        return self._load(position)
+
+    def __iter__(self) -> Iterator["Block"]:
+        return self.scan()
+
+    def __delitem__(self, positions: slice) -> None:
+        """Truncates the store: only `del store[length:]` is supported, files being append-only."""
+        length, stop, step = positions.indices(len(self))
+        if stop != len(self) or step != 1:
+            raise ValueError("Blocks can only be removed from the end of a FileStore")
+        if length == len(self):
+            return
+
+        logger.debug("Truncating block store to {} block(s)", length)
+        self._log.flush()
+        self._index.flush()
+        self._log_size = self._offset(length)
+        self._log.truncate(self._log_size)
+        self._index.truncate(length * _OFFSET.size)
+        with self._lock:
+            for position in [position for position in self._loaded if position >= length]:
+                del self._loaded[position]
+        self.flush()
+        self._map_index()
+
+    def append(self, block: "Block") -> None:
+        """
+        Appends a block at the end of the store.
+
+        Args:
+            block (Block): the block to append.
+
+        Returns:
+            Nothing.
+        """
+        encoded: bytes = block.canonical_bytes()
+        self._log.write(_LENGTH_PREFIX.pack(len(encoded)) + encoded)
+        self._index.write(_OFFSET.pack(self._log_size))
+        self._cache(len(self), block)
+        self._new_offsets.append(self._log_size)
+        self._log_size += _LENGTH_PREFIX.size + len(encoded)
+
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            self.flush()
+
+    def extend(self, blocks: Iterable["Block"]) -> None:
+        """
+        Appends blocks at the end of the store.
+
+        Args:
+            blocks (Iterable[Block]): the blocks to append.
+
+        Returns:
+            Nothing.
+        """
+        for block in blocks:
+            self.append(block)
+
+    def scan(self, start: int = 0) -> Iterator["Block"]:
+        """
+        Iterates over the blocks from position `start` on, decoding them without keeping them in
+        memory, for a single pass over many blocks such as indexing the chain.
+
+        Args:
+            start (int): position of the first block, 0 being the genesis block.
+
+        Yields:
+            The blocks, in chain order.
+        """
+        for position in range(start, len(self)):
+            yield self._peek(position)
+
+    def flush(self) -> None:
+        """
+        Writes pending data to disk, the block log before the index so that the index never points
+        past the end of the log.
+
+        Returns:
+            Nothing.
+        """
+        for store_file in (self._log, self._index):
+            store_file.flush()
+            os.fsync(store_file.fileno())
+        self._unsynced = 0
+
+    def close(self) -> None:
+        """
+        Flushes and closes the store's files.
+
+        Returns:
+            Nothing.
+        """
+        self.flush()
+        if self._mapped_index is not None:
+            self._mapped_index.close()
+            self._mapped_index = None
+        self._log.close()
+        self._index.close()
+
+    def _offset(self, position: int) -> int:
+        if position < self._mapped_length:
+            return _OFFSET.unpack_from(self._mapped_index, position * _OFFSET.size)[0]
+        return self._new_offsets[position - self._mapped_length]
+
+    def _load(self, position: int) -> "Block":
+        """Gives a block, keeping it decoded as the most recently used one."""
+        with self._lock:
+            block: Optional["Block"] = self._loaded.get(position)
+            if block is not None:
+                self._loaded.move_to_end(position)
+                return block
+        block = self._decode(position)
+        self._cache(position, block)
+        return block
+
+    def _peek(self, position: int) -> "Block":
+        """Gives a block, decoding it without keeping it if it is not kept decoded already."""
+        with self._lock:
+            block: Optional["Block"] = self._loaded.get(position)
+        return block if block is not None else self._decode(position)
+
+    def _cache(self, position: int, block: "Block") -> None:
+        with self._lock:
+            self._loaded[position] = block
+            self._loaded.move_to_end(position)
+            while len(self._loaded) > self.cache_size:
+                self._loaded.popitem(last=False)
+
+    def _decode(self, position: int) -> "Block":
+        from toychain.blockchain import Block  # imported here since toychain.blockchain imports us
+
+        offset: int = self._offset(position)
+        (size,) = _LENGTH_PREFIX.unpack(self._read(self._log, _LENGTH_PREFIX.size, offset))
+        return Block.parse_raw(self._read(self._log, size, offset + _LENGTH_PREFIX.size))
+
+    def _read(self, store_file: BinaryIO, size: int, offset: int) -> bytes:
+        """
+        Reads from one of the store's files at an offset. Appends go to the end of the files
+        whatever their position, as they are opened in append mode.
+        """
+        with self._lock:
+            store_file.flush()
+            store_file.seek(offset)
+            return store_file.read(size)
+
+    def _map_index(self) -> None:
+        if self._mapped_index is not None:
+            self._mapped_index.close()
+            self._mapped_index = None
+        self._index.flush()
+        index_size: int = os.fstat(self._index.fileno()).st_size
+        if index_size:
+            self._mapped_index = mmap.mmap(
+                self._index.fileno(), index_size, access=mmap.ACCESS_READ
+            )
+        self._mapped_length = index_size // _OFFSET.size
+        self._new_offsets = array("Q")
+
+    def _recover(self) -> None:
+        """Drops the records of an interrupted write at the end of the files, only reading tails."""
+        index_size: int = os.fstat(self._index.fileno()).st_size
+        length: int = index_size // _OFFSET.size
+        while length:
+            (offset,) = _OFFSET.unpack(
+                self._read(self._index, _OFFSET.size, (length - 1) * _OFFSET.size)
+            )
+            header: bytes = self._read(self._log, _LENGTH_PREFIX.size, offset)
+            if len(header) == _LENGTH_PREFIX.size:
+                end: int = offset + _LENGTH_PREFIX.size + _LENGTH_PREFIX.unpack(header)[0]
+                if end <= self._log_size:
+                    break
+            length -= 1
+        else:
+            end = 0
+
+        if length * _OFFSET.size != index_size or end != self._log_size:
+            logger.warning("Dropping incomplete writes from block store at '{}'", self.directory)
+            self._index.truncate(length * _OFFSET.size)
+            self._log.truncate(end)
+            self._log_size = end
@@ -0,0 +1,141 @@
+"""
+Chain validation, either serial or spread over a pool of worker processes.
+"""
+
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+from toychain.mining import DEFAULT_DIFFICULTY, proof_is_valid
+from toychain.parallel import first_in_order
+
+if TYPE_CHECKING:
+    from toychain.blockchain import Block
+
+Failure = Tuple[int, str]  # position of the first invalid block, and the reason it is invalid
+
+
+def check_links(
+    blocks: List["Block"], offset: int = 0, min_difficulty: int = DEFAULT_DIFFICULTY
+) -> Optional[Failure]:
+    """
+    Checks each block of `blocks[1:]` against its predecessor: its `previous_hash` tag, its
+    Merkle root (for full blocks), its recorded difficulty and its proof. This is the unit of work
+    handed to each worker, and does not log anything.
+
+    Args:
+        blocks (List[Block]): consecutive blocks, the first one being trusted.
+        offset (int): position of `blocks[0]` in the complete chain, to report failures with.
+        min_difficulty (int): the lowest difficulty a block can record.
+
+    Returns:
+        The position in the complete chain of the first invalid block and the reason it is
+        invalid, or None if all blocks are valid.
+    """
+    for position, (previous_block, inspected_block) in enumerate(
+        zip(blocks[:-1], blocks[1:]), start=offset + 1
+    ):
+        if inspected_block.previous_hash != previous_block.digest:
+            return position, f"Invalid block tag 'previous_hash': {inspected_block.previous_hash}"
+
+        if not inspected_block.merkle_root_is_valid():
+            return position, "Merkle root does not match the block's transactions"
+
+        if inspected_block.difficulty < min_difficulty:
+            return position, (
+                f"Block's difficulty of {inspected_block.difficulty} bits is lower than the "
+                f"required {min_difficulty} bits"
+            )
+
+        if not proof_is_valid(
+            last_proof=previous_block.proof,
+            new_proof=inspected_block.proof,
+            difficulty=inspected_block.difficulty,
+        ):
+            return position, (
+                f"Discrepancy between last block's proof '{previous_block.proof}' and "
+                f"inspected block's proof '{inspected_block.proof}'"
+            )
+    return None
+
+
+class ChainValidator:
+    """
+    Validation engine splitting a chain in chunks of consecutive blocks over a pool of processes.
+    The reported failure is always the first invalid block, the same the serial check reports.
+    """
+
+    __slots__ = {
+        "workers": "Number of worker processes to validate with, validating serially if 1 or less",
+        "chunk_size": "Number of blocks handed to a worker at once",
+        "_executor": "Lazily created pool of worker processes",
+    }
+
+    def __init__(self, workers: Optional[int] = None, chunk_size: int = 500):
+        self.workers: int = workers if workers is not None else (os.cpu_count() or 1)
+        self.chunk_size: int = chunk_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def first_invalid(
+        self, chain: List["Block"], start: int = 1, min_difficulty: int = DEFAULT_DIFFICULTY
+    ) -> Optional[Failure]:
+        """
+        Finds the first invalid block of a chain. Chains too short to fill a chunk per worker are
+        checked serially, as is everything if a single worker is configured or if the pool of
+        processes is not usable.
+
+        Args:
+            chain (List[Block]): a complete blockchain (list of Block objects).
+            start (int): position of the first block to check against its predecessor.
+            min_difficulty (int): the lowest difficulty a block can record.
+
+        Returns:
+            The position of the first invalid block and the reason it is invalid, or None if the
+            chain is valid.
+        """
+        start = max(start, 1)
+        if self.workers > 1 and len(chain) - start >= self.workers * self.chunk_size:
+            try:
+                return self._first_invalid_parallel(chain, start, min_difficulty)
+            except (OSError, NotImplementedError, BrokenProcessPool) as pool_error:
+                logger.warning("Parallel validation failed ({!r}), validating serially", pool_error)
+                self.close()
+        return check_links(chain[start - 1 :], start - 1, min_difficulty)
+
+    def close(self) -> None:
+        """
+        Shuts down the pool of worker processes, if any. It is created again on the next check.
+
+        Returns:
+            Nothing.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _first_invalid_parallel(
+        self, chain: List["Block"], start: int, min_difficulty: int
+    ) -> Optional[Failure]:
+        if self._executor is None:
+            logger.debug("Starting a pool of {} validation processes", self.workers)
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        hit = first_in_order(
+            self._executor,
+            check_links,
+            self._chunks(chain, start, min_difficulty),
+            window=2 * self.workers,
+        )
+        return hit[1] if hit is not None else None
+
+    def _chunks(
+        self, chain: List["Block"], start: int, min_difficulty: int
+    ) -> Iterator[Tuple[List["Block"], int, int]]:
+        # Chunks overlap by one block, so that each one holds the predecessor of its first block
+        for chunk_start in range(start, len(chain), self.chunk_size):
+            chunk: List["Block"] = chain[chunk_start - 1 : chunk_start + self.chunk_size]
+            yield chunk, chunk_start - 1, min_difficulty
@@ -0,0 +1,342 @@
+"""
+Compact binary encoding of blocks and headers, exchanged between nodes that ask for it.
+
+A message is a fixed prefix (magic bytes, length of the sender's chain and number of records)
+followed by records, each prefixed by its size so that it can be decoded in place. Numbers are
+big-endian and fixed-width, and hashes are raw 32-byte digests. The addresses of a block's
+transactions are listed once each in a table: their number, the size of each, and their UTF-8
+encodings one after the other. Transactions are then fixed-width entries referring to them.
+Decoding works on a `memoryview` of the message and only copies the bytes that end up in the
+decoded objects.
+"""
+
+import itertools
+import struct
+
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+MEDIA_TYPE: str = "application/x-toychain"
+MAGIC: bytes = b"TOY\x01"
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+MESSAGE = struct.Struct(">4sII")  # magic, chain length, number of records
+RECORD_SIZE = struct.Struct(">I")
+# Fields common to blocks and headers: index, timestamp, proof, difficulty, flags, Merkle root and
+# previous hash. A block follows them with its transactions, and a header with its hash.
+FIELDS = struct.Struct(">IdqHB32s32s")
+COUNT = struct.Struct(">I")
+TRANSACTION = struct.Struct(">dII")  # amount, then positions of the sender and recipient addresses
+
+# Flags of a block or header record
+NO_PROOF: int = 0x01  # the proof is None, the proof field is zeroed
+TEXT_PREVIOUS_HASH: int = 0x02  # the previous hash is not a digest, it follows the fixed fields
+
+Fields = Tuple[int, float, Optional[int], int, str, str]
+Transfer = Tuple[str, str, float]  # sender, recipient and amount of a transaction
+Entry = Tuple[float, int, int]  # amount, positions of the sender and recipient in the table
+
+
+def pack_digest(hex_digest: str) -> bytes:
+    """
+    Packs a hex digest as raw bytes.
+
+    Args:
+        hex_digest (str): the SHA-256 hex digest.
+
+    Returns:
+        The 32 bytes of the digest.
+
+    Raises:
+        ValueError: if the string is not a lowercase 64 characters hex digest.
+    """
+    packed: bytes = bytes.fromhex(hex_digest)
+    if len(packed) != 32 or packed.hex() != hex_digest:
+        raise ValueError(f"'{hex_digest}' is not a SHA-256 hex digest")
+    return packed
+
+
+def pack_text(text: str) -> bytes:
+    """
+    Packs a short string, such as a previous hash that is not a digest, prefixed by its size.
+
+    Raises:
+        ValueError: if the encoded string is longer than 255 bytes.
+    """
+    encoded: bytes = text.encode()
+    if len(encoded) > 255:
+        raise ValueError("Can not pack strings longer than 255 bytes")
+    return bytes((len(encoded),)) + encoded
+
+
+def unpack_text(buffer: Buffer, offset: int) -> Tuple[str, int]:
+    """
+    Decodes a string packed by `pack_text`.
+
+    Returns:
+        The string, and the offset of the bytes following it.
+    """
+    size: int = buffer[offset]
+    end: int = offset + 1 + size
+    if end > len(buffer):
+        raise ValueError("Packed string goes past the end of its record")
+    return str(buffer[offset + 1 : end], "utf-8"), end
+
+
+def pack_fields(
+    index: int,
+    timestamp: float,
+    proof: Optional[int],
+    difficulty: int,
+    merkle_root: str,
+    previous_hash: str,
+) -> bytes:
+    """
+    Packs the fields common to blocks and headers.
+
+    Returns:
+        The packed fields.
+
+    Raises:
+        ValueError: if the Merkle root is not a digest, or a number does not fit its field.
+    """
+    flags: int = 0
+    if proof is None:
+        flags |= NO_PROOF
+    trailer: bytes = b""
+    try:
+        packed_previous_hash: bytes = pack_digest(previous_hash)
+    except ValueError:  # such as the genesis block's
+        flags |= TEXT_PREVIOUS_HASH
+        packed_previous_hash, trailer = bytes(32), pack_text(previous_hash)
+    try:
+        fixed: bytes = FIELDS.pack(
+            index,
+            timestamp,
+            proof or 0,
+            difficulty,
+            flags,
+            pack_digest(merkle_root),
+            packed_previous_hash,
+        )
+    except struct.error as error:
+        raise ValueError(f"Can not pack the fields of block {index}: {error}") from error
+    return fixed + trailer
+
+
+def unpack_fields(buffer: Buffer, offset: int = 0) -> Tuple[Fields, int]:
+    """
+    Decodes the fields packed by `pack_fields`.
+
+    Returns:
+        A tuple of the index, timestamp, proof, difficulty, Merkle root and previous hash, and the
+        offset of the bytes following them.
+
+    Raises:
+        struct.error, IndexError, ValueError: if the fields are truncated or malformed.
+    """
+    index, timestamp, proof, difficulty, flags, merkle_root, previous_hash = FIELDS.unpack_from(
+        buffer, offset
+    )
+    offset += FIELDS.size
+    if flags & TEXT_PREVIOUS_HASH:
+        previous_hash, offset = unpack_text(buffer, offset)
+    else:
+        previous_hash = previous_hash.hex()
+    fields: Fields = (
+        index,
+        timestamp,
+        None if flags & NO_PROOF else proof,
+        difficulty,
+        merkle_root.hex(),
+        previous_hash,
+    )
+    return fields, offset
+
+
+def pack_transactions(transfers: Iterable[Transfer]) -> bytes:
+    """
+    Packs the transactions of a block: the table of their distinct addresses, then the number of
+    transactions and a fixed-width entry for each.
+
+    Args:
+        transfers (Iterable[Transfer]): the sender, recipient and amount of each transaction.
+
+    Returns:
+        The packed transactions.
+
+    Raises:
+        ValueError: if an address is longer than 65535 bytes once encoded.
+    """
+    positions: Dict[str, int] = {}
+    entries: List[bytes] = []
+    for sender, recipient, amount in transfers:
+        sender_position: int = positions.setdefault(sender, len(positions))
+        recipient_position: int = positions.setdefault(recipient, len(positions))
+        entries.append(TRANSACTION.pack(amount, sender_position, recipient_position))
+    encoded: List[bytes] = [address.encode() for address in positions]
+    try:
+        sizes: bytes = struct.pack(f">{len(encoded)}H", *(len(address) for address in encoded))
+    except struct.error as error:
+        raise ValueError("Can not pack addresses longer than 65535 bytes") from error
+    return b"".join([COUNT.pack(len(encoded)), sizes, *encoded, COUNT.pack(len(entries)), *entries])
+
+
+def unpack_transactions(buffer: Buffer, offset: int) -> Tuple[List[str], Iterator[Entry], int]:
+    """
+    Decodes the transactions packed by `pack_transactions`: the address table in one go, and the
+    fixed-width entries lazily, straight from the buffer.
+
+    Returns:
+        The table of addresses, an iterator over the amount and the positions in the table of the
+        sender and recipient of each transaction, and the offset of the bytes following them.
+
+    Raises:
+        struct.error, ValueError: if the transactions are truncated or malformed.
+    """
+    view = memoryview(buffer)
+    (address_count,) = COUNT.unpack_from(view, offset)
+    offset += COUNT.size
+    sizes: Tuple[int, ...] = struct.unpack_from(f">{address_count}H", view, offset)
+    offset += 2 * address_count
+    bounds: List[int] = [0, *itertools.accumulate(sizes)]
+    if offset + bounds[-1] > len(view):
+        raise ValueError("Packed address table goes past the end of its record")
+    table = view[offset : offset + bounds[-1]]
+    text: str = str(table, "utf-8")
+    if len(text) == len(table):  # only ASCII characters, one byte each: slice the decoded table
+        addresses: List[str] = [text[start:end] for start, end in zip(bounds, bounds[1:])]
+    else:
+        addresses = [str(table[start:end], "utf-8") for start, end in zip(bounds, bounds[1:])]
+    offset += bounds[-1]
+
+    (count,) = COUNT.unpack_from(view, offset)
+    offset += COUNT.size
+    end: int = offset + count * TRANSACTION.size
+    if end > len(view):
+        raise ValueError("Packed transactions go past the end of their record")
+    return addresses, TRANSACTION.iter_unpack(view[offset:end]), end
+
+
+def pack_message(records: Iterable[bytes], chain_length: int) -> bytes:
+    """
+    Frames records in a message.
+
+    Args:
+        records (Iterable[bytes]): the packed blocks or headers.
+        chain_length (int): length of the sender's full chain.
+
+    Returns:
+        The message.
+    """
+    packed_records: List[bytes] = list(records)
+    parts: List[bytes] = [MESSAGE.pack(MAGIC, chain_length, len(packed_records))]
+    for record in packed_records:
+        parts.append(RECORD_SIZE.pack(len(record)))
+        parts.append(record)
+    return b"".join(parts)
+
+
+def unpack_message(buffer: Buffer) -> Tuple[int, List[memoryview]]:
+    """
+    Splits a message in its records, without copying them.
+
+    Args:
+        buffer (Buffer): the message.
+
+    Returns:
+        A tuple of the length of the sender's chain, and a view on each record.
+
+    Raises:
+        ValueError: if the message is malformed.
+    """
+    view = memoryview(buffer)
+    try:
+        magic, chain_length, count = MESSAGE.unpack_from(view, 0)
+    except struct.error as error:
+        raise ValueError("Truncated message") from error
+    if magic != MAGIC:
+        raise ValueError("Not a message in the binary wire format")
+
+    records: List[memoryview] = []
+    offset: int = MESSAGE.size
+    for _ in range(count):
+        if offset + RECORD_SIZE.size > len(view):
+            raise ValueError("Truncated message")
+        (size,) = RECORD_SIZE.unpack_from(view, offset)
+        offset += RECORD_SIZE.size
+        if offset + size > len(view):
+            raise ValueError("Truncated message")
+        records.append(view[offset : offset + size])
+        offset += size
+    if offset != len(view):
+        raise ValueError("Unexpected bytes after the last record of the message")
+    return chain_length, records
+
+
+def iter_message(stream: BinaryIO) -> Iterator[bytes]:
+    """
+    Reads a message from a stream one record at a time, as the records arrive, rather than from
+    a buffer holding the whole message.
+
+    Args:
+        stream (BinaryIO): the stream to read the message from, such as the raw body of an HTTP
+            response.
+
+    Yields:
+        Each record of the message, in order.
+
+    Raises:
+        ValueError: if the message is malformed or ends early.
+    """
+    magic, _, count = MESSAGE.unpack(_read_exactly(stream, MESSAGE.size))
+    if magic != MAGIC:
+        raise ValueError("Not a message in the binary wire format")
+    for _ in range(count):
+        (size,) = RECORD_SIZE.unpack(_read_exactly(stream, RECORD_SIZE.size))
+        yield _read_exactly(stream, size)
+    if stream.read(1):
+        raise ValueError("Unexpected bytes after the last record of the message")
+
+
+def _read_exactly(stream: BinaryIO, size: int) -> bytes:
+    """Reads `size` bytes from a stream, which may give them over several reads."""
+    parts: List[bytes] = []
+    remaining: int = size
+    while remaining:
+        part: bytes = stream.read(remaining)
+        if not part:
+            raise ValueError("Truncated message")
+        parts.append(part)
+        remaining -= len(part)
+    return b"".join(parts)
+
+
+def accepts_packed(accept: str) -> bool:
+    """
+    Tells whether a request's `Accept` header prefers the binary wire format to anything else.
+
+    Args:
+        accept (str): the header's value.
+
+    Returns:
+        True if the binary media type is acceptable and has the highest quality of the listed
+        media types, False otherwise.
+    """
+    best_other: float = 0.0
+    packed: float = 0.0
+    for media_range in accept.split(","):
+        media_type, *parameters = (part.strip() for part in media_range.split(";"))
+        quality: float = 1.0
+        for parameter in parameters:
+            name, _, value = parameter.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if media_type == MEDIA_TYPE:
+            packed = max(packed, quality)
+        else:
+            best_other = max(best_other, quality)
+    return packed > 0 and packed >= best_other
@@ -0,0 +1,408 @@
+"""
+Deployment of a node over several processes: HTTP worker processes serve requests on the node's
+port, in front of a single process owning the chain, its mempool and everything else a node
+keeps. Workers serve reads of the chain (`/chain`, `/blocks` and `/headers`) from a snapshot of
+it shared in memory, see `toychain.shared`, without asking the owner. They forward every other
+request to the owner over a Unix socket, and the owner runs it through the node's application
+like any request it would have received itself.
+
+Workers find the snapshot file, the owner's socket and the key authenticating them to the owner
+in environment variables, as they are started by uvicorn's process manager, see `serve`. This
+needs Unix sockets and replacing files other processes memory-map, so it is only available on
+POSIX systems, see `SUPPORTED`.
+"""
+
+import asyncio
+import os
+import queue
+import shutil
+import tempfile
+import threading
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import uvicorn
+
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from loguru import logger
+
+from toychain import wire
+from toychain.blockchain import BlockChain, BlockHeader
+from toychain.logs import DEFAULT_LOG_LEVEL, configure_logging, uvicorn_level
+from toychain.responses import blocks_response, ndjson_lines
+from toychain.shared import SHARED_MEMORY_DIRECTORY, ChainPublisher, ChainView
+
+SNAPSHOT_VARIABLE: str = "TOYCHAIN_SNAPSHOT"
+OWNER_VARIABLE: str = "TOYCHAIN_OWNER"
+AUTHKEY_VARIABLE: str = "TOYCHAIN_AUTHKEY"
+LOG_LEVEL_VARIABLE: str = "TOYCHAIN_LOG_LEVEL"
+FORWARDED_METHODS: List[str] = ["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"]
+SUPPORTED: bool = os.name == "posix"  # whether this platform can run a node over several processes
+DEFAULT_FORWARD_TIMEOUT: float = 30.0  # seconds the owner takes at most to answer a request
+
+Headers = List[Tuple[bytes, bytes]]
+# method, path, query string, headers, body and client address of a forwarded request
+ForwardedRequest = Tuple[str, str, bytes, Headers, bytes, Optional[Tuple[str, int]]]
+ForwardedResponse = Tuple[int, Headers, bytes]  # status code, headers and body
+
+
+async def call_app(app: Any, request: ForwardedRequest) -> ForwardedResponse:
+    """
+    Runs a forwarded request through an ASGI application, in this process, and collects its
+    response, streamed or not.
+
+    Args:
+        app (Any): the ASGI application, such as the node's.
+        request (ForwardedRequest): the request received by a worker.
+
+    Returns:
+        The status code, headers and whole body of the response.
+    """
+    method, path, query_string, headers, body, client = request
+    scope: Dict[str, Any] = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string,
+        "root_path": "",
+        "headers": headers,
+        "client": client,
+        "server": None,
+    }
+    status: List[int] = []
+    response_headers: Headers = []
+    chunks: List[bytes] = []
+    received: List[bool] = [False]
+    done: asyncio.Event = asyncio.Event()
+
+    async def receive() -> Dict[str, Any]:
+        if not received[0]:
+            received[0] = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await done.wait()  # the client only disconnects once the response is complete
+        return {"type": "http.disconnect"}
+
+    async def send(message: Dict[str, Any]) -> None:
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+            response_headers.extend(
+                (bytes(name), bytes(value)) for name, value in message["headers"]
+            )
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                done.set()
+
+    try:
+        await app(scope, receive, send)
+    except Exception:  # the application already answered with a 500 response if it could
+        logger.exception("Forwarded request to '{}' failed", path)
+        if not status:
+            return 500, [(b"content-type", b"text/plain; charset=utf-8")], b"Internal Server Error"
+    finally:
+        done.set()
+    return status[0], response_headers, b"".join(chunks)
+
+
+class OwnerServer:
+    """
+    Serves the requests forwarded by worker processes with a node's application, in the process
+    owning the chain. Each worker connection is served by a thread, which runs requests on an
+    event loop shared by all connections. A request taking longer than `timeout` seconds is
+    cancelled and answered with a 504 response, so that a stuck request does not hold its
+    connection forever.
+    """
+
+    __slots__ = {
+        "app": "The node's ASGI application",
+        "address": "Path of the Unix socket workers connect to",
+        "listener": "multiprocessing Listener accepting and authenticating worker connections",
+        "loop": "Event loop running the forwarded requests, in its own thread",
+        "timeout": "Seconds a forwarded request may run before being answered with a 504 response",
+        "_closed": "Event set once the server is closed",
+    }
+
+    def __init__(
+        self, app: Any, address: str, authkey: bytes, timeout: float = DEFAULT_FORWARD_TIMEOUT
+    ):
+        self.app = app
+        self.address: str = address
+        self.listener: Listener = Listener(address, family="AF_UNIX", authkey=authkey)
+        self.loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+        self.timeout: float = timeout
+        self._closed: threading.Event = threading.Event()
+
+    def start(self) -> None:
+        """
+        Starts running the event loop and accepting connections, in background threads.
+
+        Returns:
+            Nothing.
+        """
+        threading.Thread(target=self.loop.run_forever, name="owner-loop", daemon=True).start()
+        threading.Thread(target=self._accept, name="owner-accept", daemon=True).start()
+        logger.info("Serving forwarded requests at '{}'", self.address)
+
+    def close(self) -> None:
+        """
+        Stops accepting connections and stops the event loop.
+
+        Returns:
+            Nothing.
+        """
+        self._closed.set()
+        self.listener.close()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def _accept(self) -> None:
+        while not self._closed.is_set():
+            try:
+                connection: Connection = self.listener.accept()
+            except AuthenticationError:
+                logger.warning("Refused a connection that did not authenticate as a worker")
+                continue
+            except OSError:  # the listener was closed
+                return
+            threading.Thread(
+                target=self._serve, args=(connection,), name="owner-connection", daemon=True
+            ).start()
+
+    def _serve(self, connection: Connection) -> None:
+        with connection:
+            while True:
+                try:
+                    request: ForwardedRequest = connection.recv()
+                except (EOFError, OSError):  # the worker closed the connection
+                    return
+                connection.send(self._call(request))
+
+    def _call(self, request: ForwardedRequest) -> ForwardedResponse:
+        future: Future = asyncio.run_coroutine_threadsafe(call_app(self.app, request), self.loop)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            logger.warning(
+                "Forwarded request to '{}' timed out after {}s", request[1], self.timeout
+            )
+            return 504, [(b"content-type", b"text/plain; charset=utf-8")], b"Gateway Timeout"
+
+
+class OwnerClient:
+    """
+    Connections from a worker process to the process owning the chain, one per request in
+    flight. Connections are reused across requests, and blocking calls run on a thread pool so
+    that they can be awaited concurrently.
+    """
+
+    __slots__ = {
+        "address": "Path of the owner's Unix socket",
+        "authkey": "Key authenticating this worker to the owner",
+        "executor": "ThreadPoolExecutor running the blocking calls",
+        "_idle": "LifoQueue of the connections not used by a request",
+    }
+
+    def __init__(self, address: str, authkey: bytes, max_connections: int = 32):
+        self.address: str = address
+        self.authkey: bytes = authkey
+        self.executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=max_connections, thread_name_prefix="owner-client"
+        )
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+
+    def forward(self, request: ForwardedRequest) -> ForwardedResponse:
+        """
+        Sends a request to the owner and waits for its response.
+
+        Args:
+            request (ForwardedRequest): the request received by this worker.
+
+        Returns:
+            The status code, headers and body of the owner's response.
+
+        Raises:
+            OSError, EOFError: if the owner can not be reached.
+        """
+        try:
+            connection: Connection = self._idle.get_nowait()
+        except queue.Empty:
+            connection = Client(self.address, family="AF_UNIX", authkey=self.authkey)
+        try:
+            connection.send(request)
+            response: ForwardedResponse = connection.recv()
+        except BaseException:
+            connection.close()
+            raise
+        self._idle.put(connection)
+        return response
+
+    async def forward_async(self, request: ForwardedRequest) -> ForwardedResponse:
+        """Awaitable version of `forward`, running it on the thread pool."""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, self.forward, request)
+
+    def close(self) -> None:
+        """
+        Closes all connections and shuts the thread pool down.
+
+        Returns:
+            Nothing.
+        """
+        self.executor.shutdown(wait=False)
+        while not self._idle.empty():
+            self._idle.get_nowait().close()
+
+
+worker = FastAPI(docs_url=None, redoc_url=None, openapi_url=None)  # documentation is forwarded
+
+
+@worker.on_event("startup")
+def connect():
+    """Opens the shared snapshot of the chain and connects to the owner, from the environment."""
+    configure_logging(os.environ.get(LOG_LEVEL_VARIABLE, DEFAULT_LOG_LEVEL))
+    worker.state.view = ChainView(os.environ[SNAPSHOT_VARIABLE])
+    worker.state.owner = OwnerClient(
+        os.environ[OWNER_VARIABLE], bytes.fromhex(os.environ[AUTHKEY_VARIABLE])
+    )
+    logger.info("Worker process {} serving the chain's snapshot", os.getpid())
+
+
+@worker.on_event("shutdown")
+def disconnect():
+    """Closes the connections to the owner."""
+    worker.state.owner.close()
+
+
+@worker.get("/chain")
+def shared_chain(
+    start: int = Query(1, ge=1),
+    limit: Optional[int] = Query(None, ge=0),
+    stream: bool = False,
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    """Serves `/chain` from the shared snapshot, see `toychain.node.full_chain`."""
+    view: ChainView = worker.state.view
+    packed: bool = accept is not None and wire.accepts_packed(accept)
+    if stream and not packed:
+        return StreamingResponse(
+            ndjson_lines(view.iter_encoded(start, limit)), media_type="application/x-ndjson"
+        )
+    return blocks_response(view, "chain", start, limit, packed, if_none_match)
+
+
+@worker.get("/blocks")
+def shared_blocks(
+    start: int = Query(1, ge=1),
+    limit: Optional[int] = Query(None, ge=0),
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    """Serves `/blocks` from the shared snapshot, see `toychain.node.chain_blocks`."""
+    packed: bool = accept is not None and wire.accepts_packed(accept)
+    return blocks_response(worker.state.view, "blocks", start, limit, packed, if_none_match)
+
+
+@worker.get("/headers")
+def shared_headers(
+    start: int = Query(1, ge=1),
+    limit: Optional[int] = Query(None, ge=0),
+    accept: Optional[str] = Header(None),
+):
+    """Serves `/headers` from the shared snapshot, see `toychain.node.chain_headers`."""
+    blocks, length = worker.state.view.blocks_range(start, limit)
+    headers: List[BlockHeader] = [block.header() for block in blocks]
+    if accept is not None and wire.accepts_packed(accept):
+        content: bytes = wire.pack_message((header.packed_bytes() for header in headers), length)
+        return Response(content=content, media_type=wire.MEDIA_TYPE, headers={"Vary": "Accept"})
+    return {"headers": [header.dict() for header in headers], "length": length}
+
+
+@worker.api_route("/{path:path}", methods=FORWARDED_METHODS, include_in_schema=False)
+async def forward(request: Request):
+    """Forwards any other request to the process owning the chain, and relays its response."""
+    forwarded: ForwardedRequest = (
+        request.method,
+        request.scope["path"],
+        request.scope["query_string"],
+        list(request.scope["headers"]),
+        await request.body(),
+        tuple(request.scope["client"]) if request.scope.get("client") else None,
+    )
+    try:
+        status, headers, body = await worker.state.owner.forward_async(forwarded)
+    except (OSError, EOFError) as error:
+        logger.error("Could not forward request to the chain's owner: {!r}", error)
+        raise HTTPException(status_code=503, detail="The node's chain owner is unavailable")
+    response = Response(content=body, status_code=status)
+    response.raw_headers = [header for header in headers if header[0] != b"content-length"]
+    response.raw_headers.append((b"content-length", str(len(body)).encode()))
+    return response
+
+
+def worker_environment(
+    snapshot_path: Path, owner_address: str, authkey: bytes, log_level: str
+) -> Dict[str, str]:
+    """Gives the environment variables telling worker processes how to reach the owner."""
+    return {
+        SNAPSHOT_VARIABLE: str(snapshot_path),
+        OWNER_VARIABLE: owner_address,
+        AUTHKEY_VARIABLE: authkey.hex(),
+        LOG_LEVEL_VARIABLE: log_level,
+    }
+
+
+def serve(
+    app: Any, blockchain: BlockChain, host: str, port: int, workers: int, log_level: str
+) -> None:
+    """
+    Runs a node as this process, owning its chain, and `workers` HTTP worker processes serving
+    requests on its port. The chain's snapshot is published after each change, and the owner's
+    socket lives next to it, in a private directory of shared memory when available.
+
+    Args:
+        app (Any): the node's ASGI application, running the forwarded requests.
+        blockchain (BlockChain): the node's blockchain, whose snapshot workers serve.
+        host (str): the host workers listen on.
+        port (int): the port workers listen on.
+        workers (int): the number of worker processes.
+        log_level (str): the lowest level of the messages to log, one of `toychain.logs.LEVELS`.
+
+    Returns:
+        Nothing, returns once the workers are shut down.
+
+    Raises:
+        RuntimeError: if this platform is not a POSIX system, see `SUPPORTED`.
+    """
+    if not SUPPORTED:
+        raise RuntimeError("Serving a node from several processes is only supported on POSIX")
+    directory = Path(tempfile.mkdtemp(prefix="toychain-", dir=SHARED_MEMORY_DIRECTORY))
+    publisher = ChainPublisher(directory / "chain.snapshot")
+    publisher.publish(blockchain)
+    blockchain.on_change = publisher.publish
+    authkey: bytes = os.urandom(32)
+    server = OwnerServer(app, str(directory / "owner.sock"), authkey)
+    server.start()
+    os.environ.update(worker_environment(publisher.path, server.address, authkey, log_level))
+    try:
+        uvicorn.run(
+            "toychain.workers:worker",
+            host=host,
+            port=port,
+            workers=workers,
+            log_level=uvicorn_level(log_level),
+        )
+    finally:
+        blockchain.on_change = None
+        server.close()
+        shutil.rmtree(directory, ignore_errors=True)